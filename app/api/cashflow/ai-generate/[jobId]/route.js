@@ -0,0 +1,59 @@
+import { NextResponse } from 'next/server';
+import { cookies } from 'next/headers';
+import { verifySessionToken } from '@/lib/auth';
+
+/**
+ * GET /api/cashflow/ai-generate/[jobId]
+ * Polls a background cash flow job queued via POST /api/cashflow/ai-generate
+ */
+export async function GET(request, { params }) {
+  try {
+    const cookieStore = await cookies();
+    const token = cookieStore.get('session_token')?.value;
+
+    if (!token) {
+      return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
+    }
+
+    const payload = await verifySessionToken(token);
+    if (!payload) {
+      return NextResponse.json({ error: 'Invalid session' }, { status: 401 });
+    }
+
+    const { jobId } = await params;
+    const pythonServiceUrl = process.env.PYTHON_SERVICE_URL || 'http://localhost:8000';
+
+    const response = await fetch(`${pythonServiceUrl}/api/cashflow/jobs/${encodeURIComponent(jobId)}`);
+
+    if (!response.ok) {
+      const error = await response.json();
+      return NextResponse.json(
+        { error: error.detail || 'Failed to fetch cash flow job' },
+        { status: response.status }
+      );
+    }
+
+    const job = await response.json();
+
+    // Jobs are only visible to the company that submitted them
+    if (job.request?.company_id !== payload.companyId) {
+      return NextResponse.json({ error: 'Job not found' }, { status: 404 });
+    }
+
+    return NextResponse.json({
+      job_id: job.job_id,
+      status: job.status,
+      stage: job.stage,
+      progress: job.progress,
+      result: job.result,
+      error: job.error
+    });
+
+  } catch (error) {
+    console.error('Error in /api/cashflow/ai-generate/[jobId]:', error);
+    return NextResponse.json(
+      { error: error.message || 'Internal server error' },
+      { status: 500 }
+    );
+  }
+}
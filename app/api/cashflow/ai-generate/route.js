@@ -5,6 +5,16 @@ import { verifySessionToken } from '@/lib/auth';
 /**
  * POST /api/cashflow/ai-generate
  * Calls Python service to generate cash flow using AI/ML
+ *
+ * With `background: true` the run is queued as a job and `{ job_id, status }`
+ * is returned immediately; poll GET /api/cashflow/ai-generate/[jobId] for the result.
+ *
+ * With `stream: true` the response is a Server-Sent Events stream: components
+ * first, then per-component AI enhancements, then totals.
+ *
+ * With `export_format: 'parquet' | 'arrow'` the statement is returned as a
+ * Parquet file or Arrow IPC stream (account movements tagged with their
+ * components) and passed through without JSON parsing.
  */
 export async function POST(request) {
   try {
@@ -20,7 +30,7 @@ export async function POST(request) {
       return NextResponse.json({ error: 'Invalid session' }, { status: 401 });
     }
 
-    const { current_period, previous_period, use_ai, openai_api_key } = await request.json();
+    const { current_period, previous_period, use_ai, openai_api_key, background, stream, export_format } = await request.json();
 
     if (!current_period || !previous_period) {
       return NextResponse.json(
@@ -31,10 +41,15 @@ export async function POST(request) {
 
     // Call Python service
     const pythonServiceUrl = process.env.PYTHON_SERVICE_URL || 'http://localhost:8000';
+    const endpoint = background
+      ? '/api/cashflow/jobs'
+      : stream ? '/api/cashflow/generate/stream'
+      : export_format ? `/api/cashflow/generate?format=${encodeURIComponent(export_format)}`
+      : '/api/cashflow/generate';
 
-    console.log(`🐍 Calling Python service at ${pythonServiceUrl}/api/cashflow/generate`);
+    console.log(`🐍 Calling Python service at ${pythonServiceUrl}${endpoint}`);
 
-    const response = await fetch(`${pythonServiceUrl}/api/cashflow/generate`, {
+    const response = await fetch(`${pythonServiceUrl}${endpoint}`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -57,8 +72,34 @@ export async function POST(request) {
       );
     }
 
+    if (stream && !background) {
+      // Pass the event stream through unbuffered
+      return new Response(response.body, {
+        headers: {
+          'Content-Type': 'text/event-stream',
+          'Cache-Control': 'no-cache',
+          'X-Accel-Buffering': 'no'
+        }
+      });
+    }
+
+    if (export_format && !background && !stream) {
+      // Binary table, passed through as-is
+      return new Response(response.body, {
+        headers: {
+          'Content-Type': response.headers.get('Content-Type'),
+          'Content-Disposition': response.headers.get('Content-Disposition')
+        }
+      });
+    }
+
     const data = await response.json();
 
+    if (background) {
+      console.log(`⏳ Queued cash flow job ${data.job_id}`);
+      return NextResponse.json(data, { status: 202 });
+    }
+
     console.log(`✅ Generated ${data.components?.length || 0} cash flow components`);
 
     return NextResponse.json(data);
@@ -0,0 +1,4 @@
+"""
+Benchmarks
+Synthetic-data performance harness: python -m benchmarks.run
+"""
@@ -0,0 +1,224 @@
+"""
+Classifier Backend Benchmark
+Compares inference backends against the fp32 model on a labeled chart of accounts for agreement, latency and memory
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
+import multiprocessing
+import platform
+import argparse
+import time
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.run import reset_peak_rss, peak_rss_mb, git_commit
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "labeled_coa.csv")
+DEFAULT_BACKENDS = "torch,int8,onnx,onnx-int8"
+
+def _rss_mb() -> Optional[float]:
+    """Current RSS (Linux only)"""
+    try:
+        with open("/proc/self/status") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def run_backend(
+    backend: str,
+    model_name: str,
+    fixture: str,
+    batch_size: int,
+    repeat: int,
+    onnx_dir: Optional[str],
+    rule_tier: bool = False
+) -> Dict[str, Any]:
+    """
+    Load one backend, classify the fixture and time encoding
+
+    Runs in its own process so the memory figures cover this backend only.
+    With rule_tier off every account goes through the model; with it on,
+    the accounts the rule tier resolves are scored against their labels too.
+    """
+    from services.account_classifier import AccountClassifier
+    from services.inference_backend import load_encoder
+    # Imported up front so model_rss_mb covers the model, not the libraries
+    import transformers  # noqa: F401
+
+    coa = pd.read_csv(fixture, dtype={"account_code": str})
+    texts = AccountClassifier._account_texts(coa)
+
+    rss_before = _rss_mb()
+    reset_peak_rss()
+    started = time.perf_counter()
+    model = load_encoder(model_name, backend, onnx_dir)
+    classifier = AccountClassifier(
+        model_name=model_name, batch_size=batch_size, model=model, rule_tier=rule_tier, backend=backend
+    )
+    load_seconds = time.perf_counter() - started
+    rss_loaded = _rss_mb()
+    classifier.warm_up()
+
+    result = classifier.classify_accounts(coa)
+    predicted = [result[code]["top_category"] for code in coa["account_code"]]
+    by_rule = np.asarray([result[code]["tier"] == "rule" for code in coa["account_code"]])
+    correct = np.asarray(predicted) == coa["expected_category"].to_numpy()
+
+    # Batch throughput over the fixture texts repeated, then per-text latency
+    batch_texts = texts * repeat
+    started = time.perf_counter()
+    classifier._encode(batch_texts, batch_size)
+    batch_seconds = time.perf_counter() - started
+
+    latencies = []
+    for text in texts:
+        started = time.perf_counter()
+        classifier._encode([text], 1)
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "model_rss_mb": rss_loaded - rss_before if rss_before is not None and rss_loaded is not None else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "texts_per_second": len(batch_texts) / batch_seconds if batch_seconds > 0 else None,
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "latency_p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "accuracy": float(np.mean(correct)),
+        "rule_resolved": int(by_rule.sum()),
+        "rule_accuracy": float(np.mean(correct[by_rule])) if by_rule.any() else None,
+        "rule_errors": np.flatnonzero(by_rule & ~correct).tolist(),
+        "predicted": predicted,
+        "scores": result.scores.tolist()
+    }
+
+def compare_to_reference(results: List[Dict[str, Any]], reference: Dict[str, Any]) -> None:
+    """Add agreement with the reference backend's top category, score drift and savings to each result"""
+    reference_scores = np.asarray(reference["scores"])
+    for entry in results:
+        entry["agreement"] = float(np.mean(np.asarray(entry["predicted"]) == np.asarray(reference["predicted"])))
+        # Rule-tier rows have no scores (NaN) and are the same for every backend
+        entry["max_score_delta"] = float(np.nanmax(np.abs(np.asarray(entry["scores"]) - reference_scores)))
+        entry["disagreements"] = [
+            index for index, (ours, theirs) in enumerate(zip(entry["predicted"], reference["predicted"]))
+            if ours != theirs
+        ]
+        entry["speedup"] = (
+            entry["texts_per_second"] / reference["texts_per_second"]
+            if entry["texts_per_second"] and reference["texts_per_second"] else None
+        )
+        entry["memory_saved_mb"] = (
+            reference["model_rss_mb"] - entry["model_rss_mb"]
+            if entry["model_rss_mb"] is not None and reference["model_rss_mb"] is not None else None
+        )
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare classifier inference backends against the fp32 model")
+    parser.add_argument("--backends", default=DEFAULT_BACKENDS,
+                        help=f"Comma-separated backends; the first is the reference (default {DEFAULT_BACKENDS})")
+    parser.add_argument("--model", default=os.getenv("CLASSIFIER_MODEL", "all-MiniLM-L6-v2"), help="Model name")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE,
+                        help="Labeled COA CSV with an expected_category column")
+    parser.add_argument("--batch-size", type=int, default=64, help="Encoding batch size")
+    parser.add_argument("--repeat", type=int, default=20, help="Fixture repetitions for the throughput run")
+    parser.add_argument("--onnx-dir", default=os.getenv("CLASSIFIER_ONNX_DIR"), help="ONNX export directory")
+    parser.add_argument("--min-agreement", type=float, default=0.97,
+                        help="Top-category agreement with the reference below which the run fails (default 0.97)")
+    parser.add_argument("--rule-tier", action="store_true",
+                        help="Classify with the rule tier on and check its accounts against the labels")
+    parser.add_argument("--min-rule-accuracy", type=float, default=1.0,
+                        help="Rule-tier accuracy on the labels below which the run fails (default 1.0)")
+    parser.add_argument("--output", help="Results file (default benchmarks/results/<timestamp>-<commit>-backends.json)")
+    args = parser.parse_args(argv)
+
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    commit = git_commit()
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        # Fresh process per backend so RSS reflects that backend alone
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(pool.submit(
+                run_backend, backend, args.model, args.fixture, args.batch_size, args.repeat, args.onnx_dir,
+                args.rule_tier
+            ).result())
+
+    compare_to_reference(results, results[0])
+    labels = pd.read_csv(args.fixture, dtype={"account_code": str})
+
+    print(f"\n{args.model}: {len(labels)} labeled accounts, reference {backends[0]}")
+    if args.rule_tier:
+        # The rule tier does not depend on the backend
+        rules = results[0]
+        print(f"  rule tier: {rules['rule_resolved']} accounts, accuracy {rules['rule_accuracy'] or 0:.1%}")
+        for index in rules["rule_errors"]:
+            print(
+                f"      {labels['account_name'].iloc[index]!r}: {rules['predicted'][index]} "
+                f"(expected {labels['expected_category'].iloc[index]})"
+            )
+    print(
+        f"  {'backend':<10} {'agree':>6} {'accuracy':>8} {'texts/s':>9} {'speedup':>7} "
+        f"{'p50 ms':>7} {'p95 ms':>7} {'model MB':>9} {'peak MB':>8}"
+    )
+    for entry in results:
+        print(
+            f"  {entry['backend']:<10} {entry['agreement']:>6.1%} {entry['accuracy']:>8.1%} "
+            f"{entry['texts_per_second'] or 0:>9,.0f} {entry['speedup'] or 0:>6.2f}x "
+            f"{entry['latency_p50_ms']:>7.2f} {entry['latency_p95_ms']:>7.2f} "
+            f"{entry['model_rss_mb'] or 0:>9.1f} {entry['peak_rss_mb']:>8.1f}"
+        )
+        for index in entry["disagreements"]:
+            print(
+                f"      {labels['account_name'].iloc[index]!r}: {entry['predicted'][index]} "
+                f"(reference {results[0]['predicted'][index]})"
+            )
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model": args.model,
+            "fixture": os.path.basename(args.fixture),
+            "accounts": len(labels),
+            "batch_size": args.batch_size,
+            "repeat": args.repeat,
+            "reference": backends[0],
+            "rule_tier": args.rule_tier
+        },
+        "results": [
+            {key: value for key, value in entry.items() if key != "scores"} for entry in results
+        ]
+    }
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results",
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'local'}-backends.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"\nResults written to {output}")
+
+    failing = [entry["backend"] for entry in results if entry["agreement"] < args.min_agreement]
+    if failing:
+        print(f"Agreement below {args.min_agreement:.0%}: {', '.join(failing)}")
+        return 1
+    rule_accuracy = results[0]["rule_accuracy"]
+    if args.rule_tier and rule_accuracy is not None and rule_accuracy < args.min_rule_accuracy:
+        print(f"Rule-tier accuracy {rule_accuracy:.1%} below {args.min_rule_accuracy:.0%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,143 @@
+"""
+Fakes
+Local stand-ins for the embedding model and the LLM, shared by the benchmarks and tests
+"""
+
+from langchain.chat_models.base import SimpleChatModel
+from langchain.schema import ChatResult, ChatGeneration
+from langchain.schema.messages import AIMessage, BaseMessage
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+import asyncio
+import hashlib
+import json
+import time
+import re
+
+def default_enhancement_response(messages: List[BaseMessage]) -> str:
+    """Valid single-component enhancement JSON"""
+    return json.dumps({
+        "confidence_score": 0.9,
+        "suggested_name": None,
+        "notes": "Classification looks reasonable"
+    })
+
+class FakeChatModel(SimpleChatModel):
+    """
+    Drop-in replacement for ChatOpenAI that answers locally
+
+    Each call sleeps for `latency` seconds (asyncio.sleep in async mode, so
+    concurrent calls overlap) and returns respond(messages). The first
+    `failures` calls raise, to exercise retry handling. Token usage is
+    estimated at four characters per token and reported like ChatOpenAI's.
+    """
+
+    latency: float = 0.0
+    failures: int = 0
+    # Set to let CashFlowOrchestrator key its response cache on this model
+    model_name: Optional[str] = None
+    respond: Callable[[List[BaseMessage]], str] = default_enhancement_response
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _next_response(self, messages: List[BaseMessage]) -> str:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError(f"Injected failure on call {self.calls}")
+        return self.respond(messages)
+
+    @staticmethod
+    def _result(messages: List[BaseMessage], content: str) -> ChatResult:
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4
+        completion_tokens = len(content) // 4
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content))],
+            llm_output={"token_usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }}
+        )
+
+    def _combine_llm_outputs(self, llm_outputs: List[Optional[dict]]) -> dict:
+        token_usage: Dict[str, int] = {}
+        for output in llm_outputs:
+            for key, value in ((output or {}).get("token_usage") or {}).items():
+                token_usage[key] = token_usage.get(key, 0) + value
+        return {"token_usage": token_usage}
+
+    def _call(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any
+    ) -> str:
+        time.sleep(self.latency)
+        return self._next_response(messages)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        return self._result(messages, self._call(messages, stop, run_manager, **kwargs))
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages, self._next_response(messages))
+
+class StubEmbeddingModel:
+    """
+    Deterministic stand-in for SentenceTransformer
+
+    Each word maps to a fixed pseudo-random vector seeded by its hash and a
+    text embeds as the normalized sum of its word vectors, so texts sharing
+    words are similar. No model download and no torch required.
+    """
+
+    def __init__(self, dim: int = 384, seed: int = 0):
+        self.dim = dim
+        self.seed = seed
+        self._word_vectors: Dict[str, np.ndarray] = {}
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            rng = np.random.default_rng([self.seed, int.from_bytes(digest, "little")])
+            vector = rng.standard_normal(self.dim).astype(np.float32)
+            self._word_vectors[word] = vector
+        return vector
+
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False,
+        **kwargs: Any
+    ) -> np.ndarray:
+        embeddings = np.zeros((len(sentences), self.dim), dtype=np.float32)
+
+        for row, sentence in enumerate(sentences):
+            for word in re.findall(r"[a-z0-9]+", sentence.lower()):
+                embeddings[row] += self._word_vector(word)
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms == 0, 1.0, norms)
+
+        return embeddings
@@ -0,0 +1,293 @@
+"""
+Benchmark Runner
+Times each pipeline stage on synthetic data and writes the results as JSON
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Callable
+import multiprocessing
+import subprocess
+import platform
+import argparse
+import tempfile
+import asyncio
+import logging
+import resource
+import time
+import json
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_dataset, write_sqlite, DEFAULT_PERIODS
+
+DEFAULT_SIZES = "1000,10000,100000"
+COMPANY_ID = "bench"
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as handle:
+            handle.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb() -> float:
+    """Peak RSS since the last reset (Linux) or since process start"""
+    try:
+        with open("/proc/self/status") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _measure(stages: Dict[str, Dict[str, Any]], name: str, rows: int, fn: Callable[[], Any]) -> Any:
+    """Run fn once, recording wall time, peak RSS and throughput under stages[name]"""
+    per_stage_peak = reset_peak_rss()
+    started = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - started
+
+    stages[name] = {
+        "seconds": seconds,
+        "rows": rows,
+        "rows_per_second": rows / seconds if seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_scope": "stage" if per_stage_peak else "process"
+    }
+    return result
+
+def run_size(
+    tb_rows: int,
+    entities: int,
+    seed: int,
+    llm_latency: float,
+    workdir: str,
+    chunk_size: int = 10000
+) -> Dict[str, Any]:
+    """
+    Benchmark every stage for one dataset size
+
+    Runs in its own process so peak RSS is not inflated by earlier sizes.
+    """
+    logging.basicConfig(level=logging.WARNING)
+
+    from services.account_classifier import AccountClassifier
+    from services.cashflow_calculator import CashFlowCalculator
+    from services.cashflow_pipeline import CashFlowPipeline
+    from services.data_loader import ConsolidationDataLoader
+    from services.database import create_database_engine
+    from services.model_registry import ModelRegistry
+    from benchmarks.fakes import FakeChatModel, StubEmbeddingModel
+    from services.tb_cube import TrialBalanceCube
+
+    stages: Dict[str, Dict[str, Any]] = {}
+    current_period, previous_period = DEFAULT_PERIODS[-1], DEFAULT_PERIODS[-2]
+    db_path = os.path.join(workdir, f"bench-{tb_rows}.sqlite3")
+
+    dataset = _measure(stages, "generate", tb_rows, lambda: generate_dataset(
+        tb_rows, entities=entities, periods=DEFAULT_PERIODS, seed=seed, company_id=COMPANY_ID
+    ))
+    actual_rows = len(dataset["trial_balance"])
+    accounts = actual_rows // (entities * len(DEFAULT_PERIODS))
+    coa_rows = len(dataset["chart_of_accounts"])
+    _measure(stages, "write_database", actual_rows, lambda: write_sqlite(db_path, dataset))
+    del dataset
+
+    engine = create_database_engine(f"sqlite:///{db_path}")
+    loader = ConsolidationDataLoader(engine=engine)
+
+    current_tb, previous_tb = _measure(stages, "load_consolidated_tb", actual_rows, lambda: (
+        loader.load_consolidated_tb(COMPANY_ID, current_period),
+        loader.load_consolidated_tb(COMPANY_ID, previous_period)
+    ))
+    _measure(stages, "get_account_movements", accounts, lambda: loader.get_account_movements(
+        current_tb, previous_tb
+    ))
+    movements = _measure(stages, "load_tb_movements", actual_rows, lambda: loader.load_tb_movements(
+        COMPANY_ID, current_period, previous_period
+    ))
+    periods = [previous_period, current_period]
+    _measure(stages, "load_tb_cube", actual_rows, lambda: TrialBalanceCube.from_frame(
+        loader.load_entity_tb_balances(COMPANY_ID, periods), periods
+    ))
+    # Same cube, streamed through the chunked loader
+    chunked_loader = ConsolidationDataLoader(engine=engine, chunk_size=chunk_size)
+    _measure(stages, "load_tb_cube_chunked", actual_rows, lambda: TrialBalanceCube.from_chunks(
+        chunked_loader.iter_entity_tb_balances(COMPANY_ID, periods), periods
+    ))
+    coa_data = _measure(stages, "load_chart_of_accounts", coa_rows, lambda: loader.load_chart_of_accounts(
+        COMPANY_ID
+    ))
+
+    stub_model = StubEmbeddingModel()
+    classifier = AccountClassifier(model_name="benchmark-stub", model=stub_model)
+    classifications = _measure(stages, "classify_accounts", len(coa_data), lambda: classifier.classify_accounts(
+        coa_data
+    ))
+    _measure(stages, "calculate_components", accounts, lambda: CashFlowCalculator().calculate_components(
+        current_tb=None,
+        previous_tb=None,
+        classifications=classifications,
+        coa_data=coa_data,
+        movements=movements
+    ))
+
+    # End-to-end generate_cashflow path with cold caches and a local fake LLM
+    registry = ModelRegistry(model_name="benchmark-stub", model=stub_model, inference_workers=2)
+    registry.load()
+    pipeline = CashFlowPipeline(engine=engine, registry=registry, llm=FakeChatModel(latency=llm_latency))
+    result = _measure(stages, "generate_cashflow", actual_rows, lambda: asyncio.run(pipeline.run(
+        company_id=COMPANY_ID,
+        current_period=current_period,
+        previous_period=previous_period,
+        use_ai=True
+    )))
+    registry.shutdown()
+    engine.dispose()
+    os.remove(db_path)
+
+    return {
+        "tb_rows": actual_rows,
+        "entities": entities,
+        "accounts": accounts,
+        "coa_rows": coa_rows,
+        "components": result["metadata"]["total_components"],
+        "stages": stages
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_seconds: float) -> List[Dict[str, Any]]:
+    """
+    Stage-by-stage slowdown of current versus baseline
+
+    Returns:
+        One entry per (tb_rows, stage) present in both runs; regression is
+        True when current/baseline exceeds threshold and the stage takes at
+        least min_seconds (shorter stages are too noisy to judge)
+    """
+    baseline_sizes = {entry["tb_rows"]: entry for entry in baseline["results"]}
+    rows = []
+
+    for entry in current["results"]:
+        previous = baseline_sizes.get(entry["tb_rows"])
+        if previous is None:
+            continue
+
+        for stage, timing in entry["stages"].items():
+            before = previous["stages"].get(stage)
+            if before is None or before["seconds"] <= 0:
+                continue
+
+            ratio = timing["seconds"] / before["seconds"]
+            rows.append({
+                "tb_rows": entry["tb_rows"],
+                "stage": stage,
+                "baseline_seconds": before["seconds"],
+                "seconds": timing["seconds"],
+                "ratio": ratio,
+                "regression": ratio > threshold and timing["seconds"] >= min_seconds
+            })
+
+    return rows
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the cash flow pipeline on synthetic data")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Comma-separated trial balance row counts (default {DEFAULT_SIZES}; up to 1000000)")
+    parser.add_argument("--entities", type=int, default=10, help="Entities per company")
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fake LLM latency per call in seconds")
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="Rows per chunk for the streamed load stages (default 10000)")
+    parser.add_argument("--output", help="Results file (default benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="Baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Slowdown ratio reported as a regression (default 1.25)")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Ignore regressions in stages faster than this")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    commit = git_commit()
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "entities": args.entities,
+            "seed": args.seed,
+            "llm_latency": args.llm_latency,
+            "chunk_size": args.chunk_size
+        },
+        "results": []
+    }
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="cashflow-bench-") as workdir:
+        for size in sizes:
+            # Fresh process per size so peak RSS reflects that size alone
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                entry = pool.submit(
+                    run_size, size, args.entities, args.seed, args.llm_latency, workdir, args.chunk_size
+                ).result()
+            report["results"].append(entry)
+
+            print(f"\n{entry['tb_rows']:,} TB rows / {entry['accounts']:,} accounts")
+            for stage, timing in entry["stages"].items():
+                print(
+                    f"  {stage:<24} {timing['seconds']:>9.3f}s "
+                    f"{timing['rows_per_second'] or 0:>14,.0f} rows/s "
+                    f"{timing['peak_rss_mb']:>9.1f} MB"
+                )
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results",
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+
+        comparison = compare(report, baseline, args.threshold, args.min_seconds)
+        print(f"\nCompared with {args.compare} (commit {baseline['meta'].get('commit')})")
+        for row in comparison:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(
+                f"  {row['tb_rows']:>9,} {row['stage']:<24} "
+                f"{row['baseline_seconds']:>8.3f}s -> {row['seconds']:>8.3f}s ({row['ratio']:.2f}x){flag}"
+            )
+
+        if any(row["regression"] for row in comparison):
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
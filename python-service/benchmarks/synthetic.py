@@ -0,0 +1,154 @@
+"""
+Synthetic Data Generator
+Deterministic charts of accounts and multi-entity trial balances for benchmarks
+"""
+
+from typing import Dict, List, Sequence, Tuple
+import pandas as pd
+import numpy as np
+import sqlite3
+import os
+
+# (class_name, note_name, account names) - enough variety to exercise every cash flow template
+ACCOUNT_TEMPLATES: List[Tuple[str, str, List[str]]] = [
+    ("Assets", "Trade and other receivables", ["Trade receivables", "Other receivables", "Prepayments"]),
+    ("Assets", "Inventories", ["Raw materials", "Work in progress", "Finished goods"]),
+    ("Assets", "Property, plant and equipment", [
+        "Land and buildings", "Machinery", "Motor vehicles", "Accumulated depreciation"
+    ]),
+    ("Assets", "Intangible assets", ["Software", "Goodwill", "Patents and trademarks"]),
+    ("Assets", "Cash and cash equivalents", ["Cash at bank", "Petty cash"]),
+    ("Liabilities", "Trade and other payables", ["Trade payables", "Accrued expenses", "Other payables"]),
+    ("Liabilities", "Borrowings", ["Bank loan", "Lease liabilities", "Bonds payable"]),
+    ("Liabilities", "Tax", ["Income tax payable", "Deferred tax liability"]),
+    ("Equity", "Share capital", ["Ordinary share capital", "Share premium"]),
+    ("Equity", "Reserves", ["Retained earnings", "Dividends paid"]),
+    ("Revenue", "Revenue", ["Sales revenue", "Service income", "Interest income"]),
+    ("Expenses", "Operating expenses", [
+        "Cost of sales", "Salaries and wages", "Rent expense", "Depreciation expense",
+        "Amortization expense", "Interest expense", "Income tax expense"
+    ])
+]
+
+DEFAULT_PERIODS = ("2024-11-30", "2024-12-31")
+
+REGIONS = (("EMEA", "Europe, Middle East and Africa"), ("AMER", "Americas"), ("APAC", "Asia Pacific"))
+
+def generate_dataset(
+    tb_rows: int,
+    entities: int = 10,
+    periods: Sequence[str] = DEFAULT_PERIODS,
+    seed: int = 0,
+    company_id: str = "bench"
+) -> Dict[str, pd.DataFrame]:
+    """
+    Build a consolidated dataset with roughly tb_rows trial balance rows
+
+    Every entity carries every account in every period, so the account count
+    is tb_rows / (entities x periods). The same seed always yields the same data.
+
+    Returns:
+        Dict of DataFrames: regions, entities, chart_of_accounts, trial_balance
+    """
+    rng = np.random.default_rng(seed)
+    account_count = max(1, tb_rows // (entities * len(periods)))
+
+    flat = [
+        (class_name, note_name, name)
+        for class_name, note_name, names in ACCOUNT_TEMPLATES
+        for name in names
+    ]
+    template_ids = np.arange(account_count) % len(flat)
+    account_codes = np.array([f"{index + 1:07d}" for index in range(account_count)], dtype=object)
+    account_names = np.array([
+        f"{flat[template][2]} {index // len(flat) + 1:04d}"
+        for index, template in enumerate(template_ids)
+    ], dtype=object)
+
+    entity_ids = np.array([f"{company_id}-entity-{index:03d}" for index in range(entities)], dtype=object)
+    region_frame = pd.DataFrame({
+        "id": [f"region-{code.lower()}" for code, _ in REGIONS],
+        "region_code": [code for code, _ in REGIONS],
+        "region_name": [name for _, name in REGIONS]
+    })
+    entity_frame = pd.DataFrame({
+        "id": entity_ids,
+        "company_id": company_id,
+        "entity_code": [f"E{index:03d}" for index in range(entities)],
+        "entity_name": [f"Entity {index}" for index in range(entities)],
+        "region_id": region_frame["id"].to_numpy()[np.arange(entities) % len(REGIONS)]
+    })
+
+    coa_frame = pd.DataFrame({
+        "entity_id": np.repeat(entity_ids, account_count),
+        "account_code": np.tile(account_codes, entities),
+        "account_name": np.tile(account_names, entities),
+        "class_name": np.tile(np.array([flat[t][0] for t in template_ids], dtype=object), entities),
+        "subclass_name": None,
+        "note_name": np.tile(np.array([flat[t][1] for t in template_ids], dtype=object), entities),
+        "subnote_name": None,
+        "account_type": None,
+        "normal_balance": None,
+        "is_active": True
+    })
+
+    rows_per_period = entities * account_count
+    amounts = rng.integers(0, 1_000_000, size=rows_per_period * len(periods)).astype(float)
+    is_debit = rng.random(rows_per_period * len(periods)) < 0.5
+
+    tb_frame = pd.DataFrame({
+        "entity_id": np.tile(np.repeat(entity_ids, account_count), len(periods)),
+        "account_code": np.tile(account_codes, entities * len(periods)),
+        "account_name": np.tile(account_names, entities * len(periods)),
+        "debit": np.where(is_debit, amounts, 0.0),
+        "credit": np.where(is_debit, 0.0, amounts),
+        "period": np.repeat(np.array(list(periods), dtype=object), rows_per_period)
+    })
+
+    return {
+        "regions": region_frame,
+        "entities": entity_frame,
+        "chart_of_accounts": coa_frame,
+        "trial_balance": tb_frame
+    }
+
+def write_sqlite(path: str, dataset: Dict[str, pd.DataFrame]) -> None:
+    """
+    Write a generated dataset to a fresh SQLite file with the service's table layout
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript("""
+            CREATE TABLE regions (id TEXT PRIMARY KEY, region_code TEXT, region_name TEXT);
+            CREATE TABLE entities (
+                id TEXT PRIMARY KEY, company_id TEXT, entity_code TEXT, entity_name TEXT, region_id TEXT
+            );
+            CREATE TABLE chart_of_accounts (
+                entity_id TEXT, account_code TEXT, account_name TEXT, class_name TEXT,
+                subclass_name TEXT, note_name TEXT, subnote_name TEXT, account_type TEXT,
+                normal_balance TEXT, is_active BOOLEAN
+            );
+            CREATE TABLE trial_balance (
+                entity_id TEXT, account_code TEXT, account_name TEXT,
+                debit REAL, credit REAL, period TEXT
+            );
+        """)
+
+        for table, frame in dataset.items():
+            placeholders = ", ".join("?" * len(frame.columns))
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(frame.columns)}) VALUES ({placeholders})",
+                frame.itertuples(index=False, name=None)
+            )
+
+        conn.executescript("""
+            CREATE INDEX idx_entities_company ON entities(company_id);
+            CREATE INDEX idx_coa_entity ON chart_of_accounts(entity_id);
+            CREATE INDEX idx_tb_entity_period ON trial_balance(entity_id, period);
+        """)
+        conn.commit()
+    finally:
+        conn.close()
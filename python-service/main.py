@@ -3,25 +3,80 @@ Cash Flow Calculation Service
 FastAPI service for AI-powered cash flow statement generation
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
+import pandas as pd
+import asyncio
+import logging
+import json
+import time
 import os
 from dotenv import load_dotenv
 
-from services.data_loader import ConsolidationDataLoader
-from services.account_classifier import AccountClassifier
-from services.cashflow_calculator import CashFlowCalculator
-from services.langchain_orchestrator import CashFlowOrchestrator
-
-# Load environment variables
+# Load environment variables before services read their configuration
 load_dotenv()
 
+from services.cashflow_pipeline import CashFlowPipeline, NoTrialBalanceData, ChangeSetAlreadyApplied
+from services.model_registry import model_registry
+from services.database import get_engine, dispose_engine, pool_status
+from services.job_store import JobStore, JobManager, caller_id
+from services.batch_runner import BatchRunner
+from services.metrics import observe_http_request, render_metrics
+from services.cashflow_export import EXPORT_MEDIA_TYPES, cashflow_table, serialize_table
+from services.tb_cube import SEGMENT_DIMENSIONS
+
+logger = logging.getLogger(__name__)
+
+job_manager: Optional[JobManager] = None
+
+async def load_models() -> None:
+    """
+    Load and warm up the classifier off the event loop, then start the job workers
+
+    Runs in the background so the worker serves /health (503 while loading)
+    from the start; /api routes answer 503 until the model is ready.
+    """
+    try:
+        await run_in_threadpool(model_registry.load)
+    except Exception as e:
+        logger.error(f"Model registry failed to load: {str(e)}")
+        return
+
+    await job_manager.start()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start loading the classifier model once per worker; requests are accepted meanwhile"""
+    global job_manager
+
+    job_manager = JobManager(
+        store=JobStore(os.getenv("JOB_STORE_PATH", "./cache/jobs.sqlite3")),
+        run_job=run_cashflow_job,
+        workers=int(os.getenv("JOB_WORKERS", "2")),
+        lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "60")),
+        retention_seconds=float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+    )
+    loader = asyncio.create_task(load_models())
+
+    yield
+
+    # A load in progress cannot be interrupted; wait for it before releasing the model
+    await asyncio.gather(loader, return_exceptions=True)
+    await job_manager.stop()
+    job_manager.store.close()
+    model_registry.shutdown()
+    dispose_engine()
+
 app = FastAPI(
     title="Cash Flow Calculation Service",
     description="AI-powered cash flow statement generation using consolidated trial balance data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -34,6 +89,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Per-route latency histogram for /metrics (route templates, not raw paths)"""
+    started = time.perf_counter()
+    status = 500
+
+    try:
+        if request.url.path.startswith("/api/") and not model_registry.ready:
+            status = 503
+            return JSONResponse(
+                status_code=503,
+                content={"detail": "Model is loading", "model": model_registry.status()},
+                headers={"Retry-After": "5"}
+            )
+
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        observe_http_request(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+            seconds=time.perf_counter() - started
+        )
+
 # Request/Response Models
 class CashFlowRequest(BaseModel):
     company_id: str
@@ -42,6 +124,16 @@ class CashFlowRequest(BaseModel):
     use_ai: bool = True
     openai_api_key: Optional[str] = None
 
+class TrialBalanceChange(BaseModel):
+    account_code: str
+    period: str
+    debit: float = 0.0   # Amount added to the account's debits
+    credit: float = 0.0  # Amount added to the account's credits
+
+class CashFlowRecalculateRequest(CashFlowRequest):
+    change_set_id: str  # Unique per posted change set (e.g. the journal id); retries reuse it
+    changes: List[TrialBalanceChange]
+
 class CashFlowComponent(BaseModel):
     id: str
     name: str
@@ -65,6 +157,87 @@ class CashFlowResponse(BaseModel):
     net_cash_change: float
     metadata: Dict[str, Any]
 
+class CashFlowPeriodsRequest(BaseModel):
+    company_id: str
+    periods: List[str]  # Ordered, oldest first
+
+class CashFlowPeriodTotals(BaseModel):
+    current_period: str
+    previous_period: str
+    operating_total: float
+    investing_total: float
+    financing_total: float
+    net_cash_change: float
+    component_count: int
+
+class CashFlowMatrixComponent(BaseModel):
+    id: str
+    name: str
+    category: str
+    accounts: List[str]
+    formula: str
+    # One value per period pair; None where the component is immaterial
+    current_value: List[Optional[float]]
+    previous_value: List[Optional[float]]
+    movement: List[Optional[float]]
+    cash_impact: List[Optional[float]]
+
+class CashFlowPeriodsResponse(BaseModel):
+    success: bool
+    periods: List[CashFlowPeriodTotals]
+    components: List[CashFlowMatrixComponent]
+    metadata: Dict[str, Any]
+
+class CashFlowDrilldownRequest(BaseModel):
+    company_id: str
+    current_period: str
+    previous_period: str
+    by: str = "entity"  # entity or region
+    entities: Optional[List[str]] = None  # Entity codes to consolidate; all when omitted
+    refresh: bool = False  # Reload balances instead of using the cached cube
+
+class CashFlowSegmentBreakdown(BaseModel):
+    # One value per segment, aligned with CashFlowDrilldownResponse.segments
+    current_value: List[float]
+    previous_value: List[float]
+    movement: List[float]
+    cash_impact: List[float]
+
+class CashFlowDrilldownComponent(CashFlowComponent):
+    segments: Optional[CashFlowSegmentBreakdown] = None
+
+class CashFlowSegmentTotals(BaseModel):
+    segment: str
+    segment_name: Optional[str] = None
+    operating_total: float
+    investing_total: float
+    financing_total: float
+    net_cash_change: float
+
+class CashFlowDrilldownResponse(BaseModel):
+    success: bool
+    current_period: str
+    previous_period: str
+    components: List[CashFlowDrilldownComponent]
+    operating_total: float
+    investing_total: float
+    financing_total: float
+    net_cash_change: float
+    segments: List[CashFlowSegmentTotals]
+    metadata: Dict[str, Any]
+
+class BatchJobRequest(BaseModel):
+    company_id: str
+    current_period: str
+    previous_period: str
+
+class CashFlowBatchRequest(BaseModel):
+    jobs: List[BatchJobRequest]
+    use_ai: bool = False
+    openai_api_key: Optional[str] = None
+    workers: Optional[int] = None  # CLI only; the API uses the shared BATCH_WORKERS pool
+    include_results: bool = True
+
 # Health Check
 @app.get("/")
 async def root():
@@ -76,11 +249,66 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    """503 while the model is loading (or failed to load, see model.error), 200 once ready"""
+    if not model_registry.ready:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "failed" if model_registry.load_error else "starting",
+                "model": model_registry.status()
+            }
+        )
+    return {"status": "healthy", "model": model_registry.status()}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage durations, rows, cache hit rates, LLM calls and tokens, request latency"""
+    content, content_type = render_metrics()
+    return Response(content=content, headers={"Content-Type": content_type})
+
+# Internal diagnostics carry no auth, so they are only bound when enabled
+# (e.g. on a private port or in development)
+if os.getenv("INTERNAL_ENDPOINTS_ENABLED", "false").lower() == "true":
+    @app.get("/internal/db-pool")
+    async def db_pool():
+        """Connection pool usage for the shared database engine"""
+        return pool_status()
+
+def build_cashflow_response(request: CashFlowRequest, result: Dict[str, Any]) -> CashFlowResponse:
+    """Wrap a CashFlowPipeline result in the API response model"""
+    return CashFlowResponse(
+        success=True,
+        current_period=request.current_period,
+        previous_period=request.previous_period,
+        components=[CashFlowComponent(**c) for c in result["components"]],
+        operating_total=result["operating_total"],
+        investing_total=result["investing_total"],
+        financing_total=result["financing_total"],
+        net_cash_change=result["net_cash_change"],
+        metadata=result["metadata"]
+    )
+
+def build_cashflow_export(
+    request: CashFlowRequest,
+    result: Dict[str, Any],
+    movements: pd.DataFrame,
+    export_format: str
+) -> Response:
+    """Serialize a CashFlowPipeline result as a Parquet or Arrow IPC attachment"""
+    table = cashflow_table(result, movements, request.current_period, request.previous_period)
+    filename = f"cashflow-{request.company_id}-{request.current_period}.{export_format}"
+
+    return Response(
+        content=serialize_table(table, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 # Main Cash Flow Generation Endpoint
+GENERATE_FORMATS = ("json", *EXPORT_MEDIA_TYPES)
+
 @app.post("/api/cashflow/generate", response_model=CashFlowResponse)
-async def generate_cashflow(request: CashFlowRequest):
+async def generate_cashflow(request: CashFlowRequest, format: str = "json"):
     """
     Generate cash flow statement using AI-powered classification and calculation
 
@@ -90,110 +318,332 @@ async def generate_cashflow(request: CashFlowRequest):
     3. Calculate movements and cash impacts
     4. Use LangChain to orchestrate and validate
     5. Return structured cash flow statement
+
+    format=parquet or format=arrow returns the statement as a single table
+    of account movements tagged with their components, with the components
+    and totals in the schema metadata (see services.cashflow_export).
     """
+    if format not in GENERATE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(GENERATE_FORMATS)}")
+
     try:
-        # Initialize services
-        data_loader = ConsolidationDataLoader(os.getenv("DATABASE_URL"))
-        classifier = AccountClassifier()
-        calculator = CashFlowCalculator()
+        pipeline = CashFlowPipeline(engine=get_engine(), registry=model_registry)
 
-        # Load consolidated data
-        current_data = data_loader.load_consolidated_tb(
+        result = await pipeline.run(
             company_id=request.company_id,
-            period=request.current_period
+            current_period=request.current_period,
+            previous_period=request.previous_period,
+            use_ai=request.use_ai,
+            api_key=request.openai_api_key or os.getenv("OPENAI_API_KEY")
         )
 
-        previous_data = data_loader.load_consolidated_tb(
+        if format != "json":
+            return await run_in_threadpool(build_cashflow_export, request, result, pipeline.movements, format)
+
+        return build_cashflow_response(request, result)
+
+    except NoTrialBalanceData as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming Cash Flow Generation Endpoint
+@app.post("/api/cashflow/generate/stream")
+async def generate_cashflow_stream(request: CashFlowRequest):
+    """
+    Generate a cash flow statement as a stream of Server-Sent Events
+
+    Events, in order:
+    - components: deterministic components, sent as soon as they are calculated
+    - enhancement: one per component as its AI enhancement completes
+      (id, confidence_score, ai_suggested_name, ai_notes)
+    - totals: category totals, net cash change and metadata
+    - error: sent instead of the remaining events if enhancement fails
+
+    Load, classification and calculation run before the response starts, so
+    missing data still returns a plain 404.
+    """
+    api_key = request.openai_api_key or os.getenv("OPENAI_API_KEY")
+
+    try:
+        pipeline = CashFlowPipeline(engine=get_engine(), registry=model_registry)
+
+        components, coa_data, classifications = await pipeline.prepare(
             company_id=request.company_id,
-            period=request.previous_period
+            current_period=request.current_period,
+            previous_period=request.previous_period
         )
 
-        if current_data.empty or previous_data.empty:
-            raise HTTPException(
-                status_code=404,
-                detail="No trial balance data found for specified periods"
-            )
+    except NoTrialBalanceData as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events() -> AsyncIterator[str]:
+        yield sse_event("components", {
+            "current_period": request.current_period,
+            "previous_period": request.previous_period,
+            "components": [CashFlowComponent(**c).model_dump() for c in components]
+        })
 
-        # Load Chart of Accounts for context
-        coa_data = data_loader.load_chart_of_accounts(company_id=request.company_id)
+        try:
+            if pipeline.uses_ai(request.use_ai, api_key):
+                async for component in pipeline.stream_enhancements(components, coa_data, api_key):
+                    yield sse_event("enhancement", {
+                        "id": component["id"],
+                        "confidence_score": component.get("confidence_score"),
+                        "ai_suggested_name": component.get("ai_suggested_name"),
+                        "ai_notes": component.get("ai_notes")
+                    })
 
-        # Classify accounts using semantic embeddings
-        classified_accounts = classifier.classify_accounts(
-            coa_data=coa_data,
-            tb_data=current_data
+            yield sse_event("totals", {
+                **pipeline.summarize(components),
+                "metadata": pipeline.metadata(components, classifications, request.use_ai)
+            })
+
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Incremental Recalculation Endpoint
+@app.post("/api/cashflow/recalculate", response_model=CashFlowResponse)
+async def recalculate_cashflow(request: CashFlowRecalculateRequest):
+    """
+    Update the last generated statement after a few TB rows changed
+
+    Send the posted deltas (e.g. a late journal's lines). Only components
+    containing a changed account are recalculated and only materially
+    changed ones are re-enhanced; without a previous result for the company
+    and period pair the full pipeline runs. A change_set_id that was already
+    applied is rejected with 409, so retried POSTs don't count deltas twice.
+    """
+    try:
+        pipeline = CashFlowPipeline(engine=get_engine(), registry=model_registry)
+
+        result = await pipeline.recalculate(
+            company_id=request.company_id,
+            current_period=request.current_period,
+            previous_period=request.previous_period,
+            changes=[change.model_dump() for change in request.changes],
+            change_set_id=request.change_set_id,
+            use_ai=request.use_ai,
+            api_key=request.openai_api_key or os.getenv("OPENAI_API_KEY")
         )
 
-        # Calculate cash flow components
-        components = calculator.calculate_components(
-            current_tb=current_data,
-            previous_tb=previous_data,
-            classifications=classified_accounts,
-            coa_data=coa_data
+        return build_cashflow_response(request, result)
+
+    except ChangeSetAlreadyApplied as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except NoTrialBalanceData as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Multi-Period Cash Flow Endpoint
+@app.post("/api/cashflow/generate/periods", response_model=CashFlowPeriodsResponse)
+async def generate_cashflow_periods(request: CashFlowPeriodsRequest):
+    """
+    Generate cash flows for every consecutive pair of an ordered period list
+
+    One query loads all trial balances, accounts are classified once and
+    movements for all pairs are calculated in a single vectorized pass.
+    Returns per-pair totals and a component x pair matrix.
+    """
+    try:
+        pipeline = CashFlowPipeline(engine=get_engine(), registry=model_registry)
+
+        result = await pipeline.run_periods(
+            company_id=request.company_id,
+            periods=request.periods
         )
 
-        # Use LangChain orchestration if AI is enabled
-        if request.use_ai:
-            api_key = request.openai_api_key or os.getenv("OPENAI_API_KEY")
-            if api_key:
-                orchestrator = CashFlowOrchestrator(api_key=api_key)
-                components = orchestrator.enhance_components(
-                    components=components,
-                    current_data=current_data,
-                    previous_data=previous_data,
-                    coa_data=coa_data
-                )
-
-        # Calculate totals
-        operating_total = sum(c['cash_impact'] for c in components if c['category'] == 'Operating')
-        investing_total = sum(c['cash_impact'] for c in components if c['category'] == 'Investing')
-        financing_total = sum(c['cash_impact'] for c in components if c['category'] == 'Financing')
-        net_cash_change = operating_total + investing_total + financing_total
-
-        # Build response
-        response = CashFlowResponse(
+        return CashFlowPeriodsResponse(success=True, **result)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NoTrialBalanceData as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Entity / Segment Drill-Down Endpoint
+@app.post("/api/cashflow/drilldown", response_model=CashFlowDrilldownResponse)
+async def drilldown_cashflow(request: CashFlowDrilldownRequest):
+    """
+    Consolidated cash flow with each component split by entity or region
+
+    Entity-grain balances are loaded once per company and period pair into
+    an in-memory cube (services.tb_cube). Further drill-downs (another
+    dimension, a subset of entities) are calculated from the cached cube
+    without querying the database. Set refresh to reload it.
+    """
+    if request.by not in SEGMENT_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"by must be one of {', '.join(SEGMENT_DIMENSIONS)}")
+
+    try:
+        pipeline = CashFlowPipeline(engine=get_engine(), registry=model_registry)
+
+        result = await pipeline.run_drilldown(
+            company_id=request.company_id,
+            current_period=request.current_period,
+            previous_period=request.previous_period,
+            by=request.by,
+            entities=request.entities,
+            refresh=request.refresh
+        )
+
+        return CashFlowDrilldownResponse(
             success=True,
             current_period=request.current_period,
             previous_period=request.previous_period,
-            components=[CashFlowComponent(**c) for c in components],
-            operating_total=operating_total,
-            investing_total=investing_total,
-            financing_total=financing_total,
-            net_cash_change=net_cash_change,
-            metadata={
-                "total_components": len(components),
-                "ai_enhanced": request.use_ai,
-                "accounts_classified": len(classified_accounts)
-            }
+            **result
         )
 
-        return response
+    except NoTrialBalanceData as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Batch Generation Endpoint
+@app.post("/api/cashflow/batch")
+async def generate_cashflow_batch(request: CashFlowBatchRequest):
+    """
+    Generate cash flows for many company/period pairs on a process pool
+
+    Companies with identical charts of accounts share one classification.
+    Failed jobs are listed in the report; they never abort the batch.
+    Batches run on the registry's shared process pool (BATCH_WORKERS
+    processes), whose workers keep their loaded model between requests;
+    request.workers is not used here. For month-end runs over hundreds of
+    companies prefer the CLI (python -m services.batch_runner), which does
+    not hold a request open.
+    """
+    try:
+        pool = model_registry.batch_pool()
+        runner = BatchRunner(
+            engine=get_engine(),
+            workers=model_registry.batch_workers,
+            use_ai=request.use_ai,
+            api_key=request.openai_api_key or os.getenv("OPENAI_API_KEY"),
+            pool=pool
+        )
+
+        report = await run_in_threadpool(
+            runner.run,
+            [job.model_dump() for job in request.jobs],
+            include_results=request.include_results
+        )
+
+        if runner.pool_broken:
+            model_registry.discard_batch_pool(pool)
+        return report
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Background Job Endpoints
+async def run_cashflow_job(request_data: Dict[str, Any], secrets: Dict[str, Any], progress) -> Dict[str, Any]:
+    """Execute one queued generation job (see services.job_store.JobManager)"""
+    request = CashFlowRequest(**request_data)
+    pipeline = CashFlowPipeline(engine=get_engine(), registry=model_registry)
+
+    result = await pipeline.run(
+        company_id=request.company_id,
+        current_period=request.current_period,
+        previous_period=request.previous_period,
+        use_ai=request.use_ai,
+        # A caller key is always in secrets: a job that lost it fails before running
+        api_key=secrets.get("openai_api_key") or os.getenv("OPENAI_API_KEY"),
+        progress=progress
+    )
+
+    return build_cashflow_response(request, result).model_dump()
+
+@app.post("/api/cashflow/jobs", status_code=202)
+async def submit_cashflow_job(request: CashFlowRequest):
+    """
+    Queue a cash flow generation job and return its id immediately
+
+    An identical request from the same caller (API key) that is still
+    queued or running is not started twice; its existing job id is returned
+    instead.
+    """
+    # The API key is only held in memory for the run, never persisted; its
+    # hash keeps different callers' requests apart. A job resumed by another
+    # worker fails asking for a resubmit rather than fall back to the server key
+    job, created = await job_manager.submit(
+        request=request.model_dump(exclude={"openai_api_key"}),
+        secrets={"openai_api_key": request.openai_api_key} if request.openai_api_key and request.use_ai else None,
+        caller=caller_id(request.openai_api_key)
+    )
+
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "deduplicated": not created
+    }
+
+@app.get("/api/cashflow/jobs/{job_id}")
+async def get_cashflow_job(job_id: str):
+    """
+    Job status, per-stage progress and, once finished, the CashFlowResponse
+    """
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
 # Classification Testing Endpoint
+CLASSIFY_FORMATS = ("records", "columnar", "arrow")
+
 @app.post("/api/cashflow/classify")
-async def classify_accounts(company_id: str):
+async def classify_accounts(company_id: str, format: str = "records"):
     """
     Test account classification for a company
+
+    format=records returns one object per account. For large charts of
+    accounts, format=columnar returns one list per field (see
+    ClassificationResult.to_columnar) and format=arrow returns an Arrow IPC
+    stream.
     """
+    if format not in CLASSIFY_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(CLASSIFY_FORMATS)}")
+
     try:
-        data_loader = ConsolidationDataLoader(os.getenv("DATABASE_URL"))
-        classifier = AccountClassifier()
+        pipeline = CashFlowPipeline(engine=get_engine(), registry=model_registry)
 
-        coa_data = data_loader.load_chart_of_accounts(company_id=company_id)
+        coa_data = await pipeline.load_chart_of_accounts(company_id)
 
         if coa_data.empty:
             raise HTTPException(status_code=404, detail="No chart of accounts found")
 
-        classifications = classifier.classify_accounts(coa_data=coa_data)
+        classifications = await pipeline.classify(company_id, coa_data)
+
+        if format == "arrow":
+            content = await run_in_threadpool(classifications.to_arrow_ipc)
+            return Response(content=content, media_type="application/vnd.apache.arrow.stream")
 
         return {
             "success": True,
             "total_accounts": len(classifications),
-            "classifications": classifications
+            "format": format,
+            "classifications": (
+                classifications.to_columnar() if format == "columnar" else classifications.to_records()
+            )
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -3,29 +3,69 @@ Account Classifier Service
 Uses sentence-transformers for semantic account classification
 """
 
-from sentence_transformers import SentenceTransformer, util
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Optional, Any
+import hashlib
 import logging
+import json
 import os
 
+from services.embedding_cache import EmbeddingCache, normalize_text
+from services.classification_result import ClassificationResult
+from services.rule_classifier import RuleClassifier, load_rule_mappings
+from services.inference_backend import load_encoder, model_key
+
 logger = logging.getLogger(__name__)
 
+# Bump when classification logic changes so cached results are invalidated
+CLASSIFIER_VERSION = "3"
+
+# Confidence given to rule-tier classifications
+RULE_CONFIDENCE = 1.0
+
 class AccountClassifier:
     """
     Classifies chart of accounts using semantic embeddings for cash flow categorization
     """
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        batch_size: int = 64,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        model: Optional[Any] = None,
+        rule_tier: Optional[bool] = None,
+        rule_mappings: Optional[Dict[str, str]] = None,
+        backend: Optional[str] = None
+    ):
         """
         Initialize with a sentence transformer model
 
         Args:
             model_name: HuggingFace model name (default: all-MiniLM-L6-v2 - fast and accurate)
+            batch_size: Number of account texts encoded per forward pass
+            embedding_cache: Optional persistent cache for account text embeddings
+            model: Optional preloaded encoder with SentenceTransformer's encode()
+                signature (e.g. benchmarks.fakes.StubEmbeddingModel); model_name
+                then only identifies it in cache keys
+            rule_tier: Resolve accounts whose name matches a single category's
+                phrases without the model (see services.rule_classifier).
+                Defaults to CLASSIFIER_RULE_TIER, else off.
+            rule_mappings: Extra phrase -> category rules, checked before the
+                template keywords. Defaults to the JSON file at CLASSIFIER_RULES_PATH.
+            backend: Inference backend for the model (torch, int8, onnx or
+                onnx-int8; see services.inference_backend). Defaults to
+                CLASSIFIER_BACKEND, else torch.
         """
-        logger.info(f"Loading sentence transformer model: {model_name}")
-        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self.backend = backend or os.getenv("CLASSIFIER_BACKEND", "torch")
+        self.batch_size = batch_size
+        self.embedding_cache = embedding_cache
+        if model is not None:
+            self.model = model
+        else:
+            self.model = load_encoder(model_name, self.backend, os.getenv("CLASSIFIER_ONNX_DIR"))
 
         # Cash Flow Classification Templates
         self.cf_templates = {
@@ -86,18 +126,112 @@ class AccountClassifier:
             ]
         }
 
-        # Pre-compute embeddings for templates
+        # Pre-compute embeddings for templates, stacked into one (categories x dim) matrix
         logger.info("Computing embeddings for classification templates...")
-        self.template_embeddings = {}
-        for category, keywords in self.cf_templates.items():
-            combined_text = " ".join(keywords)
-            self.template_embeddings[category] = self.model.encode(
-                combined_text,
-                convert_to_tensor=True
-            )
+        self.categories = list(self.cf_templates.keys())
+        self.template_matrix = self._encode(
+            [" ".join(keywords) for keywords in self.cf_templates.values()]
+        )
+
+        if rule_tier is None:
+            rule_tier = os.getenv("CLASSIFIER_RULE_TIER", "false").lower() == "true"
+        if rule_mappings is None:
+            rule_mappings = load_rule_mappings(os.getenv("CLASSIFIER_RULES_PATH"))
+        self.rule_classifier = RuleClassifier(self.cf_templates, rule_mappings) if rule_tier else None
+
+        self.fingerprint = hashlib.sha256(json.dumps({
+            "model": model_key(model_name, self.backend),
+            "templates": self.cf_templates,
+            "rules": self.rule_classifier.fingerprint_data() if self.rule_classifier else None,
+            "version": CLASSIFIER_VERSION
+        }, sort_keys=True).encode("utf-8")).hexdigest()
 
         logger.info(f"Classifier initialized with {len(self.cf_templates)} categories")
 
+    def warm_up(self, sample_text: str = "trade receivables") -> None:
+        """
+        Run a throwaway encode so the first real request does not pay lazy initialization
+        """
+        self._encode([sample_text])
+
+    def _encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Encode texts into L2-normalized float32 embeddings, one row per text
+        """
+        embeddings = self.model.encode(
+            texts,
+            batch_size=batch_size or self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def _embed(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        """
+        Embeddings for normalized account texts, only encoding cache misses
+        """
+        if self.embedding_cache is None:
+            if stats is not None:
+                stats["texts_encoded"] = stats.get("texts_encoded", 0) + len(texts)
+            return self._encode(texts, batch_size)
+
+        found, missing = self.embedding_cache.get_many(texts)
+        if stats is not None:
+            stats["embedding_cache_hits"] = stats.get("embedding_cache_hits", 0) + len(found)
+            stats["embedding_cache_misses"] = stats.get("embedding_cache_misses", 0) + len(missing)
+            stats["texts_encoded"] = stats.get("texts_encoded", 0) + len(missing)
+        if missing:
+            encoded = dict(zip(missing, self._encode(missing, batch_size)))
+            self.embedding_cache.put_many(encoded)
+            found.update(encoded)
+
+        return np.stack([found[text] for text in texts])
+
+    def _score_texts(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        """
+        Cosine similarity of every text against every template
+
+        Duplicate texts are encoded once and known texts come from the
+        embedding cache. Since both sides are normalized, the similarity
+        matrix is a single matrix multiply.
+
+        Returns:
+            (len(texts), len(categories)) float32 score matrix
+        """
+        if not texts:
+            return np.zeros((0, len(self.categories)), dtype=np.float32)
+
+        normalized = np.asarray([normalize_text(text) for text in texts], dtype=object)
+        unique_texts, inverse = np.unique(normalized, return_inverse=True)
+        embeddings = self._embed(unique_texts.tolist(), batch_size, stats)
+        return (embeddings @ self.template_matrix.T)[inverse]
+
+    @staticmethod
+    def _account_texts(coa_data: pd.DataFrame) -> List[str]:
+        """Build the lowercased "name class note sub-note" text for every COA row"""
+        hierarchy_columns = [
+            coa_data[column].tolist() if column in coa_data.columns else [None] * len(coa_data)
+            for column in ("class_name", "note_name", "sub_note_name")
+        ]
+
+        texts = []
+        for account_name, *hierarchy in zip(coa_data['account_name'].tolist(), *hierarchy_columns):
+            account_desc = " ".join(part for part in hierarchy if pd.notna(part))
+            texts.append(f"{account_name} {account_desc}".strip().lower())
+
+        return texts
+
     def classify_account(self, account_name: str, account_desc: str = "") -> Dict[str, float]:
         """
         Classify a single account using semantic similarity
@@ -112,82 +246,112 @@ class AccountClassifier:
         # Combine account name and description
         text = f"{account_name} {account_desc}".strip().lower()
 
-        # Encode the account text
-        account_embedding = self.model.encode(text, convert_to_tensor=True)
-
-        # Calculate similarity scores
-        scores = {}
-        for category, template_embedding in self.template_embeddings.items():
-            similarity = util.cos_sim(account_embedding, template_embedding).item()
-            scores[category] = similarity
-
-        return scores
+        similarities = self._score_texts([text])[0]
+        return dict(zip(self.categories, map(float, similarities)))
 
     def classify_accounts(
         self,
         coa_data: pd.DataFrame,
-        tb_data: pd.DataFrame = None
-    ) -> Dict[str, Dict]:
+        tb_data: pd.DataFrame = None,
+        batch_size: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> ClassificationResult:
         """
         Classify all accounts in the chart of accounts
 
+        Accounts the rule tier resolves get that category with confidence
+        RULE_CONFIDENCE; the model never sees them, so their score rows are
+        NaN and their tier is "rule". The remaining account texts are encoded
+        in batches and scored against the template matrix in one pass rather
+        than one forward pass per row.
+
         Args:
             coa_data: DataFrame with account_code, account_name, class_name, note_name, etc.
             tb_data: Optional trial balance data to prioritize material accounts
+            batch_size: Encoding batch size (defaults to the classifier's batch_size)
+            stats: Optional dict that receives embedding cache hits/misses, texts
+                encoded and how many accounts each tier resolved (rule_tier, model_tier)
 
         Returns:
-            Dict mapping account_code to classification result
+            ClassificationResult keyed by account_code (a read-only mapping whose
+            values are the per-account dicts; a code on several COA rows keeps
+            the last row)
         """
-        classifications = {}
-
-        for _, row in coa_data.iterrows():
-            account_code = row['account_code']
-            account_name = row['account_name']
-
-            # Build description from hierarchy
-            desc_parts = []
-            if pd.notna(row.get('class_name')):
-                desc_parts.append(row['class_name'])
-            if pd.notna(row.get('note_name')):
-                desc_parts.append(row['note_name'])
-            if pd.notna(row.get('sub_note_name')):
-                desc_parts.append(row['sub_note_name'])
-
-            account_desc = " ".join(desc_parts)
-
-            # Classify
-            scores = self.classify_account(account_name, account_desc)
-
-            # Get top category
-            top_category = max(scores, key=scores.get)
-            confidence = scores[top_category]
-
-            # Map to cash flow category (Operating/Investing/Financing)
-            cf_category, cf_component = self._map_to_cashflow_category(
-                top_category,
-                scores,
-                row
-            )
-
-            classifications[account_code] = {
-                "account_name": account_name,
-                "top_category": top_category,
-                "confidence": confidence,
-                "all_scores": scores,
-                "cf_category": cf_category,
-                "cf_component": cf_component,
-                "class_name": row.get('class_name'),
-                "note_name": row.get('note_name')
-            }
-
-        logger.info(f"Classified {len(classifications)} accounts")
+        # Last row wins for a repeated code, at the position it first appeared
+        positions: Dict[Any, int] = {}
+        for position, account_code in enumerate(coa_data['account_code'].tolist()):
+            positions[account_code] = position
+        rows = np.fromiter(positions.values(), dtype=np.intp, count=len(positions))
+
+        rule_indices = (
+            self.rule_classifier.match_rows(coa_data, rows) if self.rule_classifier is not None
+            else np.full(len(rows), -1, dtype=np.int16)
+        )
+        resolved = rule_indices >= 0
+
+        # Only model scores go in the score matrix; rule rows stay NaN
+        scores = np.full((len(rows), len(self.categories)), np.nan, dtype=np.float32)
+        top_indices = rule_indices.astype(np.intp)
+        confidence = np.full(len(rows), RULE_CONFIDENCE, dtype=np.float32)
+        if not resolved.all():
+            texts = self._account_texts(coa_data.iloc[rows[~resolved]])
+            model_scores = self._score_texts(texts, batch_size, stats)
+            scores[~resolved] = model_scores
+            top_indices[~resolved] = model_scores.argmax(axis=1)
+            confidence[~resolved] = model_scores[np.arange(len(model_scores)), top_indices[~resolved]]
+
+        if stats is not None:
+            stats["rule_tier"] = stats.get("rule_tier", 0) + int(resolved.sum())
+            stats["model_tier"] = stats.get("model_tier", 0) + int((~resolved).sum())
+
+        def column(name: str) -> np.ndarray:
+            if name not in coa_data.columns:
+                return np.full(len(rows), None, dtype=object)
+            return coa_data[name].to_numpy(dtype=object)[rows]
+
+        class_names = column('class_name')
+
+        # Map to cash flow category (Operating/Investing/Financing); the mapping only
+        # depends on the top category and class, so it runs once per distinct pair
+        mapped: Dict[Tuple[int, Any], Tuple[str, str]] = {}
+        cf_categories, cf_components = [], []
+        for index, (top_index, class_name) in enumerate(zip(top_indices.tolist(), class_names.tolist())):
+            key = (top_index, class_name)
+            if key not in mapped:
+                mapped[key] = self._map_to_cashflow_category(
+                    self.categories[top_index],
+                    dict(zip(self.categories, map(float, scores[index]))),
+                    coa_data.iloc[rows[index]].to_dict()
+                )
+            cf_category, cf_component = mapped[key]
+            cf_categories.append(cf_category)
+            cf_components.append(cf_component)
+
+        classifications = ClassificationResult(
+            codes=list(positions),
+            categories=self.categories,
+            top_index=top_indices,
+            confidence=confidence,
+            scores=scores,
+            cf_category=cf_categories,
+            cf_component=cf_components,
+            account_name=column('account_name'),
+            class_name=class_names,
+            note_name=column('note_name'),
+            tier=np.where(resolved, "rule", "model")
+        )
+
+        logger.info(
+            f"Classified {len(classifications)} accounts "
+            f"({int(resolved.sum())} by rules, {int((~resolved).sum())} by the model)"
+        )
         return classifications
 
     def _map_to_cashflow_category(
         self,
         top_category: str,
         scores: Dict[str, float],
-        row: pd.Series
+        row: Dict
     ) -> Tuple[str, str]:
         """
         Map the detailed classification to Operating/Investing/Financing
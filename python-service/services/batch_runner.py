@@ -0,0 +1,377 @@
+"""
+Batch Runner Service
+Generates cash flows for many companies at once on a process pool
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy.engine import Engine
+from typing import Dict, List, Any, Optional
+import multiprocessing
+import pandas as pd
+import numpy as np
+import argparse
+import asyncio
+import logging
+import time
+import json
+import csv
+import os
+
+from services.data_loader import ConsolidationDataLoader
+from services.cashflow_pipeline import CashFlowPipeline
+from services.classification_cache import coa_fingerprint
+from services.classification_result import ClassificationResult
+from services.database import get_engine
+from services.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+JOB_FIELDS = ("company_id", "current_period", "previous_period")
+
+def _init_worker() -> None:
+    """Process-pool initializer: each worker loads its own classifier once"""
+    model_registry.load()
+
+def create_pool(workers: int) -> ProcessPoolExecutor:
+    """Spawn-context process pool whose workers each load the classifier once"""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker
+    )
+
+def _classify_coa(coa_data: pd.DataFrame) -> ClassificationResult:
+    """Worker task: classify one distinct chart of accounts"""
+    return model_registry.classifier.classify_accounts(coa_data)
+
+def _generate(
+    job: Dict[str, str],
+    coa_data: pd.DataFrame,
+    classifications: Dict[str, Dict],
+    use_ai: bool,
+    api_key: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Worker task: load movements and calculate components for one job
+
+    Errors are returned rather than raised so a bad company never aborts the batch.
+    """
+    started = time.perf_counter()
+
+    try:
+        pipeline = CashFlowPipeline(engine=get_engine(), registry=model_registry)
+
+        with pipeline.trace.span("load_tb") as span:
+            movements = pipeline.data_loader.load_tb_movements(
+                company_id=job["company_id"],
+                current_period=job["current_period"],
+                previous_period=job["previous_period"]
+            )
+            span.rows = int(movements['current_rows'].sum() + movements['previous_rows'].sum())
+        if not (movements['current_rows'] > 0).any() or not (movements['previous_rows'] > 0).any():
+            raise LookupError("No trial balance data found for specified periods")
+
+        with pipeline.trace.span("calculate", rows=len(movements)) as span:
+            components = pipeline.calculator.calculate_components(
+                current_tb=None,
+                previous_tb=None,
+                classifications=classifications,
+                coa_data=coa_data,
+                movements=movements
+            )
+            span.set(components=len(components))
+
+        enhanced = pipeline.uses_ai(use_ai, api_key)
+        if enhanced:
+            components = asyncio.run(pipeline.enhance(components, coa_data, api_key))
+
+        return {
+            "status": "succeeded",
+            "run_seconds": time.perf_counter() - started,
+            "result": {
+                "components": components,
+                **CashFlowPipeline.summarize(components),
+                "metadata": pipeline.metadata(components, classifications, enhanced)
+            }
+        }
+
+    except Exception as e:
+        return {
+            "status": "failed",
+            "run_seconds": time.perf_counter() - started,
+            "error": f"{type(e).__name__}: {e}"
+        }
+
+class BatchRunner:
+    """
+    Fans company/period jobs out over a process pool
+
+    Each worker process loads its own AccountClassifier. Charts of accounts
+    are loaded once per company and grouped by content fingerprint, so
+    companies with identical COAs share a single classification. One failing
+    job is recorded in the report and never stops the rest of the batch. If
+    a worker crashes and breaks the pool, every job not yet finished is
+    recorded as failed and pool_broken is set.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[Engine] = None,
+        workers: Optional[int] = None,
+        use_ai: bool = False,
+        api_key: Optional[str] = None,
+        coa_load_concurrency: int = 8,
+        pool: Optional[ProcessPoolExecutor] = None
+    ):
+        """
+        Args:
+            engine: Engine used by the parent to load charts of accounts
+            workers: Worker processes (default BATCH_WORKERS or the CPU count);
+                ignored when pool is given
+            use_ai: Enhance components with the LLM inside each worker
+            api_key: OpenAI API key used when use_ai is set
+            coa_load_concurrency: Parallel COA queries in the parent
+            pool: Long-lived pool from create_pool (e.g. ModelRegistry.batch_pool),
+                so workers keep their loaded model between batches. A pool is
+                created and shut down per run when omitted.
+        """
+        self.engine = engine if engine is not None else get_engine()
+        self.workers = workers or int(os.getenv("BATCH_WORKERS", str(os.cpu_count() or 1)))
+        self.use_ai = use_ai
+        self.api_key = api_key
+        self.coa_load_concurrency = coa_load_concurrency
+        self.pool = pool
+        self.pool_broken = False
+
+    def run(self, jobs: List[Dict[str, str]], include_results: bool = True) -> Dict[str, Any]:
+        """
+        Run every job and return a report
+
+        Args:
+            jobs: Dicts with company_id, current_period and previous_period
+            include_results: Include each job's components and totals in the report
+
+        Returns:
+            Report with throughput, latency percentiles, failures and per-job outcomes
+        """
+        started = time.perf_counter()
+        outcomes: List[Dict[str, Any]] = [
+            {"index": index, **{field: str(job.get(field, "")) for field in JOB_FIELDS}}
+            for index, job in enumerate(jobs)
+        ]
+
+        pending = []
+        for outcome in outcomes:
+            missing = [field for field in JOB_FIELDS if not outcome[field]]
+            if missing:
+                self._fail(outcome, f"Missing field(s): {', '.join(missing)}")
+            else:
+                pending.append(outcome)
+
+        coas = self._load_charts_of_accounts(sorted({o["company_id"] for o in pending}))
+
+        # Group companies by COA content so identical charts are classified once
+        groups: Dict[str, pd.DataFrame] = {}
+        company_groups: Dict[str, str] = {}
+        for company_id, coa_data in coas.items():
+            if isinstance(coa_data, Exception) or coa_data.empty:
+                continue
+            fingerprint = coa_fingerprint(coa_data)
+            groups.setdefault(fingerprint, coa_data)
+            company_groups[company_id] = fingerprint
+
+        logger.info(
+            f"Batch of {len(jobs)} job(s): {len(coas)} companies, "
+            f"{len(groups)} distinct chart(s) of accounts, {self.workers} worker(s)"
+        )
+
+        if self.pool is not None:
+            self._run_on(self.pool, pending, coas, groups, company_groups, include_results)
+        else:
+            with create_pool(self.workers) as pool:
+                self._run_on(pool, pending, coas, groups, company_groups, include_results)
+
+        return self._report(outcomes, time.perf_counter() - started, len(coas), len(groups))
+
+    def _submit(self, pool: ProcessPoolExecutor, fn: Any, *args: Any) -> Future:
+        """
+        pool.submit, or a future already failed with BrokenProcessPool once a
+        worker crash has broken the pool, so submitting never raises out of run()
+        """
+        if not self.pool_broken:
+            try:
+                return pool.submit(fn, *args)
+            except BrokenProcessPool:
+                self.pool_broken = True
+                logger.error("Batch process pool is broken; remaining jobs are recorded as failed")
+
+        future: Future = Future()
+        future.set_exception(BrokenProcessPool("A worker process terminated abruptly; the pool is unusable"))
+        return future
+
+    def _run_on(
+        self,
+        pool: ProcessPoolExecutor,
+        pending: List[Dict[str, Any]],
+        coas: Dict[str, Any],
+        groups: Dict[str, pd.DataFrame],
+        company_groups: Dict[str, str],
+        include_results: bool
+    ) -> None:
+        """Classify each distinct COA, then generate every pending job, updating outcomes in place"""
+        classification_futures = {
+            self._submit(pool, _classify_coa, coa_data): fingerprint
+            for fingerprint, coa_data in groups.items()
+        }
+        classifications: Dict[str, Any] = {}
+        for future in as_completed(classification_futures):
+            fingerprint = classification_futures[future]
+            try:
+                classifications[fingerprint] = future.result()
+            except Exception as e:
+                classifications[fingerprint] = e
+
+        job_futures = {}
+        for outcome in pending:
+            company_id = outcome["company_id"]
+            coa_data = coas.get(company_id)
+            if isinstance(coa_data, Exception):
+                self._fail(outcome, f"Loading chart of accounts failed: {coa_data}")
+                continue
+            if coa_data is None or coa_data.empty:
+                self._fail(outcome, "No chart of accounts found")
+                continue
+
+            company_classifications = classifications[company_groups[company_id]]
+            if isinstance(company_classifications, Exception):
+                self._fail(outcome, f"Classification failed: {company_classifications}")
+                continue
+
+            outcome["submitted_at"] = time.perf_counter()
+            future = self._submit(
+                pool,
+                _generate,
+                {field: outcome[field] for field in JOB_FIELDS},
+                coa_data,
+                company_classifications,
+                self.use_ai,
+                self.api_key
+            )
+            job_futures[future] = outcome
+
+        for future in as_completed(job_futures):
+            outcome = job_futures[future]
+            outcome["latency_seconds"] = time.perf_counter() - outcome.pop("submitted_at")
+            try:
+                result = future.result()
+            except Exception as e:
+                # e.g. BrokenProcessPool when a worker dies
+                if isinstance(e, BrokenProcessPool):
+                    self.pool_broken = True
+                result = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+            outcome.update(result)
+            if result["status"] == "failed":
+                logger.warning(f"Batch job {outcome['company_id']} failed: {result['error']}")
+            elif not include_results:
+                outcome.pop("result", None)
+
+    def _load_charts_of_accounts(self, company_ids: List[str]) -> Dict[str, Any]:
+        """COA per company, or the exception raised while loading it"""
+        data_loader = ConsolidationDataLoader(engine=self.engine)
+        coas: Dict[str, Any] = {}
+
+        with ThreadPoolExecutor(max_workers=self.coa_load_concurrency) as executor:
+            futures = {
+                executor.submit(data_loader.load_chart_of_accounts, company_id): company_id
+                for company_id in company_ids
+            }
+            for future in as_completed(futures):
+                try:
+                    coas[futures[future]] = future.result()
+                except Exception as e:
+                    coas[futures[future]] = e
+
+        return coas
+
+    @staticmethod
+    def _fail(outcome: Dict[str, Any], error: str) -> None:
+        outcome.update({"status": "failed", "error": error})
+        logger.warning(f"Batch job {outcome['company_id'] or outcome['index']} failed: {error}")
+
+    @staticmethod
+    def _report(
+        outcomes: List[Dict[str, Any]],
+        wall_seconds: float,
+        companies: int,
+        distinct_coas: int
+    ) -> Dict[str, Any]:
+        succeeded = [o for o in outcomes if o["status"] == "succeeded"]
+        latencies = np.array([o["latency_seconds"] for o in outcomes if "latency_seconds" in o])
+
+        def percentile(q: float) -> Optional[float]:
+            return float(np.percentile(latencies, q)) if len(latencies) else None
+
+        return {
+            "jobs": len(outcomes),
+            "succeeded": len(succeeded),
+            "failed": len(outcomes) - len(succeeded),
+            "wall_seconds": wall_seconds,
+            "throughput_jobs_per_second": len(succeeded) / wall_seconds if wall_seconds > 0 else None,
+            "latency_seconds": {
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "max": float(latencies.max()) if len(latencies) else None
+            },
+            "companies": companies,
+            "distinct_charts_of_accounts": distinct_coas,
+            "failures": [
+                {field: o[field] for field in ("index", *JOB_FIELDS, "error")}
+                for o in outcomes if o["status"] == "failed"
+            ],
+            "results": sorted(outcomes, key=lambda o: o["index"])
+        }
+
+def _read_jobs(path: str) -> List[Dict[str, str]]:
+    """Jobs from a JSON list or a CSV with company_id,current_period,previous_period columns"""
+    with open(path, newline="") as handle:
+        if path.lower().endswith(".csv"):
+            return list(csv.DictReader(handle))
+        return json.load(handle)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point: python -m services.batch_runner jobs.csv"""
+    parser = argparse.ArgumentParser(description="Generate cash flows for many companies")
+    parser.add_argument("jobs", help="JSON list or CSV of company_id,current_period,previous_period")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    parser.add_argument("--use-ai", action="store_true", help="Enhance components with the LLM")
+    parser.add_argument("--output", help="Write the full report (with results) to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    runner = BatchRunner(
+        workers=args.workers,
+        use_ai=args.use_ai,
+        api_key=os.getenv("OPENAI_API_KEY")
+    )
+    report = runner.run(_read_jobs(args.jobs), include_results=bool(args.output))
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+    summary = {key: value for key, value in report.items() if key != "results"}
+    print(json.dumps(summary, indent=2))
+    return 0 if report["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    # Loaded before workers spawn so they inherit the same configuration
+    load_dotenv()
+
+    # Run through the package module so worker tasks pickle by their import path
+    from services.batch_runner import main as batch_main
+    raise SystemExit(batch_main())
@@ -5,9 +5,10 @@ Calculates cash flow components using indirect method
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional, Any, Tuple
 import logging
-from collections import defaultdict
+
+from services.classification_result import ClassificationResult
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +19,11 @@ class CashFlowCalculator:
 
     def calculate_components(
         self,
-        current_tb: pd.DataFrame,
-        previous_tb: pd.DataFrame,
+        current_tb: Optional[pd.DataFrame],
+        previous_tb: Optional[pd.DataFrame],
         classifications: Dict[str, Dict],
-        coa_data: pd.DataFrame
+        coa_data: pd.DataFrame,
+        movements: Optional[pd.DataFrame] = None
     ) -> List[Dict]:
         """
         Calculate all cash flow components
@@ -31,69 +33,63 @@ class CashFlowCalculator:
             previous_tb: Previous period consolidated trial balance
             classifications: Account classifications from AccountClassifier
             coa_data: Chart of accounts data
+            movements: Pre-computed movements (e.g. from ConsolidationDataLoader.load_tb_movements);
+                when given, current_tb and previous_tb are not used
 
         Returns:
             List of cash flow components with calculations
         """
-        # Merge current and previous balances
-        movements = self._calculate_movements(current_tb, previous_tb)
-
-        # Group accounts by component
-        component_groups = defaultdict(lambda: {
-            'accounts': [],
-            'current_total': 0,
-            'previous_total': 0,
-            'movement': 0,
-            'category': '',
-            'sign': 1
-        })
+        # Merge current and previous balances unless the loader already did
+        if movements is None:
+            movements = self._calculate_movements(current_tb, previous_tb)
 
-        for _, row in movements.iterrows():
-            account_code = row['account_code']
-
-            if account_code not in classifications:
-                continue
+        matched, frame, component_groups = self._assign_components(
+            movements['account_code'], classifications
+        )
 
-            classification = classifications[account_code]
-            cf_category = classification['cf_category']
-            cf_component = classification['cf_component']
-            class_name = classification.get('class_name', '')
+        if frame.empty:
+            logger.info("Generated 0 cash flow components")
+            return []
 
-            # Determine sign multiplier
-            sign = self._get_sign_multiplier(cf_category, cf_component, class_name)
+        values = movements.loc[matched, ['current_balance', 'previous_balance', 'movement']]
+        component_ids = frame['component_id'].to_numpy()
 
-            # Group key
-            component_key = f"{cf_category}::{cf_component}"
+        # np.bincount adds rows sequentially in frame order, so the totals are
+        # bit-for-bit the same as a running sum (groupby().sum() uses
+        # compensated summation and can differ in the last place)
+        group_count = len(component_groups)
+        current_totals = np.bincount(
+            component_ids, weights=values['current_balance'].to_numpy(dtype=float), minlength=group_count
+        )
+        previous_totals = np.bincount(
+            component_ids, weights=values['previous_balance'].to_numpy(dtype=float), minlength=group_count
+        )
+        movement_totals = np.bincount(
+            component_ids, weights=values['movement'].to_numpy(dtype=float), minlength=group_count
+        )
 
-            # Accumulate
-            component_groups[component_key]['category'] = cf_category
-            component_groups[component_key]['component_name'] = cf_component
-            component_groups[component_key]['accounts'].append(account_code)
-            component_groups[component_key]['current_total'] += row['current_balance']
-            component_groups[component_key]['previous_total'] += row['previous_balance']
-            component_groups[component_key]['movement'] += row['movement']
-            component_groups[component_key]['sign'] = sign
+        account_map = dict(zip(coa_data['account_code'], coa_data['account_name']))
 
         # Build components list
         components = []
-        for component_key, data in component_groups.items():
-            movement = data['movement']
-            cash_impact = movement * data['sign']
+        for component_id, data in enumerate(component_groups.itertuples(index=False)):
+            movement = float(movement_totals[component_id])
+            cash_impact = movement * int(data.sign)
 
             # Skip immaterial components (less than 1000)
             if abs(cash_impact) < 1000:
                 continue
 
             component = {
-                'id': component_key.replace('::', '_'),
-                'name': data['component_name'],
-                'category': data['category'],
-                'current_value': float(data['current_total']),
-                'previous_value': float(data['previous_total']),
-                'movement': float(movement),
+                'id': f"{data.category}::{data.component_name}".replace('::', '_'),
+                'name': data.component_name,
+                'category': data.category,
+                'current_value': float(current_totals[component_id]),
+                'previous_value': float(previous_totals[component_id]),
+                'movement': movement,
                 'cash_impact': float(cash_impact),
-                'accounts': data['accounts'],
-                'formula': self._generate_formula(data['accounts'], coa_data),
+                'accounts': data.accounts,
+                'formula': self._generate_formula(data.accounts, account_map),
                 'confidence_score': None  # Will be set by LangChain if used
             }
 
@@ -110,6 +106,384 @@ class CashFlowCalculator:
         logger.info(f"Generated {len(components)} cash flow components")
         return components
 
+    def recalculate_components(
+        self,
+        movements: pd.DataFrame,
+        classifications: Dict[str, Dict],
+        coa_data: pd.DataFrame,
+        components: List[Dict],
+        changed_accounts: List[str],
+        materiality: float = 1000.0
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Update a previously calculated component list after some accounts moved
+
+        Only components containing a changed account are recalculated, from
+        all of their accounts' movements, so their totals are identical to a
+        full calculate_components run. Other components are reused as-is.
+
+        Args:
+            movements: Account-level movements with the changes applied
+            classifications: Account classifications from AccountClassifier
+            coa_data: Chart of accounts data
+            components: Components from the previous calculation (may be AI-enhanced)
+            changed_accounts: Account codes whose balances changed
+            materiality: Minimum change in cash impact for a recalculated
+                component to lose its previous AI enhancement
+
+        Returns:
+            (components, changed_components) - the full updated list, and the
+            recalculated components whose cash impact changed materially
+            (or became material), which need enhancing again
+        """
+        lookup = self._classification_frame(classifications)
+        changed = lookup.index.intersection(pd.Index(changed_accounts, dtype=object))
+        affected_keys = set(zip(
+            lookup.loc[changed, 'cf_category'].astype(object),
+            lookup.loc[changed, 'cf_component'].astype(object)
+        ))
+
+        component_keys = pd.MultiIndex.from_arrays([
+            lookup['cf_category'].astype(object), lookup['cf_component'].astype(object)
+        ])
+        affected_codes = lookup.index[component_keys.isin(list(affected_keys))]
+        subset = movements[movements['account_code'].isin(affected_codes)]
+
+        recalculated = self.calculate_components(
+            current_tb=None,
+            previous_tb=None,
+            classifications=classifications,
+            coa_data=coa_data,
+            movements=subset
+        ) if len(subset) else []
+
+        affected_ids = {
+            f"{category}::{component_name}".replace('::', '_')
+            for category, component_name in affected_keys
+        }
+        previous_by_id = {component['id']: component for component in components}
+
+        updated = [component for component in components if component['id'] not in affected_ids]
+        changed_components = []
+
+        for component in recalculated:
+            previous = previous_by_id.get(component['id'])
+            if previous is not None and abs(component['cash_impact'] - previous['cash_impact']) < materiality:
+                # Small change: keep the previous AI enhancement
+                for field in ('confidence_score', 'ai_suggested_name', 'ai_notes'):
+                    if field in previous:
+                        component[field] = previous[field]
+            else:
+                changed_components.append(component)
+            updated.append(component)
+
+        updated.sort(
+            key=lambda x: (
+                self._category_order(x['category']),
+                -abs(x['cash_impact'])
+            )
+        )
+
+        logger.info(
+            f"Recalculated {len(recalculated)} of {len(updated)} components "
+            f"for {len(changed_accounts)} changed accounts; {len(changed_components)} changed materially"
+        )
+        return updated, changed_components
+
+    def calculate_period_components(
+        self,
+        balances: pd.DataFrame,
+        periods: List[str],
+        classifications: Dict[str, Dict],
+        coa_data: pd.DataFrame
+    ) -> Dict[str, Any]:
+        """
+        Calculate components for every consecutive pair of periods in one pass
+
+        Accounts are mapped to components once; movements for all pairs are
+        a single matrix difference and are summed per component with
+        np.add.at, which accumulates in the same order as calculate_components,
+        so each column matches a separate two-period calculation exactly.
+
+        Args:
+            balances: Long-format balances (account_code, period, balance),
+                e.g. from ConsolidationDataLoader.load_tb_period_balances
+            periods: Ordered periods, oldest first
+            classifications: Account classifications from AccountClassifier
+            coa_data: Chart of accounts data
+
+        Returns:
+            Dict with:
+            - periods: one entry per consecutive pair (current_period,
+              previous_period, category totals, net_cash_change, component_count)
+            - components: one entry per component material in at least one
+              pair, with per-pair lists of current_value, previous_value,
+              movement and cash_impact (None where the component is below the
+              materiality threshold, as calculate_components would omit it)
+        """
+        pairs = list(zip(periods[1:], periods[:-1]))
+
+        # Account x period balance matrix, periods in the requested order
+        matrix = balances.pivot_table(
+            index='account_code', columns='period', values='balance', aggfunc='sum', sort=True
+        ).reindex(columns=list(periods)).fillna(0.0)
+
+        matched, frame, component_groups = self._assign_components(
+            pd.Series(matrix.index, dtype=object), classifications
+        )
+
+        period_totals = [
+            {
+                'current_period': current,
+                'previous_period': previous,
+                'operating_total': 0.0,
+                'investing_total': 0.0,
+                'financing_total': 0.0,
+                'net_cash_change': 0.0,
+                'component_count': 0
+            }
+            for current, previous in pairs
+        ]
+
+        if frame.empty:
+            logger.info(f"Generated 0 cash flow components across {len(pairs)} period pairs")
+            return {'periods': period_totals, 'components': []}
+
+        values = matrix.to_numpy(dtype=float)[matched]
+        movements = values[:, 1:] - values[:, :-1]
+        component_ids = frame['component_id'].to_numpy()
+        group_count = len(component_groups)
+
+        balance_totals = np.zeros((group_count, len(periods)))
+        np.add.at(balance_totals, component_ids, values)
+        movement_totals = np.zeros((group_count, len(pairs)))
+        np.add.at(movement_totals, component_ids, movements)
+
+        signs = component_groups['sign'].to_numpy(dtype=int)
+        cash_impacts = movement_totals * signs[:, None]
+
+        # Same materiality threshold as calculate_components, per pair
+        material = np.abs(cash_impacts) >= 1000
+
+        account_map = dict(zip(coa_data['account_code'], coa_data['account_name']))
+
+        components = []
+        for component_id, data in enumerate(component_groups.itertuples(index=False)):
+            if not material[component_id].any():
+                continue
+
+            def per_pair(row) -> List[Optional[float]]:
+                return [
+                    float(value) if is_material else None
+                    for value, is_material in zip(row, material[component_id])
+                ]
+
+            components.append({
+                'id': f"{data.category}::{data.component_name}".replace('::', '_'),
+                'name': data.component_name,
+                'category': data.category,
+                'accounts': data.accounts,
+                'formula': self._generate_formula(data.accounts, account_map),
+                'current_value': per_pair(balance_totals[component_id, 1:]),
+                'previous_value': per_pair(balance_totals[component_id, :-1]),
+                'movement': per_pair(movement_totals[component_id]),
+                'cash_impact': per_pair(cash_impacts[component_id])
+            })
+
+        # Per-pair totals, summed in the order a two-period run would list
+        # its components so they match CashFlowPipeline.summarize exactly
+        for pair_index, totals in enumerate(period_totals):
+            pair_components = sorted(
+                (c for c in components if c['cash_impact'][pair_index] is not None),
+                key=lambda x: (self._category_order(x['category']), -abs(x['cash_impact'][pair_index]))
+            )
+            for category in ('Operating', 'Investing', 'Financing'):
+                totals[f"{category.lower()}_total"] = sum(
+                    c['cash_impact'][pair_index] for c in pair_components if c['category'] == category
+                )
+            totals['net_cash_change'] = (
+                totals['operating_total'] + totals['investing_total'] + totals['financing_total']
+            )
+            totals['component_count'] = len(pair_components)
+
+        # Category order, then largest absolute impact in any period
+        components.sort(
+            key=lambda x: (
+                self._category_order(x['category']),
+                -max(abs(value) for value in x['cash_impact'] if value is not None)
+            )
+        )
+
+        logger.info(f"Generated {len(components)} cash flow components across {len(pairs)} period pairs")
+        return {'periods': period_totals, 'components': components}
+
+    def calculate_segment_breakdown(
+        self,
+        components: List[Dict],
+        accounts: pd.Series,
+        segments: pd.DataFrame,
+        segment_balances: np.ndarray,
+        classifications: Dict[str, Dict]
+    ) -> Dict[str, Any]:
+        """
+        Split consolidated components into per-segment (entity or region) contributions
+
+        Accounts are mapped to components once and per-segment balances are
+        summed per component with np.add.at. Each material consolidated
+        component gets one value per segment, with no materiality threshold
+        of its own. Segment contributions therefore add up to the
+        consolidated figures.
+
+        Args:
+            components: Consolidated components from calculate_components
+            accounts: Account codes, one per row of segment_balances
+            segments: One row per segment (segment, segment_name)
+            segment_balances: (accounts, segments, 2) balances, previous
+                period first (see TrialBalanceCube.segment_balances)
+            classifications: Account classifications from AccountClassifier
+
+        Returns:
+            Dict with:
+            - segments: one entry per segment (segment, segment_name, category
+              totals, net_cash_change)
+            - breakdown: per component id, lists aligned with segments of
+              current_value, previous_value, movement and cash_impact
+        """
+        segment_count = len(segments)
+        segment_totals = [
+            {
+                'segment': segment,
+                'segment_name': segment_name,
+                'operating_total': 0.0,
+                'investing_total': 0.0,
+                'financing_total': 0.0,
+                'net_cash_change': 0.0
+            }
+            for segment, segment_name in zip(segments['segment'], segments['segment_name'])
+        ]
+
+        matched, frame, component_groups = self._assign_components(
+            pd.Series(accounts, dtype=object), classifications
+        )
+
+        if frame.empty or not components:
+            return {'segments': segment_totals, 'breakdown': {}}
+
+        values = segment_balances[matched]
+        component_ids = frame['component_id'].to_numpy()
+
+        balance_totals = np.zeros((len(component_groups), segment_count, 2))
+        np.add.at(balance_totals, component_ids, values)
+        movement_totals = balance_totals[:, :, 1] - balance_totals[:, :, 0]
+        cash_impacts = movement_totals * component_groups['sign'].to_numpy(dtype=int)[:, None]
+
+        group_ids = {
+            f"{data.category}::{data.component_name}".replace('::', '_'): group
+            for group, data in enumerate(component_groups.itertuples(index=False))
+        }
+
+        breakdown = {}
+        for component in components:
+            group = group_ids.get(component['id'])
+            if group is None:
+                continue
+
+            breakdown[component['id']] = {
+                'current_value': balance_totals[group, :, 1].tolist(),
+                'previous_value': balance_totals[group, :, 0].tolist(),
+                'movement': movement_totals[group].tolist(),
+                'cash_impact': cash_impacts[group].tolist()
+            }
+
+            total_key = f"{component['category'].lower()}_total"
+            for index, totals in enumerate(segment_totals):
+                if total_key in totals:
+                    totals[total_key] += float(cash_impacts[group, index])
+
+        for totals in segment_totals:
+            totals['net_cash_change'] = (
+                totals['operating_total'] + totals['investing_total'] + totals['financing_total']
+            )
+
+        logger.info(f"Broke {len(breakdown)} components down across {segment_count} segments")
+        return {'segments': segment_totals, 'breakdown': breakdown}
+
+    def _assign_components(
+        self,
+        account_codes: pd.Series,
+        classifications: Dict[str, Dict]
+    ) -> Tuple[np.ndarray, pd.DataFrame, Optional[pd.DataFrame]]:
+        """
+        Map accounts to cash flow components
+
+        Accounts without a classification are skipped.
+
+        Returns:
+            (matched, frame, component_groups) - matched is a boolean mask over
+            account_codes; frame has one row per matched account with its
+            classification, sign and component_id; component_groups has one
+            row per component (category, component_name, accounts, sign),
+            numbered in order of first appearance
+        """
+        lookup = self._classification_frame(classifications)
+        positions = lookup.index.get_indexer(account_codes)
+        matched = positions >= 0
+
+        frame = pd.concat([
+            pd.DataFrame({'account_code': account_codes.to_numpy()[matched]}),
+            lookup.iloc[positions[matched]].reset_index(drop=True)
+        ], axis=1)
+
+        if frame.empty:
+            return matched, frame, None
+
+        # Sign multiplier, evaluated once per distinct (category, component, class) key
+        key_ids = frame.groupby(
+            ['cf_category', 'cf_component', 'class_name'],
+            sort=False, dropna=False, observed=True
+        ).ngroup().to_numpy()
+        _, first_rows = np.unique(key_ids, return_index=True)
+        key_signs = np.array([
+            self._get_sign_multiplier(
+                frame['cf_category'].iat[row],
+                frame['cf_component'].iat[row],
+                frame['class_name'].iat[row]
+            )
+            for row in first_rows
+        ])
+        frame['sign'] = key_signs[key_ids]
+
+        # Group accounts by component, numbered in order of first appearance
+        frame['component_id'] = frame.groupby(
+            ['cf_category', 'cf_component'], sort=False, observed=True
+        ).ngroup().to_numpy()
+
+        component_groups = frame.groupby('component_id', sort=False).agg(
+            category=('cf_category', 'first'),
+            component_name=('cf_component', 'first'),
+            accounts=('account_code', list),
+            sign=('sign', 'last')
+        )
+
+        return matched, frame, component_groups
+
+    @staticmethod
+    def _classification_frame(classifications: Dict[str, Dict]) -> pd.DataFrame:
+        """
+        Columnar view of the classification fields the calculator needs, indexed by account_code
+        """
+        if isinstance(classifications, ClassificationResult):
+            return classifications.frame()
+
+        codes = list(classifications)
+        entries = [classifications[code] for code in codes]
+
+        return pd.DataFrame({
+            'cf_category': pd.Categorical([entry['cf_category'] for entry in entries]),
+            'cf_component': pd.Categorical([entry['cf_component'] for entry in entries]),
+            'class_name': np.array([entry.get('class_name', '') for entry in entries], dtype=object)
+        }, index=pd.Index(codes, dtype=object, name='account_code'))
+
     def _calculate_movements(
         self,
         current_tb: pd.DataFrame,
@@ -197,13 +571,12 @@ class CashFlowCalculator:
 
         return 1
 
-    def _generate_formula(self, account_codes: List[str], coa_data: pd.DataFrame) -> str:
+    def _generate_formula(self, account_codes: List[str], account_map: Dict[str, str]) -> str:
         """Generate human-readable formula"""
         if not account_codes:
             return ""
 
         # Get account names
-        account_map = dict(zip(coa_data['account_code'], coa_data['account_name']))
         account_names = [account_map.get(code, code) for code in account_codes[:5]]  # Limit to 5
 
         if len(account_codes) > 5:
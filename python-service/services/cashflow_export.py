@@ -0,0 +1,91 @@
+"""
+Cash Flow Export
+Packs a generated statement and its account movements into one Parquet or Arrow IPC payload
+"""
+
+from typing import Dict, Any, List, TYPE_CHECKING
+import pandas as pd
+import numpy as np
+import logging
+import json
+import io
+
+# pyarrow is imported inside the functions, so the service starts without it
+# and only Parquet/Arrow exports need it installed
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream"
+}
+
+def cashflow_table(
+    result: Dict[str, Any],
+    movements: pd.DataFrame,
+    current_period: str,
+    previous_period: str
+) -> "pa.Table":
+    """
+    One row per account movement, tagged with the component it rolls up into
+
+    Columns: account_code, account_name, current_balance, previous_balance,
+    movement, component_id, category and component_name. The last three are
+    null for accounts outside every component (unclassified or below
+    materiality). The components themselves (with AI fields), the category
+    totals and the run metadata are kept as JSON in the schema metadata, so
+    the whole statement travels as a single table.
+
+    Args:
+        result: CashFlowPipeline.run() output
+        movements: Account-level movements the components were calculated from
+    """
+    import pyarrow as pa
+
+    components: List[Dict] = result["components"]
+
+    account_codes = [account for component in components for account in component["accounts"]]
+    component_index = np.repeat(
+        np.arange(len(components)),
+        [len(component["accounts"]) for component in components]
+    )
+    assignments = pd.DataFrame({
+        "account_code": pd.Series(account_codes, dtype=movements["account_code"].dtype),
+        "component_id": pd.Categorical.from_codes(component_index, [component["id"] for component in components]),
+        "category": pd.Categorical([components[index]["category"] for index in component_index]),
+        "component_name": pd.Categorical([components[index]["name"] for index in component_index])
+    })
+
+    columns = ["account_code", "account_name", "current_balance", "previous_balance", "movement"]
+    frame = movements[columns].merge(assignments, on="account_code", how="left")
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    totals = {key: result[key] for key in ("operating_total", "investing_total", "financing_total", "net_cash_change")}
+
+    return table.replace_schema_metadata({
+        "current_period": current_period,
+        "previous_period": previous_period,
+        "components": json.dumps(components, default=str),
+        "totals": json.dumps(totals),
+        "metadata": json.dumps(result.get("metadata", {}), default=str)
+    })
+
+def serialize_table(table: "pa.Table", export_format: str) -> bytes:
+    """Table as Parquet file bytes or an Arrow IPC stream"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if export_format == "parquet":
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression="zstd")
+        return buffer.getvalue()
+
+    if export_format == "arrow":
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    raise ValueError(f"Unsupported export format: {export_format}")
@@ -0,0 +1,578 @@
+"""
+Cash Flow Pipeline Service
+Runs the generation stages asynchronously so requests never block the event loop
+"""
+
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.engine import Engine
+from typing import Dict, List, Any, Optional, Tuple, Callable, AsyncIterator
+import pandas as pd
+import asyncio
+import functools
+import logging
+import os
+
+from services.data_loader import ConsolidationDataLoader
+from services.cashflow_calculator import CashFlowCalculator
+from services.classification_result import ClassificationResult
+from services.langchain_orchestrator import CashFlowOrchestrator
+from services.cashflow_state import CashFlowStateStore, apply_tb_changes
+from services.tb_cube import TrialBalanceCube, TrialBalanceCubeCache
+from services.metrics import RunTrace
+
+logger = logging.getLogger(__name__)
+
+class NoTrialBalanceData(LookupError):
+    """Raised when a requested period has no trial balance rows"""
+
+class ChangeSetAlreadyApplied(ValueError):
+    """Raised when a recalculation's change set id was applied before (e.g. a retried POST)"""
+
+class CashFlowPipeline:
+    """
+    Orchestrates load -> classify -> calculate -> enhance for one request
+
+    Blocking database calls run on the threadpool and model inference runs on
+    the registry's bounded inference executor, so concurrent requests for
+    different companies overlap instead of serializing on the event loop.
+    """
+
+    def __init__(self, engine: Engine, registry, llm: Optional[Any] = None):
+        """
+        Args:
+            engine: Shared SQLAlchemy engine
+            registry: Loaded ModelRegistry (classifier, caches, inference executor)
+            llm: Optional chat model override (e.g. a local fake for tests)
+        """
+        self.data_loader = ConsolidationDataLoader(engine=engine)
+        self.calculator = CashFlowCalculator()
+        self.registry = registry
+        self.llm = llm
+        # Per-stage spans for this run, returned in response metadata
+        self.trace = RunTrace()
+        # Account-level movements loaded by prepare(), kept for exports
+        self.movements: Optional[pd.DataFrame] = None
+
+    async def load(
+        self,
+        company_id: str,
+        current_period: str,
+        previous_period: str
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Load TB movements and the chart of accounts concurrently
+
+        Returns:
+            (movements, coa_data)
+        """
+        movements, coa_data = await asyncio.gather(
+            self.load_movements(company_id, current_period, previous_period),
+            self.load_chart_of_accounts(company_id)
+        )
+
+        if not (movements['current_rows'] > 0).any() or not (movements['previous_rows'] > 0).any():
+            raise NoTrialBalanceData("No trial balance data found for specified periods")
+
+        return movements, coa_data
+
+    async def load_movements(
+        self,
+        company_id: str,
+        current_period: str,
+        previous_period: str
+    ) -> pd.DataFrame:
+        """Current and previous period TB, aggregated per account in one query"""
+        with self.trace.span("load_tb") as span:
+            movements = await run_in_threadpool(
+                self.data_loader.load_tb_movements,
+                company_id=company_id,
+                current_period=current_period,
+                previous_period=previous_period
+            )
+
+            current_rows = int(movements['current_rows'].sum())
+            previous_rows = int(movements['previous_rows'].sum())
+            span.rows = current_rows + previous_rows
+            span.set(
+                accounts=len(movements),
+                current_rows=current_rows,
+                previous_rows=previous_rows,
+                source=self.data_loader.last_source
+            )
+
+        return movements
+
+    async def load_chart_of_accounts(self, company_id: str) -> pd.DataFrame:
+        with self.trace.span("load_coa") as span:
+            coa_data = await run_in_threadpool(self.data_loader.load_chart_of_accounts, company_id=company_id)
+            span.rows = len(coa_data)
+        return coa_data
+
+    async def classify(self, company_id: str, coa_data: pd.DataFrame) -> ClassificationResult:
+        """Classify accounts on the inference executor, reusing cached results"""
+        loop = asyncio.get_running_loop()
+        stats: Dict[str, Any] = {}
+
+        with self.trace.span("classify", rows=len(coa_data)) as span:
+            classifications = await loop.run_in_executor(
+                self.registry.inference_executor,
+                functools.partial(
+                    self.registry.classification_cache.classify,
+                    company_id=company_id,
+                    coa_data=coa_data,
+                    classifier=self.registry.classifier,
+                    stats=stats
+                )
+            )
+            span.set(**stats)
+
+        return classifications
+
+    async def calculate(
+        self,
+        movements: pd.DataFrame,
+        classifications: Dict[str, Dict],
+        coa_data: pd.DataFrame
+    ) -> List[Dict]:
+        with self.trace.span("calculate", rows=len(movements)) as span:
+            components = await run_in_threadpool(
+                self.calculator.calculate_components,
+                current_tb=None,
+                previous_tb=None,
+                classifications=classifications,
+                coa_data=coa_data,
+                movements=movements
+            )
+            span.set(components=len(components))
+
+        return components
+
+    async def enhance(
+        self,
+        components: List[Dict],
+        coa_data: pd.DataFrame,
+        api_key: Optional[str]
+    ) -> List[Dict]:
+        """
+        Enhance components with concurrent LLM calls
+
+        LLM_ENHANCEMENT_MODE=batched sends components in a few multi-component
+        prompts instead of one request per component.
+        """
+        async for _ in self.stream_enhancements(components, coa_data, api_key):
+            pass
+
+        return components
+
+    async def stream_enhancements(
+        self,
+        components: List[Dict],
+        coa_data: pd.DataFrame,
+        api_key: Optional[str]
+    ) -> AsyncIterator[Dict]:
+        """
+        Enhance components in place, yielding each one as soon as its LLM
+        response has been applied (completion order)
+        """
+        orchestrator = self.orchestrator(api_key)
+
+        if os.getenv("LLM_ENHANCEMENT_MODE", "per_component") == "batched":
+            enhanced = orchestrator.aiter_enhanced_components_batched(
+                components=components,
+                coa_data=coa_data,
+                token_budget=int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "6000"))
+            )
+        else:
+            enhanced = orchestrator.aiter_enhanced_components(
+                components=components,
+                coa_data=coa_data
+            )
+
+        with self.trace.span("enhance", rows=len(components)) as span:
+            span.set(mode=os.getenv("LLM_ENHANCEMENT_MODE", "per_component"))
+            try:
+                async for component in enhanced:
+                    yield component
+            finally:
+                await enhanced.aclose()
+                span.set(**orchestrator.usage)
+
+    async def validate(self, components: List[Dict], api_key: Optional[str]) -> Dict[str, Any]:
+        """AI review of the whole statement (see CashFlowOrchestrator.validate_cashflow_statement)"""
+        orchestrator = self.orchestrator(api_key)
+
+        with self.trace.span("validate", rows=len(components)) as span:
+            validation = await run_in_threadpool(
+                orchestrator.validate_cashflow_statement,
+                components,
+                self.summarize(components)["net_cash_change"]
+            )
+            span.set(status=validation.get("status"), **orchestrator.usage)
+
+        return validation
+
+    def uses_ai(self, use_ai: bool, api_key: Optional[str]) -> bool:
+        """Whether enhancement runs for this request"""
+        return use_ai and bool(api_key or self.llm is not None)
+
+    def orchestrator(self, api_key: Optional[str]) -> CashFlowOrchestrator:
+        """Orchestrator configured from the LLM_* environment settings"""
+        return CashFlowOrchestrator(
+            api_key=api_key,
+            llm=self.llm,
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "5")),
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "60")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            response_cache=self.registry.llm_cache
+        )
+
+    @staticmethod
+    def summarize(components: List[Dict]) -> Dict[str, float]:
+        """Category totals and net cash change"""
+        operating_total = sum(c['cash_impact'] for c in components if c['category'] == 'Operating')
+        investing_total = sum(c['cash_impact'] for c in components if c['category'] == 'Investing')
+        financing_total = sum(c['cash_impact'] for c in components if c['category'] == 'Financing')
+
+        return {
+            "operating_total": operating_total,
+            "investing_total": investing_total,
+            "financing_total": financing_total,
+            "net_cash_change": operating_total + investing_total + financing_total
+        }
+
+    async def prepare(
+        self,
+        company_id: str,
+        current_period: str,
+        previous_period: str,
+        progress: Optional[Callable[[str, str], None]] = None
+    ) -> Tuple[List[Dict], pd.DataFrame, Dict[str, Dict]]:
+        """
+        Run the deterministic stages: load -> classify -> calculate
+
+        Returns:
+            (components, coa_data, classifications)
+        """
+        def report(stage: str, state: str) -> None:
+            if progress is not None:
+                progress(stage, state)
+
+        report("load", "started")
+        movements, coa_data = await self.load(company_id, current_period, previous_period)
+        self.movements = movements
+        report("load", "completed")
+
+        report("classify", "started")
+        classifications = await self.classify(company_id, coa_data)
+        report("classify", "completed")
+
+        report("calculate", "started")
+        components = await self.calculate(movements, classifications, coa_data)
+        report("calculate", "completed")
+
+        # Components are enhanced in place afterwards, so the stored state
+        # picks up AI results without a second write
+        self.registry.cashflow_state.put(
+            CashFlowStateStore.key(company_id, current_period, previous_period),
+            {
+                "movements": movements,
+                "coa_data": coa_data,
+                "classifications": classifications,
+                "components": components
+            }
+        )
+
+        return components, coa_data, classifications
+
+    def metadata(self, components: List[Dict], classifications: Dict[str, Dict], use_ai: bool) -> Dict[str, Any]:
+        return {
+            "total_components": len(components),
+            "ai_enhanced": use_ai,
+            "accounts_classified": len(classifications),
+            "spans": self.trace.to_list()
+        }
+
+    async def run(
+        self,
+        company_id: str,
+        current_period: str,
+        previous_period: str,
+        use_ai: bool = True,
+        api_key: Optional[str] = None,
+        progress: Optional[Callable[[str, str], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run the full pipeline
+
+        Args:
+            progress: Optional callback receiving (stage, "started" | "completed")
+
+        Returns:
+            Dict with components, category totals and metadata
+        """
+        components, coa_data, classifications = await self.prepare(
+            company_id, current_period, previous_period, progress=progress
+        )
+
+        validation = None
+        if self.uses_ai(use_ai, api_key):
+            if progress is not None:
+                progress("enhance", "started")
+            components = await self.enhance(components, coa_data, api_key)
+            if progress is not None:
+                progress("enhance", "completed")
+
+            if os.getenv("LLM_VALIDATE_STATEMENT", "false").lower() == "true":
+                validation = await self.validate(components, api_key)
+
+        metadata = self.metadata(components, classifications, use_ai)
+        if validation is not None:
+            metadata["validation"] = validation
+
+        return {
+            "components": components,
+            **self.summarize(components),
+            "metadata": metadata
+        }
+
+    async def recalculate(
+        self,
+        company_id: str,
+        current_period: str,
+        previous_period: str,
+        changes: List[Dict[str, Any]],
+        change_set_id: str,
+        use_ai: bool = True,
+        api_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Update the last result for a company and period pair after TB rows changed
+
+        changes lists the TB deltas that were posted (see apply_tb_changes).
+        Only components containing a changed account are recalculated, and
+        only those whose cash impact moved by at least RECALC_MATERIALITY
+        are sent for AI enhancement again. Without stored state, or when a
+        change touches an account that was never classified, the full
+        pipeline runs instead (it reads the posted changes from the database).
+
+        Deltas are not idempotent, so each change set carries an id and one
+        that was already applied for the pair is rejected rather than
+        counted twice.
+
+        Raises:
+            ChangeSetAlreadyApplied: change_set_id was applied before
+
+        Returns:
+            Same shape as run(), with recalculation details in metadata
+        """
+        store = self.registry.cashflow_state
+        key = CashFlowStateStore.key(company_id, current_period, previous_period)
+
+        async with store.recalc_lock(key):
+            if store.is_applied(key, change_set_id):
+                raise ChangeSetAlreadyApplied(f"Change set {change_set_id} was already applied")
+
+            result = await self._recalculate(key, changes, use_ai, api_key)
+            store.mark_applied(key, change_set_id)
+            return result
+
+    async def _recalculate(
+        self,
+        key: Tuple[str, str, str],
+        changes: List[Dict[str, Any]],
+        use_ai: bool,
+        api_key: Optional[str]
+    ) -> Dict[str, Any]:
+        company_id, current_period, previous_period = key
+
+        # Cached entity-grain balances no longer match the database
+        self.registry.tb_cubes.invalidate(company_id)
+
+        state = self.registry.cashflow_state.get(key)
+
+        movements, changed_accounts = (None, [])
+        if state is not None:
+            movements, changed_accounts = apply_tb_changes(
+                state["movements"], changes, current_period, previous_period
+            )
+
+        if state is None or any(code not in state["classifications"] for code in changed_accounts):
+            result = await self.run(company_id, current_period, previous_period, use_ai=use_ai, api_key=api_key)
+            result["metadata"]["recalculation"] = "full"
+            return result
+
+        with self.trace.span("calculate", rows=len(movements)) as span:
+            components, changed_components = await run_in_threadpool(
+                self.calculator.recalculate_components,
+                movements=movements,
+                classifications=state["classifications"],
+                coa_data=state["coa_data"],
+                components=state["components"],
+                changed_accounts=changed_accounts,
+                materiality=float(os.getenv("RECALC_MATERIALITY", "1000"))
+            )
+            span.set(incremental=True, components=len(components), components_changed=len(changed_components))
+
+        if changed_components and self.uses_ai(use_ai, api_key):
+            await self.enhance(changed_components, state["coa_data"], api_key)
+
+        self.registry.cashflow_state.put(key, {**state, "movements": movements, "components": components})
+
+        metadata = self.metadata(components, state["classifications"], use_ai)
+        metadata.update({
+            "recalculation": "incremental",
+            "accounts_changed": len(changed_accounts),
+            "components_reenhanced": len(changed_components) if self.uses_ai(use_ai, api_key) else 0
+        })
+
+        return {
+            "components": components,
+            **self.summarize(components),
+            "metadata": metadata
+        }
+
+    async def run_periods(self, company_id: str, periods: List[str]) -> Dict[str, Any]:
+        """
+        Deterministic cash flows for every consecutive pair of an ordered period list
+
+        All trial balances are loaded in one query and accounts are classified
+        once. AI enhancement is not applied to the matrix.
+
+        Returns:
+            Dict with per-pair totals, the component x pair matrix and metadata
+        """
+        if len(periods) < 2:
+            raise ValueError("At least two periods are required")
+        if len(set(periods)) != len(periods):
+            raise ValueError("Periods must be distinct")
+
+        async def load_balances() -> pd.DataFrame:
+            with self.trace.span("load_tb") as span:
+                balances = await run_in_threadpool(
+                    self.data_loader.load_tb_period_balances,
+                    company_id=company_id,
+                    periods=periods
+                )
+                span.rows = int(balances['row_count'].sum())
+                span.set(periods=len(periods), source=self.data_loader.last_source)
+            return balances
+
+        balances, coa_data = await asyncio.gather(
+            load_balances(),
+            self.load_chart_of_accounts(company_id)
+        )
+
+        missing = [period for period in periods if period not in set(balances['period'])]
+        if missing:
+            raise NoTrialBalanceData(f"No trial balance data found for periods: {', '.join(missing)}")
+
+        classifications = await self.classify(company_id, coa_data)
+
+        with self.trace.span("calculate", rows=len(balances)) as span:
+            result = await run_in_threadpool(
+                self.calculator.calculate_period_components,
+                balances=balances,
+                periods=periods,
+                classifications=classifications,
+                coa_data=coa_data
+            )
+            span.set(components=len(result["components"]))
+
+        result["metadata"] = {
+            "total_components": len(result["components"]),
+            "period_pairs": len(result["periods"]),
+            "accounts_classified": len(classifications),
+            "spans": self.trace.to_list()
+        }
+        return result
+
+    async def load_cube(self, company_id: str, periods: List[str], refresh: bool = False) -> TrialBalanceCube:
+        """Entity-grain balances for the periods, from the cube cache or one query"""
+        key = TrialBalanceCubeCache.key(company_id, periods)
+
+        with self.trace.span("load_tb") as span:
+            cube = None if refresh else self.registry.tb_cubes.get(key)
+            span.set(tb_cube_cache="hit" if cube is not None else "miss")
+
+            if cube is None:
+                # Built chunk by chunk when TB_LOAD_CHUNK_SIZE is set
+                cube = await run_in_threadpool(
+                    TrialBalanceCube.from_chunks,
+                    self.data_loader.iter_entity_tb_balances(company_id, periods),
+                    periods
+                )
+                self.registry.tb_cubes.put(key, cube)
+                span.rows = len(cube)
+
+            span.set(cells=len(cube), entities=len(cube.entities), cube_bytes=cube.nbytes)
+
+        return cube
+
+    async def run_drilldown(
+        self,
+        company_id: str,
+        current_period: str,
+        previous_period: str,
+        by: str = "entity",
+        entities: Optional[List[str]] = None,
+        refresh: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Consolidated cash flow plus its per-entity or per-region breakdown
+
+        Balances come from the company's TrialBalanceCube. The first
+        drill-down for a period pair loads it and later ones (other
+        dimensions or entity subsets) reuse it from memory until
+        TB_CUBE_TTL_SECONDS passes or TB changes are posted through
+        recalculate(). AI enhancement is not applied.
+
+        Args:
+            by: "entity" or "region"
+            entities: Entity codes (or ids) to consolidate; all when None
+            refresh: Reload the cube from the database
+
+        Returns:
+            Dict with the consolidated components (each with a per-segment
+            breakdown), category totals, per-segment totals and metadata
+        """
+        periods = [previous_period, current_period]
+        cube, coa_data = await asyncio.gather(
+            self.load_cube(company_id, periods, refresh=refresh),
+            self.load_chart_of_accounts(company_id)
+        )
+
+        movements = cube.movements(current_period, previous_period, entities=entities)
+        if not (movements['current_rows'] > 0).any() or not (movements['previous_rows'] > 0).any():
+            raise NoTrialBalanceData("No trial balance data found for specified periods")
+
+        classifications = await self.classify(company_id, coa_data)
+
+        def calculate() -> Dict[str, Any]:
+            components = self.calculator.calculate_components(
+                current_tb=None,
+                previous_tb=None,
+                classifications=classifications,
+                coa_data=coa_data,
+                movements=movements
+            )
+            segments, balances = cube.segment_balances(current_period, previous_period, by=by, entities=entities)
+            split = self.calculator.calculate_segment_breakdown(
+                components, cube.accounts['account_code'], segments, balances, classifications
+            )
+            for component in components:
+                component['segments'] = split['breakdown'].get(component['id'])
+            return {"components": components, "segments": split['segments']}
+
+        with self.trace.span("calculate", rows=len(movements)) as span:
+            result = await run_in_threadpool(calculate)
+            span.set(components=len(result["components"]), segments=len(result["segments"]), by=by)
+
+        metadata = self.metadata(result["components"], classifications, use_ai=False)
+        metadata.update({"by": by, "entities": entities})
+
+        return {
+            "components": result["components"],
+            **self.summarize(result["components"]),
+            "segments": result["segments"],
+            "metadata": metadata
+        }
@@ -0,0 +1,142 @@
+"""
+Cash Flow State Service
+Keeps the last computed movements and components per company and period pair for incremental recalculation
+"""
+
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set, Tuple
+import pandas as pd
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def apply_tb_changes(
+    movements: pd.DataFrame,
+    changes: List[Dict[str, Any]],
+    current_period: str,
+    previous_period: str
+) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Apply trial balance row deltas to account-level movements
+
+    Each change is {account_code, period, debit, credit}, with debit and
+    credit as amounts added to the consolidated TB (e.g. the lines of a late
+    journal). Changes for periods outside the pair are ignored. Deltas are
+    not idempotent, so callers must apply each change set once (see
+    CashFlowStateStore.is_applied).
+
+    Returns:
+        (updated copy of movements, account codes whose balances changed)
+    """
+    updated = movements.set_index('account_code', drop=False)
+    changed: List[str] = []
+
+    for change in changes:
+        period = change.get('period')
+        if period not in (current_period, previous_period):
+            continue
+
+        code = change['account_code']
+        net = float(change.get('debit', 0.0)) - float(change.get('credit', 0.0))
+        if net == 0:
+            continue
+
+        if code not in updated.index:
+            # Account with no TB rows so far in either period
+            updated.loc[code, ['account_code', 'current_balance', 'previous_balance', 'movement']] = [
+                code, 0.0, 0.0, 0.0
+            ]
+
+        if period == current_period:
+            updated.loc[code, 'current_balance'] += net
+            updated.loc[code, 'movement'] += net
+        else:
+            updated.loc[code, 'previous_balance'] += net
+            updated.loc[code, 'movement'] -= net
+
+        if code not in changed:
+            changed.append(code)
+
+    return updated.reset_index(drop=True), changed
+
+class CashFlowStateStore:
+    """
+    In-memory LRU of the last pipeline state per (company, current period, previous period)
+
+    Each entry holds the account-level movements, the chart of accounts,
+    the classifications and the (possibly AI-enhanced) components, which
+    is everything needed to update a statement after a few TB rows change
+    without reloading or reclassifying.
+
+    The ids of change sets applied to each key are kept apart from the
+    entry, so a full regenerate that replaces the entry still rejects a
+    retried change set. They are dropped with the entry on eviction, after
+    which the next recalculation reloads from the database anyway.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self._change_sets: Dict[Tuple[str, str, str], Set[str]] = {}
+        self._recalc_locks: Dict[Tuple[str, str, str], asyncio.Lock] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(company_id: str, current_period: str, previous_period: str) -> Tuple[str, str, str]:
+        return (company_id, current_period, previous_period)
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple[str, str, str], state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._change_sets.pop(evicted, None)
+                lock = self._recalc_locks.get(evicted)
+                if lock is not None and not lock.locked():
+                    del self._recalc_locks[evicted]
+
+    def recalc_lock(self, key: Tuple[str, str, str]) -> asyncio.Lock:
+        """Lock serializing recalculations of one key, so a change set is checked and applied atomically"""
+        with self._lock:
+            lock = self._recalc_locks.get(key)
+            if lock is None:
+                lock = self._recalc_locks[key] = asyncio.Lock()
+            return lock
+
+    def is_applied(self, key: Tuple[str, str, str], change_set_id: str) -> bool:
+        with self._lock:
+            return change_set_id in self._change_sets.get(key, ())
+
+    def mark_applied(self, key: Tuple[str, str, str], change_set_id: str) -> None:
+        with self._lock:
+            self._change_sets.setdefault(key, set()).add(change_set_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._change_sets.clear()
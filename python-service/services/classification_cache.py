@@ -0,0 +1,163 @@
+"""
+Classification Cache Service
+Reuses account classifications between runs when the chart of accounts has not changed
+"""
+
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import pandas as pd
+import numpy as np
+import hashlib
+import logging
+import threading
+
+from services.classification_result import ClassificationResult
+
+logger = logging.getLogger(__name__)
+
+# COA columns that influence classification
+FINGERPRINT_COLUMNS = ["account_code", "account_name", "class_name", "note_name", "sub_note_name"]
+
+def coa_row_hashes(coa_data: pd.DataFrame) -> np.ndarray:
+    """Stable uint64 content hash of every COA row"""
+    columns = [column for column in FINGERPRINT_COLUMNS if column in coa_data.columns]
+    return pd.util.hash_pandas_object(
+        coa_data[columns].astype(object),
+        index=False
+    ).to_numpy()
+
+def coa_fingerprint(coa_data: pd.DataFrame, classifier_fingerprint: str = "") -> str:
+    """
+    Content fingerprint of a COA frame combined with the classifier's own fingerprint
+    """
+    digest = hashlib.sha256(classifier_fingerprint.encode("utf-8"))
+    digest.update(coa_row_hashes(coa_data).tobytes())
+    return digest.hexdigest()
+
+class ClassificationCache:
+    """
+    Per-company cache of classify_accounts results
+
+    A run with an unchanged COA (and unchanged classifier) reuses the stored
+    classifications outright. When only some accounts were added or renamed,
+    just those account codes are reclassified and merged with the rest.
+    """
+
+    def __init__(self, max_companies: int = 256):
+        self.max_companies = max_companies
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.accounts_reclassified = 0
+
+    def classify(
+        self,
+        company_id: str,
+        coa_data: pd.DataFrame,
+        classifier,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> ClassificationResult:
+        """
+        Classify a company's COA, reusing whatever the previous run already computed
+
+        Args:
+            company_id: Cache partition
+            coa_data: Chart of accounts as loaded by ConsolidationDataLoader
+            classifier: AccountClassifier used for anything not already cached
+            stats: Optional dict that receives the cache outcome (hit, partial or
+                miss), accounts_reclassified and the classifier's embedding stats
+
+        Returns:
+            ClassificationResult keyed by account_code
+        """
+        row_hashes = coa_row_hashes(coa_data)
+        fingerprint = coa_fingerprint(coa_data, classifier.fingerprint)
+        codes = coa_data['account_code'].tolist()
+        code_hashes = self._hashes_by_code(codes, row_hashes)
+
+        with self._lock:
+            entry = self._entries.get(company_id)
+            if entry is not None:
+                self._entries.move_to_end(company_id)
+
+        if stats is None:
+            stats = {}
+
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            with self._lock:
+                self.hits += 1
+            stats.update({"classification_cache": "hit", "accounts_reclassified": 0})
+            logger.info(f"Classification cache hit for company {company_id}")
+            return entry["classifications"]
+
+        if entry is not None and entry["classifier_fingerprint"] == classifier.fingerprint:
+            previous_hashes = entry["code_hashes"]
+            changed_codes = {
+                code for code, hashes in code_hashes.items()
+                if previous_hashes.get(code) != hashes
+            }
+            changed_rows = coa_data[coa_data['account_code'].isin(changed_codes)]
+            fresh = classifier.classify_accounts(coa_data=changed_rows, stats=stats)
+
+            # Reclassified codes override the stored rows; removed codes are dropped
+            classifications = ClassificationResult.concat([entry["classifications"], fresh]).take(list(code_hashes))
+
+            with self._lock:
+                self.partial_hits += 1
+                self.accounts_reclassified += len(fresh)
+            stats.update({"classification_cache": "partial", "accounts_reclassified": len(fresh)})
+            logger.info(
+                f"Classification cache partial hit for company {company_id}: "
+                f"reclassified {len(fresh)} of {len(classifications)} accounts"
+            )
+        else:
+            classifications = classifier.classify_accounts(coa_data=coa_data, stats=stats)
+            with self._lock:
+                self.misses += 1
+                self.accounts_reclassified += len(classifications)
+            stats.update({"classification_cache": "miss", "accounts_reclassified": len(classifications)})
+
+        self._store(company_id, {
+            "fingerprint": fingerprint,
+            "classifier_fingerprint": classifier.fingerprint,
+            "code_hashes": code_hashes,
+            "classifications": classifications
+        })
+        return classifications
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "companies": len(self._entries),
+                "hits": self.hits,
+                "partial_hits": self.partial_hits,
+                "misses": self.misses,
+                "accounts_reclassified": self.accounts_reclassified
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _hashes_by_code(codes: List[Any], row_hashes: np.ndarray) -> Dict[Any, tuple]:
+        """
+        Group row hashes by account_code, preserving COA order
+
+        An account code can appear on several COA rows (one per entity
+        naming); any change to any of them reclassifies the code.
+        """
+        grouped: Dict[Any, list] = {}
+        for code, row_hash in zip(codes, row_hashes.tolist()):
+            grouped.setdefault(code, []).append(row_hash)
+        return {code: tuple(hashes) for code, hashes in grouped.items()}
+
+    def _store(self, company_id: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[company_id] = entry
+            self._entries.move_to_end(company_id)
+            while len(self._entries) > self.max_companies:
+                self._entries.popitem(last=False)
@@ -0,0 +1,253 @@
+"""
+Classification Result
+Columnar account classifications backed by NumPy arrays, with lazy per-account dict views
+"""
+
+from collections.abc import Mapping
+from typing import Dict, Any, List, Iterator, Sequence, Optional
+import pandas as pd
+import numpy as np
+import json
+
+# Which classifier resolved an account
+TIERS = ("rule", "model")
+
+class ClassificationResult(Mapping):
+    """
+    classify_accounts output: one row per account code
+
+    The template scores are kept as a single float32 matrix, NaN for rows
+    the rule tier resolved without the model. The top
+    category is an int8 index into `categories`, and the cash flow
+    category and component are pandas Categoricals. Nothing per-account
+    is materialized until asked for: `result[code]` builds the same dict
+    that classify_accounts used to return (account_name, top_category,
+    confidence, all_scores, cf_category, cf_component, class_name,
+    note_name), plus the tier that resolved the account ("rule" or
+    "model"). all_scores always has one entry per category; for rule-tier
+    accounts every score is NaN. Code that treats the result as a dict of
+    dicts therefore keeps working.
+    """
+
+    def __init__(
+        self,
+        codes: Sequence[Any],
+        categories: Sequence[str],
+        top_index: np.ndarray,
+        confidence: np.ndarray,
+        scores: np.ndarray,
+        cf_category: Sequence[str],
+        cf_component: Sequence[str],
+        account_name: Sequence[Any],
+        class_name: Sequence[Any],
+        note_name: Sequence[Any],
+        tier: Optional[Sequence[str]] = None
+    ):
+        """
+        Args:
+            codes: Unique account codes, one per row
+            categories: Template category names (score matrix columns)
+            top_index: Best category per row, as an index into categories
+            confidence: Score of the best category per row
+            scores: (rows x categories) similarity matrix, NaN for rows no
+                model scored
+            cf_category: Operating/Investing/Financing per row
+            cf_component: Cash flow component name per row
+            account_name, class_name, note_name: COA fields per row
+            tier: "rule" or "model" per row (see services.rule_classifier);
+                all "model" when omitted
+        """
+        if len(categories) > np.iinfo(np.int8).max:
+            raise ValueError(f"At most {np.iinfo(np.int8).max} categories fit an int8 index")
+
+        self.codes = np.asarray(codes, dtype=object)
+        self.categories: List[str] = list(categories)
+        self.top_index = np.asarray(top_index, dtype=np.int8)
+        self.confidence = np.asarray(confidence, dtype=np.float32)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(len(self.codes), len(self.categories))
+        self.cf_category = pd.Categorical(cf_category)
+        self.cf_component = pd.Categorical(cf_component)
+        self.account_name = np.asarray(account_name, dtype=object)
+        self.class_name = np.asarray(class_name, dtype=object)
+        self.note_name = np.asarray(note_name, dtype=object)
+        self.tier = pd.Categorical(
+            ["model"] * len(self.codes) if tier is None else tier, categories=TIERS
+        )
+
+        self._positions: Dict[Any, int] = {code: row for row, code in enumerate(self.codes.tolist())}
+        if len(self._positions) != len(self.codes):
+            raise ValueError("Account codes must be unique")
+
+    # Mapping interface (lazy dict views)
+
+    def __getitem__(self, code: Any) -> Dict[str, Any]:
+        return self._entry(self._positions[code])
+
+    def __contains__(self, code: object) -> bool:
+        return code in self._positions
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._positions)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __repr__(self) -> str:
+        return f"ClassificationResult({len(self)} accounts, {len(self.categories)} categories)"
+
+    def _entry(self, row: int) -> Dict[str, Any]:
+        return {
+            "account_name": self.account_name[row],
+            "top_category": self.categories[self.top_index[row]],
+            "confidence": float(self.confidence[row]),
+            "all_scores": dict(zip(self.categories, map(float, self.scores[row]))),
+            "cf_category": self.cf_category[row],
+            "cf_component": self.cf_component[row],
+            "class_name": self.class_name[row],
+            "note_name": self.note_name[row],
+            "tier": self.tier[row]
+        }
+
+    def to_dict(self) -> Dict[Any, Dict[str, Any]]:
+        """Materialize the legacy dict-of-dicts form"""
+        return {code: self._entry(row) for row, code in enumerate(self.codes.tolist())}
+
+    def to_records(self) -> Dict[Any, Dict[str, Any]]:
+        """to_dict() for JSON responses: NaN scores of rule-tier accounts become None"""
+        records = self.to_dict()
+        for record in records.values():
+            if record["tier"] == "rule":
+                record["all_scores"] = dict.fromkeys(self.categories)
+        return records
+
+    # Columnar access
+
+    def frame(self) -> pd.DataFrame:
+        """cf_category, cf_component and class_name indexed by account_code (what the calculator needs)"""
+        return pd.DataFrame({
+            'cf_category': self.cf_category,
+            'cf_component': self.cf_component,
+            'class_name': self.class_name
+        }, index=pd.Index(self.codes, dtype=object, name='account_code'))
+
+    def take(self, codes: Sequence[Any]) -> "ClassificationResult":
+        """Rows for the given account codes, in that order (KeyError if one is missing)"""
+        rows = np.fromiter((self._positions[code] for code in codes), dtype=np.intp, count=len(codes))
+        return ClassificationResult(
+            codes=self.codes[rows],
+            categories=self.categories,
+            top_index=self.top_index[rows],
+            confidence=self.confidence[rows],
+            scores=self.scores[rows],
+            cf_category=self.cf_category[rows],
+            cf_component=self.cf_component[rows],
+            account_name=self.account_name[rows],
+            class_name=self.class_name[rows],
+            note_name=self.note_name[rows],
+            tier=self.tier[rows]
+        )
+
+    @classmethod
+    def concat(cls, results: Sequence["ClassificationResult"]) -> "ClassificationResult":
+        """
+        Combine results from the same classifier; a code present in several keeps the last one
+
+        Codes are ordered by first appearance.
+        """
+        categories = results[0].categories
+        if any(result.categories != categories for result in results):
+            raise ValueError("Cannot combine results with different categories")
+
+        positions: Dict[Any, int] = {}
+        for row, code in enumerate(np.concatenate([result.codes for result in results]).tolist()):
+            positions[code] = row
+        rows = np.fromiter(positions.values(), dtype=np.intp, count=len(positions))
+
+        def stack(field: str) -> np.ndarray:
+            return np.concatenate([np.asarray(getattr(result, field)) for result in results])[rows]
+
+        return cls(
+            codes=stack("codes"),
+            categories=categories,
+            top_index=stack("top_index"),
+            confidence=stack("confidence"),
+            scores=np.concatenate([result.scores for result in results])[rows],
+            cf_category=stack("cf_category"),
+            cf_component=stack("cf_component"),
+            account_name=stack("account_name"),
+            class_name=stack("class_name"),
+            note_name=stack("note_name"),
+            tier=stack("tier")
+        )
+
+    # Serialization
+
+    def to_columnar(self) -> Dict[str, Any]:
+        """
+        Compact JSON-ready form: one list per field instead of one object per account
+
+        top_category, cf_category, cf_component and tier are indexes into the
+        categories, cf_categories, cf_components and tiers lists. confidence and
+        scores are rounded to 6 decimals (float32 precision); the score row of
+        a rule-tier account is a row of nulls.
+        """
+        return {
+            "categories": self.categories,
+            "cf_categories": self.cf_category.categories.tolist(),
+            "cf_components": self.cf_component.categories.tolist(),
+            "tiers": list(TIERS),
+            "account_code": self.codes.tolist(),
+            "account_name": _json_values(self.account_name),
+            "class_name": _json_values(self.class_name),
+            "note_name": _json_values(self.note_name),
+            "top_category": self.top_index.tolist(),
+            "confidence": np.round(self.confidence.astype(np.float64), 6).tolist(),
+            "cf_category": self.cf_category.codes.tolist(),
+            "cf_component": self.cf_component.codes.tolist(),
+            "tier": self.tier.codes.tolist(),
+            "scores": [
+                [None] * len(self.categories) if tier == "rule" else row
+                for tier, row in zip(self.tier, np.round(self.scores.astype(np.float64), 6).tolist())
+            ]
+        }
+
+    def to_arrow(self):
+        """
+        pyarrow Table with dictionary-encoded categories and a fixed-size-list score column
+
+        The category names are also stored in the schema metadata. Rule-tier
+        accounts have NaN scores.
+        """
+        import pyarrow as pa
+
+        table = pa.table({
+            "account_code": pa.array(self.codes, type=pa.string(), from_pandas=True),
+            "account_name": pa.array(self.account_name, type=pa.string(), from_pandas=True),
+            "class_name": pa.array(self.class_name, type=pa.string(), from_pandas=True),
+            "note_name": pa.array(self.note_name, type=pa.string(), from_pandas=True),
+            "top_category": pa.DictionaryArray.from_arrays(
+                pa.array(self.top_index, type=pa.int8()), pa.array(self.categories, type=pa.string())
+            ),
+            "confidence": pa.array(self.confidence, type=pa.float32()),
+            "cf_category": pa.array(pd.Series(self.cf_category)),
+            "cf_component": pa.array(pd.Series(self.cf_component)),
+            "tier": pa.array(pd.Series(self.tier)),
+            "scores": pa.FixedSizeListArray.from_arrays(
+                pa.array(self.scores.ravel(), type=pa.float32()), len(self.categories)
+            )
+        })
+        return table.replace_schema_metadata({"categories": json.dumps(self.categories)})
+
+    def to_arrow_ipc(self) -> bytes:
+        """Arrow IPC stream bytes (media type application/vnd.apache.arrow.stream)"""
+        import pyarrow as pa
+
+        table = self.to_arrow()
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+def _json_values(values: np.ndarray) -> List[Any]:
+    """Object column as a list with NaN replaced by None"""
+    return [None if isinstance(value, float) and np.isnan(value) else value for value in values.tolist()]
@@ -4,19 +4,225 @@ Loads consolidated trial balance and chart of accounts data using pandas
 """
 
 import pandas as pd
-from sqlalchemy import create_engine, text
-from typing import Optional
+from sqlalchemy import text, bindparam, Date, String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.elements import TextClause
+from typing import Dict, List, Any, Optional, Iterator
 import logging
+import os
+
+from services.database import create_database_engine
+from services.tb_accumulator import BalanceAccumulator
+
+try:
+    import adbc_driver_postgresql.dbapi as adbc_postgresql
+except ImportError:  # Arrow loads fall back to read_sql with Arrow-backed dtypes
+    adbc_postgresql = None
 
 logger = logging.getLogger(__name__)
 
+# ADBC's PostgreSQL driver takes positional $1, $2 ... parameters and binds Python
+# strings as text, which PostgreSQL will not compare with uuid or date columns,
+# so parameters are rendered with explicit casts
+ADBC_DIALECT = postgresql.dialect(paramstyle="numeric_dollar")
+ADBC_PARAM_TYPES = {
+    "company_id": postgresql.UUID(as_uuid=False),
+    "period": Date(),
+    "periods": Date(),
+    "current_period": Date(),
+    "previous_period": Date()
+}
+
+LOAD_BACKENDS = ("pandas", "arrow")
+
+# Grouping columns of the entity-grain trial balance query
+ENTITY_TB_KEYS = ["entity_id", "account_code", "period"]
+
+def _numeric_to_float(table):
+    """ADBC returns NUMERIC as decimal strings; read_sql coerces Decimals to float, so match it"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for index, field in enumerate(table.schema):
+        if field.metadata and field.metadata.get(b"ADBC:postgresql:typname") == b"numeric":
+            table = table.set_column(index, pa.field(field.name, pa.float64()), pc.cast(table.column(index), pa.float64()))
+    return table
+
 class ConsolidationDataLoader:
     """
     Loads and processes consolidated financial data from Supabase/PostgreSQL
     """
 
-    def __init__(self, database_url: str):
-        self.engine = create_engine(database_url)
+    def __init__(
+        self,
+        database_url: Optional[str] = None,
+        engine: Optional[Engine] = None,
+        backend: Optional[str] = None,
+        use_rollup: Optional[bool] = None,
+        chunk_size: Optional[int] = None
+    ):
+        """
+        Args:
+            database_url: Connection URL, used only when no engine is injected
+            engine: Shared engine (see services.database.get_engine); preferred so pools are reused
+            backend: How trial balance queries are read: "pandas" (read_sql into
+                NumPy-backed frames) or "arrow" (Arrow-backed frames, fetched over
+                ADBC on PostgreSQL). Defaults to TB_LOAD_BACKEND, else "pandas".
+            use_rollup: Read trial balances from consolidated_tb_rollup when the
+                requested periods are fresh (sql/ADD_CONSOLIDATED_TB_ROLLUP.sql).
+                Defaults to TB_ROLLUP_ENABLED.
+            chunk_size: Stream trial balance queries through a server-side
+                cursor in chunks of this many rows, folding each chunk into
+                running totals, so a large result is never held whole.
+                Defaults to TB_LOAD_CHUNK_SIZE; 0 reads results in one piece.
+        """
+        if engine is None and not database_url:
+            raise ValueError("Either database_url or engine is required")
+        self.engine = engine if engine is not None else create_database_engine(database_url)
+
+        self.backend = (backend or os.getenv("TB_LOAD_BACKEND", "pandas")).lower()
+        if self.backend not in LOAD_BACKENDS:
+            raise ValueError(f"backend must be one of {', '.join(LOAD_BACKENDS)}")
+
+        if use_rollup is None:
+            use_rollup = os.getenv("TB_ROLLUP_ENABLED", "false").lower() == "true"
+        self.use_rollup = use_rollup
+
+        if chunk_size is None:
+            chunk_size = int(os.getenv("TB_LOAD_CHUNK_SIZE", "0"))
+        self.chunk_size = chunk_size
+        # "rollup" or "live" for the last trial balance load
+        self.last_source: Optional[str] = None
+
+    def _rollup_fresh(self, company_id: str, periods: List[str]) -> bool:
+        """
+        True when every requested (company, period) slice of the rollup is up to date
+
+        A missing status row (never built) or a stale one sends the load to
+        the live aggregate, as does a database without the rollup tables.
+        """
+        if not self.use_rollup:
+            return False
+
+        query = text("""
+            SELECT COUNT(*)
+            FROM consolidated_tb_rollup_status
+            WHERE company_id = :company_id
+            AND period IN :periods
+            AND NOT is_stale
+        """).bindparams(bindparam("periods", expanding=True))
+
+        try:
+            with self.engine.connect() as conn:
+                fresh = conn.execute(query, {"company_id": company_id, "periods": list(periods)}).scalar()
+        except SQLAlchemyError as e:
+            logger.warning(f"Consolidated TB rollup unavailable, using live aggregate: {e}")
+            return False
+
+        return fresh == len(set(periods))
+
+    def _read_consolidated(
+        self,
+        live_query: TextClause,
+        rollup_query: TextClause,
+        params: Dict[str, Any],
+        keys: List[str],
+        company_id: str,
+        periods: List[str]
+    ) -> pd.DataFrame:
+        """Read from the rollup when it is fresh for these periods, else aggregate trial_balance live"""
+        if self._rollup_fresh(company_id, periods):
+            self.last_source = "rollup"
+            return self._read_tb(rollup_query, params, keys)
+
+        self.last_source = "live"
+        return self._read_tb(live_query, params, keys)
+
+    def _read_tb(self, query: TextClause, params: Dict[str, Any], keys: List[str]) -> pd.DataFrame:
+        """
+        Run a trial balance query with the configured backend
+
+        With the arrow backend every column is Arrow-backed. On PostgreSQL with
+        the ADBC driver installed, rows arrive as Arrow record batches and are
+        never turned into Python objects. Otherwise read_sql builds the Arrow
+        columns itself.
+
+        With a chunk size the result is streamed and summed per keys (the
+        query's grouping columns) as it arrives; the frame is the same as
+        reading the query whole. This bounds the raw read, not the result,
+        which still has one row per key (see BalanceAccumulator).
+        """
+        if self.chunk_size:
+            return BalanceAccumulator.accumulate(self._iter_tb(query, params), keys)
+
+        if self.backend == "arrow":
+            if adbc_postgresql is not None and self.engine.dialect.name == "postgresql":
+                return self._read_adbc(query, params).to_pandas(types_mapper=pd.ArrowDtype)
+
+            with self.engine.connect() as conn:
+                return pd.read_sql(query, conn, params=params, dtype_backend="pyarrow")
+
+        with self.engine.connect() as conn:
+            return pd.read_sql(query, conn, params=params)
+
+    def _iter_tb(self, query: TextClause, params: Dict[str, Any]) -> Iterator[pd.DataFrame]:
+        """
+        Stream a trial balance query in frames of at most chunk_size rows
+
+        read_sql pulls chunk_size rows at a time from a server-side cursor
+        (stream_results), so neither the driver nor pandas buffers the whole
+        result. Over ADBC, Arrow record batches are streamed as they arrive
+        and sliced to chunk_size rows.
+        """
+        if self.backend == "arrow" and adbc_postgresql is not None and self.engine.dialect.name == "postgresql":
+            for batch in self._iter_adbc(query, params):
+                for offset in range(0, max(batch.num_rows, 1), self.chunk_size):
+                    yield batch.slice(offset, self.chunk_size).to_pandas(types_mapper=pd.ArrowDtype)
+            return
+
+        options = {"dtype_backend": "pyarrow"} if self.backend == "arrow" else {}
+        with self.engine.connect() as conn:
+            conn = conn.execution_options(stream_results=True, max_row_buffer=self.chunk_size)
+            yield from pd.read_sql(query, conn, params=params, chunksize=self.chunk_size, **options)
+
+    def _adbc_statement(self, query: TextClause, params: Dict[str, Any]):
+        """(sql, positional values, connection uri) for running a query over ADBC"""
+        typed = query.bindparams(*[
+            bindparam(name, value, type_=ADBC_PARAM_TYPES.get(name, String()), expanding=isinstance(value, list))
+            for name, value in params.items()
+        ])
+        compiled = typed.compile(dialect=ADBC_DIALECT, compile_kwargs={"render_postcompile": True})
+        values = [compiled.params[name] for name in compiled.positiontup]
+        uri = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        return str(compiled), values, uri
+
+    def _read_adbc(self, query: TextClause, params: Dict[str, Any]):
+        """Fetch a query as a pyarrow Table over an ADBC PostgreSQL connection"""
+        sql, values, uri = self._adbc_statement(query, params)
+
+        with adbc_postgresql.connect(uri) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, values)
+                return _numeric_to_float(cursor.fetch_arrow_table())
+
+    def _iter_adbc(self, query: TextClause, params: Dict[str, Any]):
+        """Stream a query as pyarrow Tables, one per record batch, over ADBC"""
+        import pyarrow as pa
+
+        sql, values, uri = self._adbc_statement(query, params)
+
+        with adbc_postgresql.connect(uri) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, values)
+                reader = cursor.fetch_record_batch()
+                empty = True
+                for batch in reader:
+                    empty = False
+                    yield _numeric_to_float(pa.Table.from_batches([batch]))
+                if empty:
+                    yield _numeric_to_float(reader.schema.empty_table())
 
     def load_consolidated_tb(self, company_id: str, period: str) -> pd.DataFrame:
         """
@@ -44,12 +250,217 @@ class ConsolidationDataLoader:
             ORDER BY tb.account_code
         """)
 
-        with self.engine.connect() as conn:
-            df = pd.read_sql(query, conn, params={"company_id": company_id, "period": period})
+        # The rollup is already grouped by account_code and account_name
+        rollup_query = text("""
+            SELECT
+                r.account_code,
+                r.account_name,
+                r.total_debit,
+                r.total_credit,
+                r.net_amount
+            FROM consolidated_tb_rollup r
+            WHERE r.company_id = :company_id
+            AND r.period = :period
+            ORDER BY r.account_code
+        """)
+
+        df = self._read_consolidated(
+            query, rollup_query, {"company_id": company_id, "period": period},
+            keys=["account_code", "account_name"], company_id=company_id, periods=[period]
+        )
+
+        logger.info(f"Loaded {len(df)} consolidated accounts for period {period} ({self.last_source})")
+        return df
+
+    def load_tb_movements(
+        self,
+        company_id: str,
+        current_period: str,
+        previous_period: str
+    ) -> pd.DataFrame:
+        """
+        Load both periods of the consolidated trial balance in one query
+
+        Balances are pivoted per account with conditional aggregation and the
+        movement is computed in the database, replacing two
+        load_consolidated_tb calls plus a pandas outer merge.
 
-        logger.info(f"Loaded {len(df)} consolidated accounts for period {period}")
+        Returns DataFrame with columns:
+        - account_code
+        - account_name (current period name, falling back to previous)
+        - current_balance
+        - previous_balance
+        - movement (current - previous)
+        - current_rows / previous_rows (TB rows found per period)
+        """
+        query = text("""
+            SELECT
+                tb.account_code,
+                COALESCE(
+                    MAX(CASE WHEN tb.period = :current_period THEN tb.account_name END),
+                    MAX(tb.account_name)
+                ) as account_name,
+                SUM(CASE WHEN tb.period = :current_period THEN tb.debit - tb.credit ELSE 0 END) as current_balance,
+                SUM(CASE WHEN tb.period = :previous_period THEN tb.debit - tb.credit ELSE 0 END) as previous_balance,
+                SUM(CASE WHEN tb.period = :current_period THEN tb.debit - tb.credit ELSE 0 END)
+                    - SUM(CASE WHEN tb.period = :previous_period THEN tb.debit - tb.credit ELSE 0 END) as movement,
+                COUNT(CASE WHEN tb.period = :current_period THEN 1 END) as current_rows,
+                COUNT(CASE WHEN tb.period = :previous_period THEN 1 END) as previous_rows
+            FROM trial_balance tb
+            INNER JOIN entities e ON tb.entity_id = e.id
+            WHERE e.company_id = :company_id
+            AND tb.period IN (:current_period, :previous_period)
+            GROUP BY tb.account_code
+            ORDER BY tb.account_code
+        """)
+
+        rollup_query = text("""
+            SELECT
+                r.account_code,
+                COALESCE(
+                    MAX(CASE WHEN r.period = :current_period THEN r.account_name END),
+                    MAX(r.account_name)
+                ) as account_name,
+                SUM(CASE WHEN r.period = :current_period THEN r.net_amount ELSE 0 END) as current_balance,
+                SUM(CASE WHEN r.period = :previous_period THEN r.net_amount ELSE 0 END) as previous_balance,
+                SUM(CASE WHEN r.period = :current_period THEN r.net_amount ELSE 0 END)
+                    - SUM(CASE WHEN r.period = :previous_period THEN r.net_amount ELSE 0 END) as movement,
+                SUM(CASE WHEN r.period = :current_period THEN r.row_count ELSE 0 END) as current_rows,
+                SUM(CASE WHEN r.period = :previous_period THEN r.row_count ELSE 0 END) as previous_rows
+            FROM consolidated_tb_rollup r
+            WHERE r.company_id = :company_id
+            AND r.period IN (:current_period, :previous_period)
+            GROUP BY r.account_code
+            ORDER BY r.account_code
+        """)
+
+        df = self._read_consolidated(
+            query, rollup_query, {
+                "company_id": company_id,
+                "current_period": current_period,
+                "previous_period": previous_period
+            },
+            keys=["account_code"], company_id=company_id, periods=[current_period, previous_period]
+        )
+
+        logger.info(
+            f"Loaded movements for {len(df)} consolidated accounts "
+            f"({current_period} vs {previous_period}, {self.last_source})"
+        )
+        return df
+
+    def load_tb_period_balances(self, company_id: str, periods: List[str]) -> pd.DataFrame:
+        """
+        Load consolidated balances for any number of periods in one query
+
+        Returns long-format DataFrame with columns:
+        - account_code
+        - period (as text, so it matches the requested period strings on DATE columns)
+        - balance (debit - credit, consolidated across all entities)
+        - row_count (TB rows aggregated)
+        """
+        query = text("""
+            SELECT
+                tb.account_code,
+                CAST(tb.period AS TEXT) as period,
+                SUM(tb.debit - tb.credit) as balance,
+                COUNT(*) as row_count
+            FROM trial_balance tb
+            INNER JOIN entities e ON tb.entity_id = e.id
+            WHERE e.company_id = :company_id
+            AND tb.period IN :periods
+            GROUP BY tb.account_code, tb.period
+            ORDER BY tb.account_code, tb.period
+        """).bindparams(bindparam("periods", expanding=True))
+
+        rollup_query = text("""
+            SELECT
+                r.account_code,
+                CAST(r.period AS TEXT) as period,
+                SUM(r.net_amount) as balance,
+                SUM(r.row_count) as row_count
+            FROM consolidated_tb_rollup r
+            WHERE r.company_id = :company_id
+            AND r.period IN :periods
+            GROUP BY r.account_code, r.period
+            ORDER BY r.account_code, r.period
+        """).bindparams(bindparam("periods", expanding=True))
+
+        df = self._read_consolidated(
+            query, rollup_query, {"company_id": company_id, "periods": list(periods)},
+            keys=["account_code", "period"], company_id=company_id, periods=list(periods)
+        )
+
+        logger.info(f"Loaded {len(df)} consolidated account balances across {len(periods)} periods ({self.last_source})")
         return df
 
+    def load_entity_tb_balances(self, company_id: str, periods: List[str]) -> pd.DataFrame:
+        """
+        Load trial balances per entity, account and period in one query
+
+        Feeds services.tb_cube.TrialBalanceCube, which drill-downs aggregate
+        in memory. Always reads trial_balance, since the rollup has no entity
+        grain. iter_entity_tb_balances streams the same rows in chunks.
+
+        Returns long-format DataFrame with columns:
+        - entity_id (as text), entity_code, entity_name
+        - region_code, region_name (null for entities without a region)
+        - account_code, account_name
+        - period (as text)
+        - balance (debit - credit)
+        - row_count (TB rows aggregated)
+        """
+        df = self._read_tb(
+            self._entity_tb_query(), {"company_id": company_id, "periods": list(periods)},
+            keys=ENTITY_TB_KEYS
+        )
+        self.last_source = "live"
+
+        logger.info(
+            f"Loaded {len(df)} entity account balances for {df['entity_id'].nunique()} entities "
+            f"across {len(periods)} periods"
+        )
+        return df
+
+    def iter_entity_tb_balances(self, company_id: str, periods: List[str]) -> Iterator[pd.DataFrame]:
+        """
+        load_entity_tb_balances as a stream of frames
+
+        Chunks of chunk_size rows come straight from the server-side cursor
+        (one frame when chunking is off), so a cube can be built without the
+        whole entity-grain result in memory.
+        """
+        params = {"company_id": company_id, "periods": list(periods)}
+        self.last_source = "live"
+
+        if self.chunk_size:
+            yield from self._iter_tb(self._entity_tb_query(), params)
+        else:
+            yield self._read_tb(self._entity_tb_query(), params, keys=ENTITY_TB_KEYS)
+
+    @staticmethod
+    def _entity_tb_query() -> TextClause:
+        return text("""
+            SELECT
+                CAST(e.id AS TEXT) as entity_id,
+                e.entity_code,
+                e.entity_name,
+                r.region_code,
+                r.region_name,
+                tb.account_code,
+                MAX(tb.account_name) as account_name,
+                CAST(tb.period AS TEXT) as period,
+                SUM(tb.debit - tb.credit) as balance,
+                COUNT(*) as row_count
+            FROM trial_balance tb
+            INNER JOIN entities e ON tb.entity_id = e.id
+            LEFT JOIN regions r ON e.region_id = r.id
+            WHERE e.company_id = :company_id
+            AND tb.period IN :periods
+            GROUP BY e.id, e.entity_code, e.entity_name, r.region_code, r.region_name, tb.account_code, tb.period
+            ORDER BY tb.account_code, e.entity_code, tb.period
+        """).bindparams(bindparam("periods", expanding=True))
+
     def load_chart_of_accounts(self, company_id: str) -> pd.DataFrame:
         """
         Load chart of accounts with full hierarchy
@@ -0,0 +1,108 @@
+"""
+Database Engine Service
+Application-scoped SQLAlchemy engine with a shared connection pool
+"""
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+from typing import Dict, Any, Optional
+import logging
+import threading
+import os
+
+logger = logging.getLogger(__name__)
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+def create_database_engine(
+    database_url: str,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_pre_ping: bool = True,
+    pool_recycle: int = 1800
+) -> Engine:
+    """
+    Create a pooled engine for PostgreSQL, or a local SQLite stand-in
+
+    Args:
+        database_url: SQLAlchemy URL (postgresql://... or sqlite://...)
+        pool_size: Connections kept open in the pool
+        max_overflow: Extra connections allowed above pool_size under load
+        pool_pre_ping: Test connections on checkout so dropped ones are replaced
+        pool_recycle: Seconds after which a connection is recycled
+    """
+    if database_url.startswith("sqlite"):
+        # SQLite stand-in for local runs and tests; an in-memory database only
+        # exists on a single connection, so share it across threads
+        if database_url in ("sqlite://", "sqlite:///:memory:"):
+            return create_engine(
+                database_url,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool
+            )
+        return create_engine(database_url, connect_args={"check_same_thread": False})
+
+    return create_engine(
+        database_url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=pool_pre_ping,
+        pool_recycle=pool_recycle
+    )
+
+def get_engine() -> Engine:
+    """
+    Process-wide engine built from DATABASE_URL and the DB_POOL_* settings
+    """
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            database_url = os.getenv("DATABASE_URL")
+            if not database_url:
+                raise RuntimeError("DATABASE_URL is not configured")
+
+            _engine = create_database_engine(
+                database_url,
+                pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+                max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+                pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+                pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800"))
+            )
+            logger.info(f"Database engine created ({_engine.pool.__class__.__name__})")
+
+        return _engine
+
+def dispose_engine() -> None:
+    """Close all pooled connections, e.g. on application shutdown"""
+    global _engine
+
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+def pool_status(engine: Optional[Engine] = None) -> Dict[str, Any]:
+    """
+    Snapshot of connection pool usage
+    """
+    engine = engine if engine is not None else _engine
+    if engine is None:
+        return {"initialized": False}
+
+    pool = engine.pool
+    status: Dict[str, Any] = {
+        "initialized": True,
+        "pool_class": pool.__class__.__name__,
+        "status": pool.status()
+    }
+
+    # QueuePool exposes live counters; other pool classes do not
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            status[name] = counter()
+
+    return status
@@ -0,0 +1,207 @@
+"""
+Embedding Cache Service
+Persists account text embeddings so known accounts skip the transformer on repeat runs
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Any
+import numpy as np
+import logging
+import sqlite3
+import threading
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: str) -> str:
+    """Canonical cache key for an account text: lowercased with collapsed whitespace"""
+    return " ".join(str(text).lower().split())
+
+class EmbeddingCache:
+    """
+    Two-level embedding cache keyed by (model name, normalized text)
+
+    An in-memory LRU sits in front of a local SQLite table. Both levels are
+    size bounded: the LRU by entry count, the SQLite table by evicting the
+    least recently used rows once it grows past max_disk_entries.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str,
+        memory_entries: int = 20000,
+        max_disk_entries: int = 500000
+    ):
+        """
+        Args:
+            cache_dir: Directory holding the SQLite file (created if missing)
+            model_name: Embeddings from different models never share entries
+            memory_entries: Capacity of the in-memory LRU
+            max_disk_entries: Row limit for this model in the SQLite store
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "embeddings.sqlite3")
+        self.model_name = model_name
+        self.memory_entries = memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(model, last_used)"
+        )
+        self._conn.commit()
+
+        logger.info(f"Embedding cache opened at {self.db_path} for model {model_name}")
+
+    def get_many(self, texts: List[str]) -> Tuple[Dict[str, np.ndarray], List[str]]:
+        """
+        Look up normalized texts
+
+        Returns:
+            (found, missing) - found maps text to its float32 vector,
+            missing lists the texts that must be encoded
+        """
+        found: Dict[str, np.ndarray] = {}
+        pending: List[str] = []
+
+        with self._lock:
+            for text in texts:
+                vector = self._memory.get(text)
+                if vector is not None:
+                    self._memory.move_to_end(text)
+                    found[text] = vector
+                else:
+                    pending.append(text)
+            self.memory_hits += len(found)
+
+            if pending:
+                disk_found = self._read_disk(pending)
+                for text, vector in disk_found.items():
+                    self._remember(text, vector)
+                found.update(disk_found)
+                self.disk_hits += len(disk_found)
+
+        missing = [text for text in pending if text not in found]
+        with self._lock:
+            self.misses += len(missing)
+
+        return found, missing
+
+    def put_many(self, embeddings: Dict[str, np.ndarray]) -> None:
+        """Store freshly computed vectors in both levels"""
+        if not embeddings:
+            return
+
+        now = time.time()
+        rows = []
+        for text, vector in embeddings.items():
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((self.model_name, text, int(vector.shape[0]), vector.tobytes(), now))
+
+        with self._lock:
+            for text, vector in embeddings.items():
+                self._remember(text, np.asarray(vector, dtype=np.float32))
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict_disk()
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current sizes"""
+        with self._lock:
+            disk_entries = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_name,)
+            ).fetchone()[0]
+            lookups = self.memory_hits + self.disk_hits + self.misses
+
+            return {
+                "model": self.model_name,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else None,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _read_disk(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Fetch vectors from SQLite and refresh their recency; caller holds the lock"""
+        found: Dict[str, np.ndarray] = {}
+
+        # Stay well under SQLite's bound-parameter limit
+        chunk_size = 500
+        for start in range(0, len(texts), chunk_size):
+            chunk = texts[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            cursor = self._conn.execute(
+                f"SELECT text, dim, vector FROM embeddings WHERE model = ? AND text IN ({placeholders})",
+                [self.model_name, *chunk]
+            )
+            for text, dim, blob in cursor:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if vector.shape[0] == dim:
+                    found[text] = vector
+
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text = ?",
+                [(now, self.model_name, text) for text in found]
+            )
+            self._conn.commit()
+
+        return found
+
+    def _remember(self, text: str, vector: np.ndarray) -> None:
+        """Insert into the LRU, dropping the oldest entries past capacity; caller holds the lock"""
+        self._memory[text] = vector
+        self._memory.move_to_end(text)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        """Trim the SQLite store back to max_disk_entries; caller holds the lock"""
+        count = self._conn.execute(
+            "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_name,)
+        ).fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow <= 0:
+            return
+
+        self._conn.execute("""
+            DELETE FROM embeddings WHERE model = ? AND text IN (
+                SELECT text FROM embeddings WHERE model = ?
+                ORDER BY last_used ASC LIMIT ?
+            )
+        """, (self.model_name, self.model_name, overflow))
+        self.evictions += overflow
+        logger.info(f"Evicted {overflow} embeddings from disk cache")
@@ -0,0 +1,203 @@
+"""
+Inference Backend Service
+Loads the sentence embedding model as PyTorch fp32, PyTorch int8 or ONNX Runtime for CPU inference
+"""
+
+from sentence_transformers import SentenceTransformer
+from typing import List, Optional, Any
+import numpy as np
+import tempfile
+import logging
+import json
+import os
+
+try:
+    import onnxruntime
+except ImportError:  # Only needed for the onnx backends
+    onnxruntime = None
+
+logger = logging.getLogger(__name__)
+
+# torch: fp32 SentenceTransformer (reference)
+# int8: the same model with its Linear layers dynamically quantized to int8
+# onnx: transformer exported to ONNX and run by ONNX Runtime, fp32
+# onnx-int8: the ONNX export with int8 dynamically quantized weights
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+
+ONNX_MODEL_FILES = {"onnx": "model.onnx", "onnx-int8": "model-int8.onnx"}
+
+def model_key(model_name: str, backend: str) -> str:
+    """
+    Name the backend's embeddings are cached and fingerprinted under
+
+    Quantized and exported models produce slightly different vectors, so each
+    backend gets its own embedding cache entries; torch keeps the bare model
+    name so existing caches stay valid.
+    """
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+def load_encoder(model_name: str, backend: str = "torch", onnx_dir: Optional[str] = None) -> Any:
+    """
+    Encoder with SentenceTransformer's encode() signature for the given backend
+
+    Args:
+        model_name: HuggingFace model name
+        backend: One of BACKENDS
+        onnx_dir: Directory holding ONNX exports, one subdirectory per model;
+            exported on first use (default ./cache/onnx)
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Use one of: {', '.join(BACKENDS)}")
+
+    if backend == "torch":
+        logger.info(f"Loading sentence transformer model: {model_name}")
+        return SentenceTransformer(model_name)
+
+    if backend == "int8":
+        import torch
+
+        logger.info(f"Loading sentence transformer model with int8 dynamic quantization: {model_name}")
+        model = SentenceTransformer(model_name, device="cpu")
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    model_dir = os.path.join(onnx_dir or "./cache/onnx", model_name.replace("/", "__"))
+    OnnxEncoder.export(model_name, model_dir, quantized=backend == "onnx-int8")
+    logger.info(f"Loading ONNX Runtime {backend} model from {model_dir}")
+    return OnnxEncoder(model_dir, quantized=backend == "onnx-int8")
+
+class OnnxEncoder:
+    """
+    SentenceTransformer-compatible encoder over an ONNX Runtime session
+
+    Only the transformer runs in ONNX Runtime; tokenization uses the model's
+    own tokenizer and pooling (mean or CLS, as in the model's pooling config)
+    is done in NumPy. Batches are formed from length-sorted texts, as
+    SentenceTransformer does, so padding stays short.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = False):
+        """
+        Args:
+            model_dir: Directory written by OnnxEncoder.export
+            quantized: Load the int8 model instead of the fp32 one
+        """
+        from transformers import AutoTokenizer
+
+        if onnxruntime is None:
+            raise RuntimeError("The onnx inference backends need onnxruntime (pip install onnxruntime onnx)")
+
+        with open(os.path.join(model_dir, "encoder.json")) as handle:
+            config = json.load(handle)
+
+        self.pooling: str = config["pooling"]
+        self.max_seq_length: int = config["max_seq_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILES["onnx-int8" if quantized else "onnx"]),
+            options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    @staticmethod
+    def export(model_name: str, model_dir: str, quantized: bool = False) -> None:
+        """
+        Export model_name's transformer, tokenizer and pooling config to model_dir
+
+        Does nothing for files that already exist. Files are written under a
+        temporary name and renamed, so workers exporting at the same time
+        never read a partial model.
+        """
+        fp32_path = os.path.join(model_dir, ONNX_MODEL_FILES["onnx"])
+        int8_path = os.path.join(model_dir, ONNX_MODEL_FILES["onnx-int8"])
+        os.makedirs(model_dir, exist_ok=True)
+
+        if not os.path.exists(fp32_path):
+            import torch
+
+            logger.info(f"Exporting {model_name} to ONNX at {model_dir}")
+            model = SentenceTransformer(model_name, device="cpu")
+            transformer, pooling = model[0], model[1]
+            mode = pooling.get_pooling_mode_str()
+            if mode not in ("mean", "cls"):
+                raise ValueError(f"ONNX export supports mean or cls pooling, {model_name} uses {mode}")
+
+            sample = transformer.tokenizer(["trade receivables"], return_tensors="pt")
+            # Graph inputs follow the forward() argument order, not the tokenizer's
+            input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+            axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+            handle, temporary = tempfile.mkstemp(dir=model_dir, suffix=".onnx")
+            os.close(handle)
+            with torch.no_grad():
+                torch.onnx.export(
+                    transformer.auto_model.eval(),
+                    ({name: sample[name] for name in input_names},),
+                    temporary,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=axes,
+                    opset_version=14
+                )
+
+            transformer.tokenizer.save_pretrained(model_dir)
+            with open(os.path.join(model_dir, "encoder.json"), "w") as config:
+                json.dump({"model": model_name, "pooling": mode, "max_seq_length": model.max_seq_length}, config)
+            os.replace(temporary, fp32_path)
+
+        if quantized and not os.path.exists(int8_path):
+            if onnxruntime is None:
+                raise RuntimeError("The onnx inference backends need onnxruntime (pip install onnxruntime onnx)")
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+
+            logger.info(f"Quantizing {fp32_path} to int8")
+            handle, temporary = tempfile.mkstemp(dir=model_dir, suffix=".onnx")
+            os.close(handle)
+            quantize_dynamic(fp32_path, temporary, weight_type=QuantType.QInt8)
+            os.replace(temporary, int8_path)
+
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False,
+        **kwargs: Any
+    ) -> np.ndarray:
+        """Sentence embeddings as a float32 (texts x dim) array, in input order"""
+        if not sentences:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        embeddings: Optional[np.ndarray] = None
+
+        for start in range(0, len(sentences), batch_size):
+            positions = order[start:start + batch_size]
+            features = self.tokenizer(
+                [sentences[position] for position in positions],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: features[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(["last_hidden_state"], feeds)[0]
+
+            if self.pooling == "cls":
+                vectors = hidden[:, 0]
+            else:
+                mask = features["attention_mask"][..., None].astype(hidden.dtype)
+                vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+            if embeddings is None:
+                embeddings = np.empty((len(sentences), vectors.shape[1]), dtype=np.float32)
+            embeddings[positions] = vectors
+
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
@@ -0,0 +1,433 @@
+"""
+Job Store Service
+Background cash flow generation jobs persisted in SQLite, run by an asyncio worker pool
+"""
+
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple, List, Set
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import socket
+import json
+import time
+import uuid
+import os
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+def caller_id(api_key: Optional[str]) -> Optional[str]:
+    """Stable identity for the caller's API key (a hash, never the key itself)"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest() if api_key else None
+
+def request_key(request: Dict[str, Any], caller: Optional[str] = None) -> str:
+    """
+    Hash identifying identical requests so in-flight duplicates share one job
+
+    Requests from different callers (see caller_id) never share a job, so one
+    caller's API key is not billed for another's request.
+    """
+    payload = request if caller is None else {"request": request, "caller": caller}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _placeholders(values: Tuple[str, ...]) -> str:
+    return ",".join("?" * len(values))
+
+class JobStore:
+    """
+    Local SQLite table of jobs: status, per-stage progress and final result
+
+    Jobs outlive the worker process. Every queued or running job is leased to
+    the JobManager that holds it (owner, lease_expires). Owners renew their
+    leases while alive, and a job is only run after an atomic claim, so
+    several uvicorn workers sharing the file never run a job twice. Jobs
+    whose owner stopped renewing are claimed by another worker.
+    """
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                request_key TEXT NOT NULL,
+                request TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT,
+                lease_expires REAL,
+                secret_names TEXT
+            )
+        """)
+        # Stores created before leases and secret names were added
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (("owner", "TEXT"), ("lease_expires", "REAL"), ("secret_names", "TEXT")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_request_key ON jobs(request_key, status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, lease_expires)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs(owner)")
+        self._conn.commit()
+
+    def create_or_get_active(
+        self,
+        request: Dict[str, Any],
+        owner: str,
+        lease_seconds: float,
+        caller: Optional[str] = None,
+        secret_names: Optional[List[str]] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Create a queued job leased to owner, unless the same caller's identical
+        request is already queued or running
+
+        Args:
+            secret_names: Names of the secrets submitted with the request. Only
+                the names are stored, so a worker resuming the job knows which
+                secrets it lacks.
+
+        Returns:
+            (job, created) - created is False when an in-flight job was reused
+        """
+        key = request_key(request, caller)
+        now = time.time()
+
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock first, so two processes
+            # cannot both miss the lookup and insert the same request
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE request_key = ? AND status IN ({_placeholders(ACTIVE_STATES)}) "
+                    "ORDER BY created_at LIMIT 1",
+                    (key, *ACTIVE_STATES)
+                ).fetchone()
+                if row is not None:
+                    self._conn.commit()
+                    return self._to_dict(row), False
+
+                job_id = uuid.uuid4().hex
+                self._conn.execute(
+                    "INSERT INTO jobs (id, request_key, request, status, stage, progress, created_at, updated_at, "
+                    "owner, lease_expires, secret_names) VALUES (?, ?, ?, ?, NULL, '{}', ?, ?, ?, ?, ?)",
+                    (
+                        job_id, key, json.dumps(request), JOB_QUEUED, now, now, owner, now + lease_seconds,
+                        json.dumps(sorted(secret_names or []))
+                    )
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+        return self.get(job_id), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def claim(self, job_id: str, owner: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        Atomically mark a job running for owner
+
+        Succeeds for a job owner already holds, or one whose lease expired
+        (its owner died or was stopped). Returns the job, or None when it is
+        finished or leased to another live owner.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET status = ?, owner = ?, lease_expires = ?, updated_at = ? "
+                f"WHERE id = ? AND status IN ({_placeholders(ACTIVE_STATES)}) "
+                "AND (owner = ? OR lease_expires IS NULL OR lease_expires < ?)",
+                (JOB_RUNNING, owner, now + lease_seconds, now, job_id, *ACTIVE_STATES, owner, now)
+            )
+            self._conn.commit()
+        return self.get(job_id) if cursor.rowcount == 1 else None
+
+    def renew_leases(self, owner: str, lease_seconds: float) -> int:
+        """Extend the lease on every queued or running job owner holds"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET lease_expires = ? WHERE owner = ? AND status IN ({_placeholders(ACTIVE_STATES)})",
+                (time.time() + lease_seconds, owner, *ACTIVE_STATES)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def release(self, owner: str) -> int:
+        """Return owner's unfinished jobs to the queue for other workers (on shutdown)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET status = ?, owner = NULL, lease_expires = NULL, updated_at = ? "
+                f"WHERE owner = ? AND status IN ({_placeholders(ACTIVE_STATES)})",
+                (JOB_QUEUED, time.time(), owner, *ACTIVE_STATES)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def update_stage(self, job_id: str, stage: str, state: str, at: Optional[float] = None) -> None:
+        """Record that a pipeline stage started or completed"""
+        with self._lock:
+            row = self._conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+
+            progress = json.loads(row["progress"])
+            entry = progress.setdefault(stage, {})
+            entry["state"] = state
+            entry[f"{state}_at"] = at or time.time()
+
+            self._conn.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, updated_at = ? WHERE id = ?",
+                (stage, json.dumps(progress), time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def complete(self, job_id: str, owner: str, result: Dict[str, Any]) -> bool:
+        """Store the result; False (and nothing written) if owner lost the lease"""
+        return self._finish(job_id, owner, status=JOB_SUCCEEDED, result=json.dumps(result))
+
+    def fail(self, job_id: str, owner: str, error: str) -> bool:
+        return self._finish(job_id, owner, status=JOB_FAILED, error=error)
+
+    def expired_jobs(self) -> List[str]:
+        """Ids of queued or running jobs whose owner stopped renewing the lease"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM jobs WHERE status IN ({_placeholders(ACTIVE_STATES)}) "
+                "AND (lease_expires IS NULL OR lease_expires < ?) ORDER BY created_at",
+                (*ACTIVE_STATES, time.time())
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def purge_finished(self, retention_seconds: float) -> int:
+        """Delete succeeded and failed jobs (and their results) finished more than retention_seconds ago"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({_placeholders(FINISHED_STATES)}) AND updated_at < ?",
+                (*FINISHED_STATES, time.time() - retention_seconds)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _finish(self, job_id: str, owner: str, **fields: Any) -> bool:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments}, owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (*fields.values(), time.time(), job_id, owner, JOB_RUNNING)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "progress": json.loads(row["progress"]),
+            "request": json.loads(row["request"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "secret_names": json.loads(row["secret_names"] or "[]"),
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+# run_job(request, secrets, progress) -> result dict
+JobRunnerFn = Callable[[Dict[str, Any], Dict[str, Any], Callable[[str, str], None]], Awaitable[Dict[str, Any]]]
+
+class JobManager:
+    """
+    Fixed-size pool of asyncio workers draining a queue of job ids
+
+    Each manager has its own owner id. A maintenance task renews the leases
+    on the jobs it holds, queues jobs whose owner died, and purges finished
+    jobs past the retention period. Store calls run on the threadpool, never
+    on the event loop.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        run_job: JobRunnerFn,
+        workers: int = 2,
+        lease_seconds: float = 60.0,
+        retention_seconds: float = 7 * 24 * 3600
+    ):
+        """
+        Args:
+            store: Persistent job store
+            run_job: Coroutine executing one job's request and returning its result
+            workers: Number of jobs processed concurrently
+            lease_seconds: How long a job stays leased to this manager without
+                renewal; renewed every third of that while the manager runs
+            retention_seconds: Finished jobs older than this are deleted
+        """
+        self.store = store
+        self.run_job = run_job
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._queued: Set[str] = set()
+        self._tasks: list = []
+        # Secrets (API keys) are kept in memory only, never in the job store;
+        # a job resumed by another manager fails rather than run without them
+        self._secrets: Dict[str, Dict[str, Any]] = {}
+
+    async def start(self) -> None:
+        """Pick up jobs abandoned by stopped workers, then start workers and maintenance"""
+        await self._maintain()
+
+        self._tasks = [
+            asyncio.create_task(self._worker(index)) for index in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._maintenance_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Hand unfinished jobs straight back instead of waiting for the lease to expire
+        released = await run_in_threadpool(self.store.release, self.owner)
+        if released:
+            logger.info(f"Released {released} unfinished jobs")
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await run_in_threadpool(self.store.get, job_id)
+
+    async def submit(
+        self,
+        request: Dict[str, Any],
+        secrets: Optional[Dict[str, Any]] = None,
+        caller: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Queue a job for request, sharing the same caller's identical in-flight job if one exists
+
+        Returns:
+            (job, created)
+        """
+        job, created = await run_in_threadpool(
+            self.store.create_or_get_active, request, self.owner, self.lease_seconds, caller, list(secrets or {})
+        )
+        if created:
+            if secrets:
+                self._secrets[job["job_id"]] = secrets
+            await self._enqueue(job["job_id"])
+        return job, created
+
+    async def _enqueue(self, job_id: str) -> None:
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            await self._queue.put(job_id)
+
+    async def _maintain(self) -> None:
+        await run_in_threadpool(self.store.renew_leases, self.owner, self.lease_seconds)
+
+        for job_id in await run_in_threadpool(self.store.expired_jobs):
+            logger.info(f"Resuming abandoned job {job_id}")
+            await self._enqueue(job_id)
+
+        purged = await run_in_threadpool(self.store.purge_finished, self.retention_seconds)
+        if purged:
+            logger.info(f"Purged {purged} finished jobs older than {self.retention_seconds:.0f}s")
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._maintain()
+            except Exception as e:
+                logger.error(f"Job maintenance failed: {str(e)}")
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queued.discard(job_id)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = await run_in_threadpool(self.store.claim, job_id, self.owner, self.lease_seconds)
+        if job is None:
+            # Finished, or claimed by another live worker
+            return
+
+        secrets = self._secrets.pop(job_id, None)
+        if secrets is None and job["secret_names"]:
+            # Submitted to a manager that stopped or died; its secrets went with it
+            error = (
+                f"Job was resumed by another worker, which does not have the submitted "
+                f"{', '.join(job['secret_names'])} (secrets are never persisted). Resubmit the request."
+            )
+            logger.warning(f"Job {job_id} failed: {error}")
+            await run_in_threadpool(self.store.fail, job_id, self.owner, error)
+            return
+
+        last_write: Optional[asyncio.Future] = None
+
+        async def write_stage(previous: Optional[asyncio.Future], stage: str, state: str, at: float) -> None:
+            # Chained so "completed" never lands before the same stage's "started"
+            if previous is not None:
+                await previous
+            await run_in_threadpool(self.store.update_stage, job_id, stage, state, at)
+
+        def progress(stage: str, state: str) -> None:
+            nonlocal last_write
+            last_write = asyncio.ensure_future(write_stage(last_write, stage, state, time.time()))
+
+        try:
+            result = await self.run_job(job["request"], secrets or {}, progress)
+            if last_write is not None:
+                await last_write
+            if await run_in_threadpool(self.store.complete, job_id, self.owner, result):
+                logger.info(f"Job {job_id} succeeded")
+            else:
+                logger.warning(f"Job {job_id} finished after its lease was taken over; result discarded")
+
+        except asyncio.CancelledError:
+            # Left leased to this owner; stop() releases it for other workers
+            raise
+
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            if last_write is not None:
+                await asyncio.gather(last_write, return_exceptions=True)
+            await run_in_threadpool(self.store.fail, job_id, self.owner, str(e))
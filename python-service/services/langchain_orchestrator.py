@@ -7,34 +7,21 @@ from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, Optional, Any, AsyncIterator, Tuple
 import pandas as pd
+import asyncio
 import logging
 import json
 
-logger = logging.getLogger(__name__)
-
-class ComponentEnhancement(BaseModel):
-    """Output schema for component enhancement"""
-    confidence_score: float = Field(description="Confidence score 0-1 for this classification")
-    suggested_name: Optional[str] = Field(description="Improved component name if needed")
-    notes: Optional[str] = Field(description="Explanation or notes about this component")
+from services.llm_cache import LLMResponseCache
 
-class CashFlowOrchestrator:
-    """
-    Uses LangChain and OpenAI to enhance cash flow components with AI reasoning
-    """
+logger = logging.getLogger(__name__)
 
-    def __init__(self, api_key: str, model: str = "gpt-4"):
-        self.llm = ChatOpenAI(
-            api_key=api_key,
-            model=model,
-            temperature=0.1  # Low temperature for consistent financial analysis
-        )
+# Bump whenever a prompt template changes so cached responses are not reused
+PROMPT_TEMPLATE_VERSION = "1"
 
-        # Create prompt template
-        self.enhancement_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert financial analyst specializing in cash flow statements under IFRS and GAAP.
+ENHANCEMENT_SYSTEM_PROMPT = """You are an expert financial analyst specializing in cash flow statements under IFRS and GAAP.
 
 Your task is to review automatically generated cash flow components and:
 1. Validate the classification (Operating/Investing/Financing)
@@ -49,7 +36,84 @@ Consider the indirect method:
 
 Working capital logic:
 - Current assets increase = cash outflow (negative)
-- Current liabilities increase = cash inflow (positive)"""),
+- Current liabilities increase = cash inflow (positive)"""
+
+class ComponentEnhancement(BaseModel):
+    """Output schema for component enhancement"""
+    confidence_score: float = Field(description="Confidence score 0-1 for this classification")
+    suggested_name: Optional[str] = Field(default=None, description="Improved component name if needed")
+    notes: Optional[str] = Field(default=None, description="Explanation or notes about this component")
+
+class BatchComponentEnhancement(ComponentEnhancement):
+    """Output schema for one entry of a batched enhancement response"""
+    id: str = Field(description="Component id this enhancement belongs to")
+
+class CashFlowOrchestrator:
+    """
+    Uses LangChain and OpenAI to enhance cash flow components with AI reasoning
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gpt-4",
+        llm: Optional[Any] = None,
+        max_concurrency: int = 5,
+        timeout: float = 60.0,
+        max_retries: int = 2,
+        retry_backoff: float = 1.0,
+        response_cache: Optional[LLMResponseCache] = None
+    ):
+        """
+        Args:
+            api_key: OpenAI API key (not needed when llm is injected)
+            model: OpenAI chat model name
+            llm: Pre-built LangChain chat model, e.g. benchmarks.fakes.FakeChatModel
+            max_concurrency: Maximum in-flight LLM calls in async mode
+            timeout: Per-call timeout in seconds (async mode)
+            max_retries: Retries per call after the first attempt (async mode)
+            retry_backoff: Base delay in seconds, doubled on each retry
+            response_cache: Optional persistent cache of LLM responses, keyed by
+                the model name and temperature of the model called (an injected
+                llm's own; not used for an llm without a model_name)
+        """
+        self.model_name = model
+        self.temperature = 0.1  # Low temperature for consistent financial analysis
+        if llm is None:
+            self.llm = ChatOpenAI(
+                api_key=api_key,
+                model=model,
+                temperature=self.temperature
+            )
+        else:
+            # Cache keys must describe the model actually called, not the default
+            self.llm = llm
+            self.model_name = getattr(llm, "model_name", None)
+            self.temperature = getattr(llm, "temperature", None)
+            if response_cache is not None and self.model_name is None:
+                logger.info(f"LLM response cache disabled for {type(llm).__name__}: no model name to key on")
+                response_cache = None
+
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.response_cache = response_cache
+
+        # Per-instance LLM usage, reported in pipeline spans
+        self.usage: Dict[str, int] = {
+            "llm_calls": 0,
+            "llm_retries": 0,
+            "llm_cache_hits": 0,
+            "llm_cache_misses": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0
+        }
+
+        # Create prompt template
+        self.enhancement_prompt = ChatPromptTemplate.from_messages([
+            ("system", ENHANCEMENT_SYSTEM_PROMPT),
 
             ("human", """Analyze this cash flow component:
 
@@ -69,68 +133,56 @@ Provide:
 Return your analysis as JSON with keys: confidence_score, suggested_name, notes""")
         ])
 
+        # Batched variant: many components per request, one shared system prompt
+        self.batch_enhancement_prompt = ChatPromptTemplate.from_messages([
+            ("system", ENHANCEMENT_SYSTEM_PROMPT),
+
+            ("human", """Analyze each of these cash flow components (JSON array):
+
+{components_json}
+
+For every component provide:
+1. Confidence score (0-1) for its classification
+2. Suggested improved name (if current name is unclear)
+3. Brief notes on correctness and any concerns
+
+Return ONLY a JSON array with one object per component, with keys: id (copied from the input), confidence_score, suggested_name, notes""")
+        ])
+
     def enhance_components(
         self,
         components: List[Dict],
-        current_data: pd.DataFrame,
-        previous_data: pd.DataFrame,
-        coa_data: pd.DataFrame
+        current_data: Optional[pd.DataFrame] = None,
+        previous_data: Optional[pd.DataFrame] = None,
+        coa_data: Optional[pd.DataFrame] = None
     ) -> List[Dict]:
         """
         Enhance components with AI validation and suggestions
 
         Args:
             components: List of calculated components
-            current_data: Current period trial balance
-            previous_data: Previous period trial balance
-            coa_data: Chart of accounts
+            current_data: Current period trial balance (unused; kept for callers
+                passing the original positional arguments)
+            previous_data: Previous period trial balance (unused, as above)
+            coa_data: Chart of accounts, for account names in the prompt;
+                account codes are shown when omitted
 
         Returns:
             Enhanced components list
         """
         logger.info(f"Enhancing {len(components)} components with AI...")
 
+        account_map = (
+            dict(zip(coa_data['account_code'], coa_data['account_name'])) if coa_data is not None else {}
+        )
         enhanced_components = []
 
         for component in components:
             try:
-                # Get account names for context
-                account_codes = component['accounts'][:10]  # Limit to 10 for token efficiency
-                account_map = dict(zip(coa_data['account_code'], coa_data['account_name']))
-                account_names = [account_map.get(code, code) for code in account_codes]
-
-                # Format prompt
-                prompt_values = {
-                    "component_name": component['name'],
-                    "category": component['category'],
-                    "accounts": ", ".join(account_names),
-                    "current_value": component['current_value'],
-                    "previous_value": component['previous_value'],
-                    "movement": component['movement'],
-                    "cash_impact": component['cash_impact']
-                }
-
-                # Call LLM
-                messages = self.enhancement_prompt.format_messages(**prompt_values)
-                response = self.llm(messages)
-
-                # Parse response
-                try:
-                    enhancement = json.loads(response.content)
-
-                    # Update component
-                    component['confidence_score'] = enhancement.get('confidence_score', 0.8)
-
-                    # Use suggested name if confidence is high and name is provided
-                    if enhancement.get('suggested_name') and enhancement.get('confidence_score', 0) > 0.7:
-                        component['ai_suggested_name'] = enhancement['suggested_name']
-
-                    if enhancement.get('notes'):
-                        component['ai_notes'] = enhancement['notes']
-
-                except json.JSONDecodeError:
-                    logger.warning(f"Failed to parse AI response for component: {component['name']}")
-                    component['confidence_score'] = 0.8  # Default
+                messages = self._enhancement_messages(component, account_map)
+                content, cache_key = self._call_llm(messages)
+                if self._apply_enhancement(component, content):
+                    self._store_response(cache_key, content)
 
             except Exception as e:
                 logger.error(f"Error enhancing component {component['name']}: {str(e)}")
@@ -141,6 +193,389 @@ Return your analysis as JSON with keys: confidence_score, suggested_name, notes"
         logger.info("AI enhancement complete")
         return enhanced_components
 
+    async def aenhance_components(
+        self,
+        components: List[Dict],
+        coa_data: pd.DataFrame
+    ) -> List[Dict]:
+        """
+        Enhance components concurrently
+
+        Up to max_concurrency LLM calls are in flight at once; each call is
+        bounded by timeout and retried with exponential backoff. Results are
+        returned in the original component order.
+
+        Args:
+            components: List of calculated components
+            coa_data: Chart of accounts
+
+        Returns:
+            Enhanced components list
+        """
+        async for _ in self.aiter_enhanced_components(components, coa_data):
+            pass
+
+        return components
+
+    async def aiter_enhanced_components(
+        self,
+        components: List[Dict],
+        coa_data: pd.DataFrame
+    ) -> AsyncIterator[Dict]:
+        """
+        Enhance components concurrently, yielding each one as its call completes
+
+        Components are updated in place; the yield order is completion order,
+        not input order. Closing the iterator early cancels outstanding calls.
+
+        Args:
+            components: List of calculated components
+            coa_data: Chart of accounts
+
+        Yields:
+            Each enhanced component
+        """
+        logger.info(
+            f"Enhancing {len(components)} components with AI "
+            f"(concurrency {self.max_concurrency})..."
+        )
+
+        account_map = dict(zip(coa_data['account_code'], coa_data['account_name']))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def enhance_one(component: Dict) -> Dict:
+            async with semaphore:
+                try:
+                    messages = self._enhancement_messages(component, account_map)
+                    content, cache_key = await self._acall_llm(messages)
+                    if self._apply_enhancement(component, content):
+                        await self._astore_response(cache_key, content)
+
+                except Exception as e:
+                    logger.error(f"Error enhancing component {component['name']}: {str(e)}")
+                    component['confidence_score'] = 0.7  # Default for errors
+
+            return component
+
+        tasks = [asyncio.ensure_future(enhance_one(c)) for c in components]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        logger.info("AI enhancement complete")
+
+    async def aenhance_components_batched(
+        self,
+        components: List[Dict],
+        coa_data: pd.DataFrame,
+        token_budget: int = 6000
+    ) -> List[Dict]:
+        """
+        Enhance components with a few structured multi-component prompts
+
+        Components are packed into chunks whose rendered payload stays under
+        token_budget (estimated), each chunk is one chat completion returning
+        a JSON array keyed by component id. Components missing from the reply
+        or failing to parse fall back to per-component calls.
+
+        Args:
+            components: List of calculated components
+            coa_data: Chart of accounts
+            token_budget: Approximate prompt tokens per chunk for the component payload
+
+        Returns:
+            Enhanced components list, in the original order
+        """
+        async for _ in self.aiter_enhanced_components_batched(components, coa_data, token_budget):
+            pass
+
+        return components
+
+    async def aiter_enhanced_components_batched(
+        self,
+        components: List[Dict],
+        coa_data: pd.DataFrame,
+        token_budget: int = 6000
+    ) -> AsyncIterator[Dict]:
+        """
+        Batched enhancement, yielding components chunk by chunk as replies arrive
+
+        Components missing from a reply are yielded later, once their
+        per-component fallback call completes.
+
+        Yields:
+            Each enhanced component
+        """
+        account_map = dict(zip(coa_data['account_code'], coa_data['account_name']))
+        chunks = self._chunk_components(components, account_map, token_budget)
+        components_by_id = {str(component['id']): component for component in components}
+
+        logger.info(
+            f"Enhancing {len(components)} components with AI in {len(chunks)} batched request(s)..."
+        )
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def enhance_chunk(payloads: List[Dict]) -> Dict[str, BatchComponentEnhancement]:
+            async with semaphore:
+                try:
+                    messages = self.batch_enhancement_prompt.format_messages(
+                        components_json=json.dumps(payloads, indent=1)
+                    )
+                    content, cache_key = await self._acall_llm(messages)
+                    enhancements = self._parse_batch_response(content)
+                    await self._astore_response(cache_key, content)
+                    return enhancements
+
+                except Exception as e:
+                    logger.error(f"Batched enhancement request failed: {str(e)}")
+                    return {}
+
+        enhanced_ids = set()
+        tasks = [asyncio.ensure_future(enhance_chunk(chunk)) for chunk in chunks]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                for component_id, enhancement in (await next_done).items():
+                    component = components_by_id.get(component_id)
+                    if component is None or component_id in enhanced_ids:
+                        continue
+
+                    self._apply_enhancement_values(
+                        component,
+                        enhancement.model_dump(exclude={"id"}, exclude_none=True)
+                    )
+                    enhanced_ids.add(component_id)
+                    yield component
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        fallback = [c for c in components if str(c['id']) not in enhanced_ids]
+        if fallback:
+            logger.warning(
+                f"{len(fallback)} component(s) missing from batched response, "
+                f"falling back to per-component calls"
+            )
+            async for component in self.aiter_enhanced_components(fallback, coa_data):
+                yield component
+        else:
+            logger.info("AI enhancement complete")
+
+    def _chunk_components(
+        self,
+        components: List[Dict],
+        account_map: Dict[str, str],
+        token_budget: int
+    ) -> List[List[Dict]]:
+        """Pack compact component payloads into chunks under the token budget"""
+        chunks: List[List[Dict]] = []
+        current: List[Dict] = []
+        current_tokens = 0
+
+        for component in components:
+            payload = {
+                "id": str(component['id']),
+                "name": component['name'],
+                "category": component['category'],
+                "accounts": [account_map.get(code, code) for code in component['accounts'][:10]],
+                "current_value": round(component['current_value'], 2),
+                "previous_value": round(component['previous_value'], 2),
+                "movement": round(component['movement'], 2),
+                "cash_impact": round(component['cash_impact'], 2)
+            }
+            # Rough estimate: ~4 characters per token
+            tokens = len(json.dumps(payload)) // 4 + 1
+
+            if current and current_tokens + tokens > token_budget:
+                chunks.append(current)
+                current, current_tokens = [], 0
+
+            current.append(payload)
+            current_tokens += tokens
+
+        if current:
+            chunks.append(current)
+
+        return chunks
+
+    @staticmethod
+    def _parse_batch_response(content: str) -> Dict[str, BatchComponentEnhancement]:
+        """
+        Parse a batched reply into enhancements keyed by component id
+
+        Entries that fail validation are dropped (and later retried individually).
+        """
+        # Tolerate prose or code fences around the array
+        text = content.strip()
+        start, end = text.find("["), text.rfind("]")
+        if start != -1 and end > start:
+            text = text[start:end + 1]
+
+        parsed = json.loads(text)
+
+        results: Dict[str, BatchComponentEnhancement] = {}
+        for item in parsed if isinstance(parsed, list) else []:
+            try:
+                enhancement = BatchComponentEnhancement.model_validate(item)
+                results[str(enhancement.id)] = enhancement
+            except Exception:
+                entry_id = item.get('id') if isinstance(item, dict) else None
+                logger.warning(f"Skipping invalid batched enhancement entry for component {entry_id}")
+
+        return results
+
+    def _enhancement_messages(self, component: Dict, account_map: Dict[str, str]) -> List:
+        """Render the enhancement prompt for one component"""
+        # Get account names for context
+        account_codes = component['accounts'][:10]  # Limit to 10 for token efficiency
+        account_names = [account_map.get(code, code) for code in account_codes]
+
+        return self.enhancement_prompt.format_messages(
+            component_name=component['name'],
+            category=component['category'],
+            accounts=", ".join(account_names),
+            current_value=component['current_value'],
+            previous_value=component['previous_value'],
+            movement=component['movement'],
+            cash_impact=component['cash_impact']
+        )
+
+    def _apply_enhancement(self, component: Dict, content: str) -> bool:
+        """
+        Parse an enhancement response and update the component in place
+
+        Returns:
+            Whether the response parsed (and may be cached)
+        """
+        try:
+            enhancement = json.loads(content)
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse AI response for component: {component['name']}")
+            component['confidence_score'] = 0.8  # Default
+            return False
+
+        if not isinstance(enhancement, dict):
+            logger.warning(f"AI response for component {component['name']} is not a JSON object")
+            component['confidence_score'] = 0.8  # Default
+            return False
+
+        self._apply_enhancement_values(component, enhancement)
+        return True
+
+    @staticmethod
+    def _apply_enhancement_values(component: Dict, enhancement: Dict) -> None:
+        """Copy confidence, suggested name and notes onto the component"""
+        component['confidence_score'] = enhancement.get('confidence_score', 0.8)
+
+        # Use suggested name if confidence is high and name is provided
+        if enhancement.get('suggested_name') and enhancement.get('confidence_score', 0) > 0.7:
+            component['ai_suggested_name'] = enhancement['suggested_name']
+
+        if enhancement.get('notes'):
+            component['ai_notes'] = enhancement['notes']
+
+    def _cache_key(self, messages: List) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        return LLMResponseCache.make_key(
+            self.model_name, self.temperature, messages, PROMPT_TEMPLATE_VERSION
+        )
+
+    def _cached_response(self, cache_key: Optional[str]) -> Optional[str]:
+        if cache_key is None:
+            return None
+        return self._count_lookup(self.response_cache.get(cache_key))
+
+    async def _acached_response(self, cache_key: Optional[str]) -> Optional[str]:
+        """_cached_response with the SQLite read on the threadpool, off the event loop"""
+        if cache_key is None:
+            return None
+        return self._count_lookup(await run_in_threadpool(self.response_cache.get, cache_key))
+
+    def _count_lookup(self, cached: Optional[str]) -> Optional[str]:
+        if cached is not None:
+            self.usage["llm_cache_hits"] += 1
+        else:
+            self.usage["llm_cache_misses"] += 1
+        return cached
+
+    def _store_response(self, cache_key: Optional[str], content: str) -> None:
+        """Cache a response once its caller has parsed it (cache_key from _call_llm)"""
+        if cache_key is not None:
+            self.response_cache.put(cache_key, content)
+
+    async def _astore_response(self, cache_key: Optional[str], content: str) -> None:
+        if cache_key is not None:
+            await run_in_threadpool(self.response_cache.put, cache_key, content)
+
+    def _record_usage(self, result: Any) -> None:
+        """Add token usage reported by the provider (OpenAI's llm_output.token_usage)"""
+        self.usage["llm_calls"] += 1
+        token_usage = (result.llm_output or {}).get("token_usage") or {}
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            self.usage[key] += int(token_usage.get(key) or 0)
+
+    def _call_llm(self, messages: List) -> Tuple[str, Optional[str]]:
+        """
+        Single chat completion, served from the response cache when possible
+
+        A fresh response is not cached here: a malformed or truncated reply
+        would then be replayed for the whole TTL. Callers pass the returned
+        key to _store_response once the response has parsed.
+
+        Returns:
+            (response text, cache key to store it under; None when it came
+            from the cache or caching is off)
+        """
+        cache_key = self._cache_key(messages)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            return cached, None
+
+        result = self.llm.generate([messages])
+        self._record_usage(result)
+        return result.generations[0][0].text, cache_key
+
+    async def _acall_llm(self, messages: List) -> Tuple[str, Optional[str]]:
+        """
+        Single async chat completion with timeout and retry/backoff,
+        served from the response cache when possible
+
+        Cache reads run on the threadpool. As with _call_llm, callers store
+        the response (_astore_response) only after it has parsed.
+
+        Returns:
+            (response text, cache key to store it under, or None)
+        """
+        cache_key = self._cache_key(messages)
+        cached = await self._acached_response(cache_key)
+        if cached is not None:
+            return cached, None
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await asyncio.wait_for(
+                    self.llm.agenerate([messages]),
+                    timeout=self.timeout
+                )
+                self._record_usage(result)
+                return result.generations[0][0].text, cache_key
+
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+
+                self.usage["llm_retries"] += 1
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(
+                    f"LLM call failed ({type(e).__name__}: {e}); "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
     def validate_cashflow_statement(
         self,
         components: List[Dict],
@@ -189,8 +624,9 @@ Return as JSON with keys: status (OK/WARNING/ERROR), observations (list), warnin
                 net_cash_change=net_cash_change
             )
 
-            response = self.llm(messages)
-            validation = json.loads(response.content)
+            content, cache_key = self._call_llm(messages)
+            validation = json.loads(content)
+            self._store_response(cache_key, content)
 
             logger.info(f"Validation status: {validation.get('status', 'UNKNOWN')}")
             return validation
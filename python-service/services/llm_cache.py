@@ -0,0 +1,145 @@
+"""
+LLM Response Cache Service
+Content-addressed cache of chat completions so unchanged prompts are never re-sent
+"""
+
+from typing import Dict, Any, List, Optional
+import hashlib
+import logging
+import sqlite3
+import threading
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+class LLMResponseCache:
+    """
+    Persistent cache of LLM responses keyed by a hash of everything that
+    determines the answer: model, temperature, rendered messages and the
+    prompt-template version
+
+    Entries expire after ttl_seconds; once the store grows past max_entries
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str, ttl_seconds: int = 7 * 24 * 3600, max_entries: int = 50000):
+        """
+        Args:
+            cache_dir: Directory holding the SQLite file (created if missing)
+            ttl_seconds: Age after which a cached response is ignored and removed
+            max_entries: Row limit for the store
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "llm_responses.sqlite3")
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses(last_used)"
+        )
+        self._conn.commit()
+
+        logger.info(f"LLM response cache opened at {self.db_path}")
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: List[Any], prompt_version: str) -> str:
+        """
+        Hash of model, temperature, prompt version and the rendered messages
+        """
+        payload = json.dumps({
+            "model": model,
+            "temperature": temperature,
+            "prompt_version": prompt_version,
+            "messages": [[message.type, message.content] for message in messages]
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response text, or None on a miss or an expired entry"""
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            lookups = self.hits + self.misses
+
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "entries": entries
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self, now: float) -> None:
+        """Drop expired rows, then least recently used rows past max_entries; caller holds the lock"""
+        cursor = self._conn.execute(
+            "DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        self.expired += cursor.rowcount
+
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute("""
+                DELETE FROM llm_responses WHERE key IN (
+                    SELECT key FROM llm_responses ORDER BY last_used ASC LIMIT ?
+                )
+            """, (overflow,))
+            self.evictions += overflow
@@ -0,0 +1,144 @@
+"""
+Metrics Service
+Per-stage timing spans for pipeline runs, aggregated into Prometheus metrics
+"""
+
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+STAGE_DURATION = Histogram(
+    "cashflow_stage_duration_seconds",
+    "Duration of cash flow pipeline stages",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_ROWS = Counter(
+    "cashflow_stage_rows_total",
+    "Rows processed by cash flow pipeline stages",
+    ["stage"]
+)
+STAGE_ERRORS = Counter(
+    "cashflow_stage_errors_total",
+    "Cash flow pipeline stages that raised",
+    ["stage"]
+)
+CACHE_LOOKUPS = Counter(
+    "cashflow_cache_lookups_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"]
+)
+LLM_CALLS = Counter(
+    "cashflow_llm_calls_total",
+    "LLM completions by source (api or cache)",
+    ["source"]
+)
+LLM_TOKENS = Counter(
+    "cashflow_llm_tokens_total",
+    "LLM tokens used",
+    ["kind"]
+)
+CLASSIFIED_ACCOUNTS = Counter(
+    "cashflow_classified_accounts_total",
+    "Accounts classified, by the tier that resolved them (rule or model)",
+    ["tier"]
+)
+HTTP_DURATION = Histogram(
+    "cashflow_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+class Span:
+    """Timing and counters for one pipeline stage"""
+
+    def __init__(self, name: str, rows: Optional[int] = None):
+        self.name = name
+        self.rows = rows
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.attributes: Dict[str, Any] = {}
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        span: Dict[str, Any] = {"stage": self.name, "seconds": self.seconds, "rows": self.rows}
+        span.update(self.attributes)
+        if self.error:
+            span["error"] = self.error
+        return span
+
+class RunTrace:
+    """
+    Spans collected during one pipeline run
+
+    Every finished span is also recorded in the process-wide Prometheus
+    metrics served on /metrics.
+    """
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    @contextmanager
+    def span(self, name: str, rows: Optional[int] = None) -> Iterator[Span]:
+        span = Span(name, rows)
+        started = time.perf_counter()
+
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.seconds = time.perf_counter() - started
+            self.spans.append(span)
+            _record(span)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [span.to_dict() for span in self.spans]
+
+def _record(span: Span) -> None:
+    """Aggregate a finished span into the Prometheus metrics"""
+    STAGE_DURATION.labels(stage=span.name).observe(span.seconds)
+    if span.rows:
+        STAGE_ROWS.labels(stage=span.name).inc(span.rows)
+    if span.error:
+        STAGE_ERRORS.labels(stage=span.name).inc()
+
+    attributes = span.attributes
+    if "classification_cache" in attributes:
+        CACHE_LOOKUPS.labels(cache="classification", result=attributes["classification_cache"]).inc()
+    if "tb_cube_cache" in attributes:
+        CACHE_LOOKUPS.labels(cache="tb_cube", result=attributes["tb_cube_cache"]).inc()
+    for cache in ("embedding", "llm"):
+        for result, attribute in (("hit", f"{cache}_cache_hits"), ("miss", f"{cache}_cache_misses")):
+            if attributes.get(attribute):
+                CACHE_LOOKUPS.labels(cache=cache, result=result).inc(attributes[attribute])
+
+    for tier in ("rule", "model"):
+        if attributes.get(f"{tier}_tier"):
+            CLASSIFIED_ACCOUNTS.labels(tier=tier).inc(attributes[f"{tier}_tier"])
+
+    if attributes.get("llm_calls"):
+        LLM_CALLS.labels(source="api").inc(attributes["llm_calls"])
+    if attributes.get("llm_cache_hits"):
+        LLM_CALLS.labels(source="cache").inc(attributes["llm_cache_hits"])
+    for kind in ("prompt", "completion"):
+        tokens = attributes.get(f"{kind}_tokens")
+        if tokens:
+            LLM_TOKENS.labels(kind=kind).inc(tokens)
+
+def observe_http_request(method: str, route: str, status: int, seconds: float) -> None:
+    HTTP_DURATION.labels(method=method, route=route, status=str(status)).observe(seconds)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Prometheus text exposition of all metrics, with its content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
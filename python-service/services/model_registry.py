@@ -0,0 +1,228 @@
+"""
+Model Registry Service
+Holds the process-wide AccountClassifier so the model is loaded once per worker
+"""
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Optional
+import logging
+import threading
+import time
+import os
+
+from services.account_classifier import AccountClassifier
+from services.inference_backend import model_key
+from services.embedding_cache import EmbeddingCache
+from services.classification_cache import ClassificationCache
+from services.cashflow_state import CashFlowStateStore
+from services.tb_cube import TrialBalanceCubeCache
+from services.llm_cache import LLMResponseCache
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """
+    Lifecycle-managed registry for models shared across requests
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        batch_size: int = 64,
+        embedding_cache_dir: Optional[str] = None,
+        classification_cache_size: int = 256,
+        inference_workers: int = 2,
+        llm_cache_dir: Optional[str] = None,
+        cashflow_state_size: int = 256,
+        tb_cube_size: int = 32,
+        tb_cube_ttl_seconds: float = 900.0,
+        model: Optional[Any] = None,
+        backend: str = "torch",
+        batch_workers: Optional[int] = None
+    ):
+        self.model_name = model_name
+        # torch, int8, onnx or onnx-int8 (see services.inference_backend)
+        self.backend = backend
+        # Preloaded encoder (e.g. a benchmark stub); loaded from model_name when None
+        self.model = model
+        self.batch_size = batch_size
+        self.embedding_cache_dir = embedding_cache_dir
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        self._classifier: Optional[AccountClassifier] = None
+        self.classification_cache = ClassificationCache(max_companies=classification_cache_size)
+        self.cashflow_state = CashFlowStateStore(max_entries=cashflow_state_size)
+        self.tb_cubes = TrialBalanceCubeCache(max_entries=tb_cube_size, ttl_seconds=tb_cube_ttl_seconds)
+        self.inference_workers = inference_workers
+        self.llm_cache_dir = llm_cache_dir
+        self.llm_cache: Optional[LLMResponseCache] = None
+        self._inference_executor: Optional[ThreadPoolExecutor] = None
+        # Process pool for /api/cashflow/batch, started on first use and kept
+        # so its workers load the model once rather than once per request
+        self.batch_workers = batch_workers or os.cpu_count() or 1
+        self._batch_pool: Optional[ProcessPoolExecutor] = None
+        self._batch_lock = threading.Lock()
+        self._ready = False
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        # Set when load() failed, reported by status() so /health explains the 503
+        self.load_error: Optional[str] = None
+
+    def load(self) -> None:
+        """
+        Load the classifier and template embeddings, then run a warm-up encode
+
+        Safe to call more than once; only the first call does any work.
+        """
+        with self._lock:
+            if self._ready:
+                return
+
+            self.load_error = None
+            try:
+                self._load()
+            except Exception as e:
+                self.load_error = str(e)
+                raise
+
+        logger.info(
+            f"Model registry ready: {self.model_name} ({self.backend}) "
+            f"(load {self.load_seconds:.2f}s, warm-up {self.warmup_seconds:.2f}s)"
+        )
+
+    def _load(self) -> None:
+        """Body of load(), run with the lock held"""
+        if self.embedding_cache_dir:
+            self._embedding_cache = EmbeddingCache(
+                cache_dir=self.embedding_cache_dir,
+                model_name=model_key(self.model_name, self.backend),
+                memory_entries=int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "20000")),
+                max_disk_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+            )
+
+        if self.llm_cache_dir:
+            self.llm_cache = LLMResponseCache(
+                cache_dir=self.llm_cache_dir,
+                ttl_seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+            )
+
+        started = time.perf_counter()
+        classifier = AccountClassifier(
+            model_name=self.model_name,
+            batch_size=self.batch_size,
+            embedding_cache=self._embedding_cache,
+            model=self.model,
+            backend=self.backend
+        )
+        self.load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        classifier.warm_up()
+        self.warmup_seconds = time.perf_counter() - started
+
+        self._classifier = classifier
+        self._inference_executor = ThreadPoolExecutor(
+            max_workers=self.inference_workers,
+            thread_name_prefix="inference"
+        )
+        self._ready = True
+
+    def batch_pool(self) -> ProcessPoolExecutor:
+        """Shared batch process pool (see services.batch_runner), created on first use"""
+        with self._batch_lock:
+            if self._batch_pool is None:
+                # Imported here: batch_runner imports the module-level registry
+                from services.batch_runner import create_pool
+
+                self._batch_pool = create_pool(self.batch_workers)
+            return self._batch_pool
+
+    def discard_batch_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Drop a pool broken by a crashed worker; the next batch_pool() call starts a new one"""
+        with self._batch_lock:
+            if self._batch_pool is pool:
+                self._batch_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        """Release loaded models"""
+        with self._batch_lock:
+            if self._batch_pool is not None:
+                self._batch_pool.shutdown(wait=True, cancel_futures=True)
+                self._batch_pool = None
+
+        with self._lock:
+            if self._inference_executor is not None:
+                self._inference_executor.shutdown(wait=True)
+                self._inference_executor = None
+            if self.llm_cache is not None:
+                self.llm_cache.close()
+                self.llm_cache = None
+            if self._embedding_cache is not None:
+                self._embedding_cache.close()
+                self._embedding_cache = None
+            self._classifier = None
+            self.classification_cache.clear()
+            self.cashflow_state.clear()
+            self.tb_cubes.clear()
+            self._ready = False
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @property
+    def classifier(self) -> AccountClassifier:
+        """Shared classifier; raises if the registry has not finished loading"""
+        if not self._ready or self._classifier is None:
+            raise RuntimeError("Model registry is not ready")
+        return self._classifier
+
+    @property
+    def inference_executor(self) -> ThreadPoolExecutor:
+        """
+        Bounded executor for model inference, so concurrent requests cannot
+        oversubscribe the CPU or block the event loop
+        """
+        if not self._ready or self._inference_executor is None:
+            raise RuntimeError("Model registry is not ready")
+        return self._inference_executor
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness details for the health endpoint"""
+        return {
+            "ready": self._ready,
+            "error": self.load_error,
+            "model": self.model_name,
+            "backend": self.backend,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "inference_workers": self.inference_workers,
+            "embedding_cache": self._embedding_cache.stats() if self._embedding_cache else None,
+            "classification_cache": self.classification_cache.stats(),
+            "cashflow_state": self.cashflow_state.stats(),
+            "tb_cubes": self.tb_cubes.stats(),
+            "llm_cache": self.llm_cache.stats() if self.llm_cache else None
+        }
+
+# Process-wide registry, loaded by the FastAPI lifespan hook
+model_registry = ModelRegistry(
+    model_name=os.getenv("CLASSIFIER_MODEL", "all-MiniLM-L6-v2"),
+    batch_size=int(os.getenv("CLASSIFIER_BATCH_SIZE", "64")),
+    backend=os.getenv("CLASSIFIER_BACKEND", "torch"),
+    batch_workers=int(os.getenv("BATCH_WORKERS", "0")) or None,
+    embedding_cache_dir=(
+        os.getenv("EMBEDDING_CACHE_DIR", "./cache/embeddings")
+        if os.getenv("CACHE_EMBEDDINGS", "true").lower() == "true" else None
+    ),
+    classification_cache_size=int(os.getenv("CLASSIFICATION_CACHE_COMPANIES", "256")),
+    inference_workers=int(os.getenv("INFERENCE_WORKERS", "2")),
+    llm_cache_dir=(
+        os.getenv("LLM_CACHE_DIR", "./cache/llm")
+        if os.getenv("CACHE_LLM_RESPONSES", "true").lower() == "true" else None
+    ),
+    cashflow_state_size=int(os.getenv("CASHFLOW_STATE_ENTRIES", "256")),
+    tb_cube_size=int(os.getenv("TB_CUBE_ENTRIES", "32")),
+    tb_cube_ttl_seconds=float(os.getenv("TB_CUBE_TTL_SECONDS", "900"))
+)
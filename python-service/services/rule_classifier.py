@@ -0,0 +1,164 @@
+"""
+Rule Classifier Service
+Phrase index over the classification templates that resolves unambiguous account names without the embedding model
+"""
+
+from typing import Dict, List, Optional, Tuple, Sequence, Any
+import pandas as pd
+import numpy as np
+import logging
+import json
+import re
+
+logger = logging.getLogger(__name__)
+
+# Dropped from phrases and account texts alike, so "Property, plant and
+# equipment" matches the "property plant equipment" template keyword
+STOPWORDS = frozenset({"and", "of", "the", "for", "in", "on", "to"})
+
+# COA fields searched for phrases. Only the account's own name: notes group
+# accounts of several categories ("Trade and other receivables" holds amounts
+# due from customers as well as other receivables), and class_name is too
+# broad ("Equity", "Revenue") to decide a category on its own
+RULE_FIELDS = ("account_name",)
+
+# Template keywords shorter than this many tokens are left to the model;
+# single words ("stock", "software", "capital") also occur in accounts of
+# other categories ("Treasury stock", "Amortisation of software")
+MIN_TEMPLATE_PHRASE_TOKENS = 2
+
+def phrase_tokens(text: str) -> Tuple[str, ...]:
+    """
+    Lowercased word tokens without stopwords, each with one plural "s" removed
+
+    Applied to both rule phrases and account texts, so "Bank loans" matches
+    a "bank loan" mapping.
+    """
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", str(text).lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tuple(tokens)
+
+def load_rule_mappings(path: Optional[str]) -> Dict[str, str]:
+    """User-defined {phrase: category} mappings from a JSON file; empty without a path"""
+    if not path:
+        return {}
+
+    with open(path) as handle:
+        mappings = json.load(handle)
+
+    if not isinstance(mappings, dict):
+        raise ValueError(f"{path} must contain a JSON object of phrase -> category")
+
+    logger.info(f"Loaded {len(mappings)} classification rules from {path}")
+    return {str(phrase): str(category) for phrase, category in mappings.items()}
+
+class RuleClassifier:
+    """
+    Compiled phrase index that classifies accounts by keyword
+
+    Every multi-word template keyword and every user-defined phrase is
+    tokenized and indexed by its first token. An account name is scanned
+    once, left to right, taking the longest phrase that starts at each
+    token. The account is resolved only when every phrase found in its name
+    points to the same category. Names with no match, or with matches for
+    different categories, are left to the embedding model. A user phrase
+    found in a name overrides the template keywords found in it; user
+    phrases may be single words, since someone chose them for their chart.
+    """
+
+    def __init__(self, templates: Dict[str, List[str]], mappings: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            templates: AccountClassifier.cf_templates (category -> keywords)
+            mappings: Optional user-defined phrase -> category rules
+        """
+        self.categories: List[str] = list(templates)
+        category_index = {category: index for index, category in enumerate(self.categories)}
+        mappings = mappings or {}
+
+        unknown = sorted(set(mappings.values()) - set(category_index))
+        if unknown:
+            raise ValueError(f"Unknown categories in rule mappings: {', '.join(unknown)}")
+
+        # phrase tokens -> (category index, user-defined); a keyword listed
+        # under two categories is ambiguous and not indexed, and single-word
+        # keywords are too broad to decide a category
+        phrases: Dict[Tuple[str, ...], Tuple[int, bool]] = {}
+        ambiguous = set()
+        for category, keywords in templates.items():
+            for keyword in keywords:
+                tokens = phrase_tokens(keyword)
+                if len(tokens) < MIN_TEMPLATE_PHRASE_TOKENS:
+                    continue
+                if tokens in phrases and phrases[tokens][0] != category_index[category]:
+                    ambiguous.add(tokens)
+                phrases[tokens] = (category_index[category], False)
+        for tokens in ambiguous:
+            del phrases[tokens]
+
+        for phrase, category in mappings.items():
+            tokens = phrase_tokens(phrase)
+            if tokens:
+                phrases[tokens] = (category_index[category], True)
+
+        self._index: Dict[str, List[Tuple[Tuple[str, ...], int, bool]]] = {}
+        for tokens, (category, user_defined) in phrases.items():
+            self._index.setdefault(tokens[0], []).append((tokens, category, user_defined))
+        for candidates in self._index.values():
+            candidates.sort(key=lambda candidate: -len(candidate[0]))
+
+        self.phrase_count = len(phrases)
+        self.mappings = dict(sorted(mappings.items()))
+
+    def match(self, *texts: str) -> int:
+        """
+        Category index when the phrases found in the texts agree on one category, else -1
+
+        Each text is scanned on its own, so no phrase spans two fields.
+        """
+        template_hits, user_hits = set(), set()
+
+        for text in texts:
+            tokens = phrase_tokens(text)
+            position = 0
+            while position < len(tokens):
+                for phrase, category, user_defined in self._index.get(tokens[position], ()):
+                    if tokens[position:position + len(phrase)] == phrase:
+                        (user_hits if user_defined else template_hits).add(category)
+                        position += len(phrase)
+                        break
+                else:
+                    position += 1
+
+        hits = user_hits or template_hits
+        return hits.pop() if len(hits) == 1 else -1
+
+    def match_rows(self, coa_data: pd.DataFrame, rows: Sequence[int]) -> np.ndarray:
+        """
+        Rule category per COA row (positions into coa_data), -1 where unresolved
+
+        Identical RULE_FIELDS values are matched once.
+        """
+        fields = [
+            coa_data[field].to_numpy(dtype=object)[rows] if field in coa_data.columns
+            else np.full(len(rows), None, dtype=object)
+            for field in RULE_FIELDS
+        ]
+
+        matched: Dict[Tuple[str, ...], int] = {}
+        result = np.empty(len(rows), dtype=np.int16)
+        for position, parts in enumerate(zip(*fields)):
+            key = tuple("" if part is None or pd.isna(part) else str(part) for part in parts)
+            if key not in matched:
+                matched[key] = self.match(*key)
+            result[position] = matched[key]
+        return result
+
+    def fingerprint_data(self) -> Dict[str, Any]:
+        """What the classification cache fingerprint must cover"""
+        return {"mappings": self.mappings}
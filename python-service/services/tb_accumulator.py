@@ -0,0 +1,171 @@
+"""
+Trial Balance Accumulator
+Folds trial balance query results chunk by chunk into running per-key totals
+"""
+
+from typing import Dict, List, Optional, Iterable, Set, Any
+import pandas as pd
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BalanceAccumulator:
+    """
+    Running per-key totals over a stream of DataFrame chunks
+
+    Numeric columns outside the key are summed per key with np.add.at, and
+    other columns keep the first value seen for each key. Only the totals
+    and the current chunk are held, so memory grows with the number of
+    distinct keys, not with the number of rows streamed. Keys are ordered
+    by first appearance, so an ORDER BY query gives the same rows in the
+    same order as reading it whole.
+
+    The trial balance queries already group by account (and period), so
+    there is roughly one streamed row per key and the totals end up about
+    as large as a whole read. What chunking bounds is the raw result: the
+    driver's buffer and the intermediate frames are one chunk at a time.
+    Totals stay per account, not per cash flow component, because the
+    movements are needed at account level after the load (classification,
+    incremental recalculation, exports).
+
+    Column types are settled over the whole stream, not the first chunk,
+    because read_sql infers them per chunk: a column summing integers in one
+    chunk can hold fractions in the next (SQLite SUM over NUMERIC), and a
+    column that is NULL throughout one chunk arrives as object. Sums are
+    therefore kept in float64. A column is returned as int64 only if every
+    chunk held it as a null-free integer column, and is switched to
+    first-value only when a non-numeric value shows up.
+    """
+
+    def __init__(self, keys: List[str]):
+        """
+        Args:
+            keys: Columns identifying a row of the result (e.g. account_code, period)
+        """
+        self.keys = list(keys)
+        self.rows = 0
+        self.chunks = 0
+
+        self._columns: Optional[List[str]] = None
+        self._arrow_dtypes: Dict[str, pd.ArrowDtype] = {}
+        self._index: Optional[pd.Index] = None
+        self._sums: Dict[str, np.ndarray] = {}
+        self._integer: Dict[str, bool] = {}
+        self._firsts: Dict[str, List[np.ndarray]] = {}
+        # Columns with at least one non-null value so far
+        self._valued: Set[str] = set()
+
+    def _key_index(self, chunk: pd.DataFrame) -> pd.Index:
+        if len(self.keys) == 1:
+            return pd.Index(chunk[self.keys[0]].to_numpy(dtype=object), dtype=object)
+        return pd.MultiIndex.from_arrays([chunk[key].to_numpy(dtype=object) for key in self.keys])
+
+    @staticmethod
+    def _summable(dtype: Any) -> bool:
+        return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+    def _settle_types(self, chunk: pd.DataFrame, nulls: Dict[str, bool]) -> None:
+        """Update each column's type from a chunk where it has values"""
+        for column in list(self._sums) + list(self._firsts):
+            if nulls[column]:
+                continue
+
+            dtype = chunk[column].dtype
+            if column not in self._valued:
+                self._valued.add(column)
+                # Arrow-backed columns keep their (schema-derived) type
+                if isinstance(dtype, pd.ArrowDtype):
+                    self._arrow_dtypes[column] = dtype
+
+            if column in self._sums and not self._summable(dtype):
+                # Only NULLs so far, so no key has a first value yet
+                known = 0 if self._index is None else len(self._index)
+                del self._sums[column], self._integer[column]
+                self._firsts[column] = [np.full(known, None, dtype=object)]
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        """Fold one chunk into the totals"""
+        if self._columns is None:
+            self._columns = list(chunk.columns)
+            self._arrow_dtypes = {
+                key: chunk[key].dtype for key in self.keys if isinstance(chunk[key].dtype, pd.ArrowDtype)
+            }
+            # Every column is summed until a non-numeric value shows up
+            for column in self._columns:
+                if column not in self.keys:
+                    self._sums[column] = np.zeros(0, dtype=np.float64)
+                    self._integer[column] = True
+
+        self.chunks += 1
+        if chunk.empty:
+            return
+        self.rows += len(chunk)
+
+        nulls = {column: bool(chunk[column].isna().all()) for column in [*self._sums, *self._firsts]}
+        self._settle_types(chunk, nulls)
+
+        key_index = self._key_index(chunk)
+        positions = (
+            self._index.get_indexer(key_index) if self._index is not None
+            else np.full(len(chunk), -1, dtype=np.intp)
+        )
+
+        new = positions < 0
+        if new.any():
+            # Keys seen for the first time, numbered after the known ones
+            new_codes, new_keys = pd.factorize(key_index[new])
+            start = 0 if self._index is None else len(self._index)
+            positions[new] = start + new_codes
+            self._index = new_keys if self._index is None else self._index.append(new_keys)
+
+            first_rows = np.flatnonzero(new)[np.unique(new_codes, return_index=True)[1]]
+            for column, values in self._firsts.items():
+                values.append(chunk[column].to_numpy(dtype=object)[first_rows])
+            for column, sums in self._sums.items():
+                self._sums[column] = np.concatenate([sums, np.zeros(len(new_keys), dtype=np.float64)])
+
+        for column, sums in self._sums.items():
+            values = chunk[column]
+            if nulls[column] or values.hasnans or not pd.api.types.is_integer_dtype(values.dtype):
+                self._integer[column] = False
+            np.add.at(sums, positions, values.to_numpy(dtype=np.float64, na_value=np.nan))
+
+    def frame(self) -> pd.DataFrame:
+        """Totals as a DataFrame with the streamed columns and dtypes"""
+        if self._columns is None:
+            return pd.DataFrame()
+
+        if self._index is None:
+            return pd.DataFrame({
+                column: pd.Series(dtype=self._arrow_dtypes.get(column, object)) for column in self._columns
+            })
+
+        data = {}
+        for position, key in enumerate(self.keys):
+            data[key] = (
+                self._index.get_level_values(position) if len(self.keys) > 1 else self._index
+            ).to_numpy(dtype=object)
+        for column, values in self._firsts.items():
+            data[column] = np.concatenate(values)
+        for column, sums in self._sums.items():
+            if column not in self._valued:
+                # NULL in every row, as read_sql returns it
+                data[column] = np.full(len(sums), None, dtype=object)
+            elif self._integer[column]:
+                data[column] = sums.astype(np.int64)
+            else:
+                data[column] = sums
+
+        frame = pd.DataFrame(data)[self._columns]
+        return frame.astype(self._arrow_dtypes) if self._arrow_dtypes else frame
+
+    @classmethod
+    def accumulate(cls, chunks: Iterable[pd.DataFrame], keys: List[str]) -> pd.DataFrame:
+        """Fold a stream of chunks and return the totals"""
+        accumulator = cls(keys)
+        for chunk in chunks:
+            accumulator.add(chunk)
+
+        logger.info(f"Streamed {accumulator.rows} rows in {accumulator.chunks} chunks")
+        return accumulator.frame()
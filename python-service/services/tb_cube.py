@@ -0,0 +1,343 @@
+"""
+Trial Balance Cube
+Entity x account x period balances held in memory, so entity and segment drill-downs never re-query the database
+"""
+
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+import pandas as pd
+import numpy as np
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_DIMENSIONS = ("entity", "region")
+
+class TrialBalanceCube:
+    """
+    Entity-grain trial balances for one company
+
+    Only non-empty cells are stored, as parallel coordinate arrays (entity,
+    account and period indexes plus balance and TB row count), with the
+    entity and account attributes kept once in small lookup frames. Every
+    aggregation is an np.bincount over a flattened index, so consolidated
+    movements and per-entity or per-region balances are computed without
+    pandas group-bys on the cell level.
+    """
+
+    def __init__(
+        self,
+        entities: pd.DataFrame,
+        accounts: pd.DataFrame,
+        periods: List[str],
+        entity_index: np.ndarray,
+        account_index: np.ndarray,
+        period_index: np.ndarray,
+        balance: np.ndarray,
+        row_count: np.ndarray
+    ):
+        """
+        Args:
+            entities: One row per entity (entity_id, entity_code, entity_name,
+                region_code, region_name), positionally indexed
+            accounts: One row per account (account_code, account_name), sorted by code
+            periods: Periods the cube was loaded for
+            entity_index, account_index, period_index: Cell coordinates
+            balance: Debit - credit per cell
+            row_count: TB rows aggregated per cell
+        """
+        self.entities = entities.reset_index(drop=True)
+        self.accounts = accounts.reset_index(drop=True)
+        self.periods: List[str] = list(periods)
+        self.entity_index = np.asarray(entity_index, dtype=np.int32)
+        self.account_index = np.asarray(account_index, dtype=np.int32)
+        self.period_index = np.asarray(period_index, dtype=np.int16)
+        self.balance = np.asarray(balance, dtype=np.float64)
+        self.row_count = np.asarray(row_count, dtype=np.int32)
+
+    @classmethod
+    def from_frame(cls, balances: pd.DataFrame, periods: List[str]) -> "TrialBalanceCube":
+        """Build a cube from ConsolidationDataLoader.load_entity_tb_balances output"""
+        return cls.from_chunks([balances], periods)
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[pd.DataFrame], periods: List[str]) -> "TrialBalanceCube":
+        """
+        Build a cube from a stream of entity-grain balance frames
+
+        Each chunk is reduced to compact coordinate arrays as it arrives, so
+        only the cube and the current chunk are ever in memory (see
+        ConsolidationDataLoader.iter_entity_tb_balances). Account names come
+        from the latest period an account appears in.
+        """
+        periods = list(periods)
+        period_positions = pd.Index(periods)
+
+        entity_ids = pd.Index([], dtype=object)
+        entity_rows: List[pd.DataFrame] = []
+        account_codes = pd.Index([], dtype=object)
+        account_names = np.empty(0, dtype=object)
+        account_latest = np.empty(0, dtype=np.int16)
+        parts: List[Tuple[np.ndarray, ...]] = []
+
+        def positions(index: pd.Index, values: np.ndarray) -> Tuple[np.ndarray, pd.Index, np.ndarray, np.ndarray]:
+            """Positions of values in index, appending unseen values in order of first appearance"""
+            found = index.get_indexer(values)
+            new = found < 0
+            if not new.any():
+                return found, index, np.empty(0, dtype=np.intp), np.empty(0, dtype=object)
+            new_codes, new_values = pd.factorize(values[new])
+            found[new] = len(index) + new_codes
+            first_rows = np.flatnonzero(new)[np.unique(new_codes, return_index=True)[1]]
+            return found, index.append(pd.Index(new_values, dtype=object)), first_rows, new_values
+
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+
+            period_index = period_positions.get_indexer(chunk['period'].astype(str))
+            if (period_index < 0).any():
+                raise ValueError("Balances contain periods the cube was not built for")
+
+            entity_index, entity_ids, first_rows, new_ids = positions(
+                entity_ids, chunk['entity_id'].astype(str).to_numpy(dtype=object)
+            )
+            if len(first_rows):
+                entity_rows.append(
+                    chunk.iloc[first_rows][['entity_code', 'entity_name', 'region_code', 'region_name']]
+                    .astype(object)
+                    .assign(entity_id=new_ids)
+                )
+
+            account_index, account_codes, first_rows, _ = positions(
+                account_codes, chunk['account_code'].astype(str).to_numpy(dtype=object)
+            )
+            if len(first_rows):
+                account_names = np.concatenate([account_names, np.full(len(first_rows), None, dtype=object)])
+                account_latest = np.concatenate([account_latest, np.full(len(first_rows), -1, dtype=np.int16)])
+
+            # Latest period per account in this chunk (first row on ties), kept
+            # only where it is later than any earlier chunk's
+            latest_first = np.lexsort((-period_index, account_index))
+            best_rows = latest_first[np.unique(account_index[latest_first], return_index=True)[1]]
+            best_accounts = account_index[best_rows]
+            later = period_index[best_rows] > account_latest[best_accounts]
+            account_names[best_accounts[later]] = chunk['account_name'].to_numpy(dtype=object)[best_rows[later]]
+            account_latest[best_accounts[later]] = period_index[best_rows[later]]
+
+            parts.append((
+                entity_index.astype(np.int32),
+                account_index.astype(np.int32),
+                period_index.astype(np.int16),
+                chunk['balance'].to_numpy(dtype=float),
+                chunk['row_count'].to_numpy(dtype=np.int32)
+            ))
+
+        columns = ['entity_id', 'entity_code', 'entity_name', 'region_code', 'region_name']
+        entities = pd.concat(entity_rows, ignore_index=True)[columns] if entity_rows else pd.DataFrame(columns=columns)
+        accounts = pd.DataFrame({'account_code': account_codes.to_numpy(dtype=object), 'account_name': account_names})
+
+        # Entities by id and accounts by code, whatever order the chunks came in
+        entity_order = np.argsort(entities['entity_id'].to_numpy(dtype=str), kind='stable')
+        account_order = np.argsort(accounts['account_code'].to_numpy(dtype=str), kind='stable')
+        entity_rank = np.empty(len(entity_order), dtype=np.int32)
+        entity_rank[entity_order] = np.arange(len(entity_order))
+        account_rank = np.empty(len(account_order), dtype=np.int32)
+        account_rank[account_order] = np.arange(len(account_order))
+
+        def column(field: int, dtype) -> np.ndarray:
+            return np.concatenate([part[field] for part in parts]) if parts else np.empty(0, dtype=dtype)
+
+        cube = cls(
+            entities=entities.iloc[entity_order],
+            accounts=accounts.iloc[account_order],
+            periods=periods,
+            entity_index=entity_rank[column(0, np.int32)],
+            account_index=account_rank[column(1, np.int32)],
+            period_index=column(2, np.int16),
+            balance=column(3, np.float64),
+            row_count=column(4, np.int32)
+        )
+        logger.info(
+            f"Built TB cube: {len(cube.entities)} entities x {len(cube.accounts)} accounts x "
+            f"{len(periods)} periods, {len(cube)} cells in {len(parts)} chunks ({cube.nbytes / 1024:.0f} KiB)"
+        )
+        return cube
+
+    def __len__(self) -> int:
+        return len(self.balance)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the cell arrays"""
+        return sum(array.nbytes for array in (
+            self.entity_index, self.account_index, self.period_index, self.balance, self.row_count
+        ))
+
+    def segments(self, by: str) -> pd.DataFrame:
+        """
+        Segment labels for a dimension, one row per segment (segment, segment_name)
+
+        Entities without a region fall into an "Unassigned" region.
+        """
+        if by == "entity":
+            return pd.DataFrame({
+                'segment': self.entities['entity_code'].fillna(self.entities['entity_id']),
+                'segment_name': self.entities['entity_name']
+            })
+
+        if by == "region":
+            regions = self.entities[['region_code', 'region_name']].fillna("Unassigned").drop_duplicates('region_code')
+            return pd.DataFrame({
+                'segment': regions['region_code'].to_numpy(dtype=object),
+                'segment_name': regions['region_name'].to_numpy(dtype=object)
+            }).sort_values('segment', ignore_index=True)
+
+        raise ValueError(f"by must be one of {', '.join(SEGMENT_DIMENSIONS)}")
+
+    def _entity_segments(self, by: str, segments: pd.DataFrame) -> np.ndarray:
+        """Segment position of every entity"""
+        if by == "entity":
+            return np.arange(len(self.entities))
+        return pd.Index(segments['segment']).get_indexer(self.entities['region_code'].fillna("Unassigned"))
+
+    def _cells(self, entities: Optional[List[str]], periods: List[str]) -> np.ndarray:
+        """Boolean mask of the cells in the given periods, optionally for some entity codes or ids"""
+        positions = [self.periods.index(period) for period in periods]
+        mask = np.isin(self.period_index, positions)
+
+        if entities is not None:
+            wanted = self.entities['entity_code'].isin(entities) | self.entities['entity_id'].isin(entities)
+            mask &= wanted.to_numpy()[self.entity_index]
+
+        return mask
+
+    def movements(
+        self,
+        current_period: str,
+        previous_period: str,
+        entities: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Consolidated account movements, in the shape of ConsolidationDataLoader.load_tb_movements
+
+        Args:
+            entities: Entity codes (or ids) to consolidate; all entities when None
+        """
+        mask = self._cells(entities, [current_period, previous_period])
+        accounts = self.account_index[mask]
+        balance = self.balance[mask]
+        rows = self.row_count[mask]
+        is_current = self.period_index[mask] == self.periods.index(current_period)
+
+        count = len(self.accounts)
+        current_balance = np.bincount(accounts, weights=np.where(is_current, balance, 0.0), minlength=count)
+        previous_balance = np.bincount(accounts, weights=np.where(is_current, 0.0, balance), minlength=count)
+        current_rows = np.bincount(accounts, weights=np.where(is_current, rows, 0), minlength=count).astype(np.int64)
+        previous_rows = np.bincount(accounts, weights=np.where(is_current, 0, rows), minlength=count).astype(np.int64)
+
+        present = np.bincount(accounts, minlength=count) > 0
+
+        return pd.DataFrame({
+            'account_code': self.accounts['account_code'].to_numpy()[present],
+            'account_name': self.accounts['account_name'].to_numpy()[present],
+            'current_balance': current_balance[present],
+            'previous_balance': previous_balance[present],
+            'movement': (current_balance - previous_balance)[present],
+            'current_rows': current_rows[present],
+            'previous_rows': previous_rows[present]
+        })
+
+    def segment_balances(
+        self,
+        current_period: str,
+        previous_period: str,
+        by: str = "entity",
+        entities: Optional[List[str]] = None
+    ) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        Balances per account and segment for both periods
+
+        Returns:
+            (segments, balances) - segments as returned by segments(), limited
+            to those with cells in the selection; balances has shape
+            (accounts, segments, 2) with the previous period at [..., 0] and
+            the current period at [..., 1], accounts in self.accounts order
+        """
+        segments = self.segments(by)
+        entity_segments = self._entity_segments(by, segments)
+
+        mask = self._cells(entities, [current_period, previous_period])
+        cell_segments = entity_segments[self.entity_index[mask]]
+        is_current = (self.period_index[mask] == self.periods.index(current_period)).astype(np.intp)
+
+        segment_count = len(segments)
+        flat = (self.account_index[mask].astype(np.intp) * segment_count + cell_segments) * 2 + is_current
+        balances = np.bincount(
+            flat, weights=self.balance[mask], minlength=len(self.accounts) * segment_count * 2
+        ).reshape(len(self.accounts), segment_count, 2)
+
+        present = np.bincount(cell_segments, minlength=segment_count) > 0
+        return segments[present].reset_index(drop=True), balances[:, present, :]
+
+class TrialBalanceCubeCache:
+    """
+    In-memory LRU of trial balance cubes per (company, periods), with a TTL
+
+    A cube is dropped when its TTL runs out or when invalidate() is called
+    for its company (e.g. after TB rows are posted), so drill-downs never
+    serve balances older than the TTL.
+    """
+
+    def __init__(self, max_entries: int = 32, ttl_seconds: float = 900.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, Tuple[str, ...]], Tuple[float, TrialBalanceCube]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(company_id: str, periods: List[str]) -> Tuple[str, Tuple[str, ...]]:
+        return (company_id, tuple(sorted(periods)))
+
+    def get(self, key: Tuple[str, Tuple[str, ...]]) -> Optional[TrialBalanceCube]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[str, Tuple[str, ...]], cube: TrialBalanceCube) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), cube)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, company_id: str) -> None:
+        """Drop every cube for a company"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == company_id]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(cube.nbytes for _, cube in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
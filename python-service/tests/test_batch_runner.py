@@ -0,0 +1,133 @@
+"""
+Batch Runner Tests
+Fail-soft job handling on an in-process pool with the worker tasks replaced
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+
+from services import batch_runner
+from services.batch_runner import BatchRunner
+
+PERIODS = {"current_period": "2024-12-31", "previous_period": "2024-11-30"}
+
+def _coa(*names):
+    return pd.DataFrame({
+        "account_code": [f"{index + 1:04d}" for index in range(len(names))],
+        "account_name": list(names)
+    })
+
+# company -> chart of accounts, or the exception its load raises
+CHARTS = {
+    "alpha": _coa("Trade receivables", "Bank loan"),
+    "beta": _coa("Trade receivables", "Bank loan"),
+    "gamma": _coa("Inventories"),
+    "empty": _coa(),
+    "broken-db": ConnectionError("database unavailable")
+}
+
+class FakeLoader:
+    def __init__(self, engine):
+        pass
+
+    def load_chart_of_accounts(self, company_id):
+        chart = CHARTS[company_id]
+        if isinstance(chart, Exception):
+            raise chart
+        return chart
+
+def fake_classify(coa_data):
+    if "Inventories" in set(coa_data["account_name"]):
+        raise ValueError("model exploded")
+    return {code: {"cf_category": "Operating"} for code in coa_data["account_code"]}
+
+def fake_generate(job, coa_data, classifications, use_ai, api_key):
+    return {"status": "succeeded", "run_seconds": 0.0, "result": {"accounts": len(classifications)}}
+
+class BreakingPool(ThreadPoolExecutor):
+    """Thread pool that starts refusing work, like a broken process pool, after `accepted` submissions"""
+
+    def __init__(self, accepted):
+        super().__init__(max_workers=2)
+        self.accepted = accepted
+
+    def submit(self, fn, *args, **kwargs):
+        if self.accepted == 0:
+            raise BrokenProcessPool("A child process terminated abruptly")
+        self.accepted -= 1
+        return super().submit(fn, *args, **kwargs)
+
+@pytest.fixture(autouse=True)
+def fake_workers(monkeypatch):
+    monkeypatch.setattr(batch_runner, "ConsolidationDataLoader", FakeLoader)
+    monkeypatch.setattr(batch_runner, "_classify_coa", fake_classify)
+    monkeypatch.setattr(batch_runner, "_generate", fake_generate)
+
+@pytest.fixture
+def pool():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+def _job(company_id, **overrides):
+    return {"company_id": company_id, **PERIODS, **overrides}
+
+def _errors(report):
+    return {failure["index"]: failure["error"] for failure in report["failures"]}
+
+def test_failures_are_recorded_per_job(pool):
+    runner = BatchRunner(engine=object(), pool=pool)
+
+    report = runner.run([
+        _job("alpha"),
+        _job("beta"),
+        _job("alpha", previous_period=""),
+        _job("broken-db"),
+        _job("gamma"),
+        _job("empty")
+    ])
+
+    assert (report["jobs"], report["succeeded"], report["failed"]) == (6, 2, 4)
+    errors = _errors(report)
+    assert errors[2] == "Missing field(s): previous_period"
+    assert errors[3] == "Loading chart of accounts failed: database unavailable"
+    assert errors[4] == "Classification failed: model exploded"
+    assert errors[5] == "No chart of accounts found"
+    assert [r["result"] for r in report["results"][:2]] == [{"accounts": 2}, {"accounts": 2}]
+    # alpha and beta share a chart; gamma's is the other one classified
+    assert report["distinct_charts_of_accounts"] == 2
+    assert not runner.pool_broken
+
+def test_include_results_false_drops_results(pool):
+    report = BatchRunner(engine=object(), pool=pool).run([_job("alpha")], include_results=False)
+
+    assert report["succeeded"] == 1
+    assert "result" not in report["results"][0]
+
+def test_broken_pool_fails_the_remaining_jobs():
+    # Both distinct charts and the first job are accepted, then the pool breaks
+    with BreakingPool(accepted=3) as pool:
+        runner = BatchRunner(engine=object(), pool=pool)
+        report = runner.run([_job("alpha"), _job("beta"), _job("alpha"), _job("gamma")])
+
+    assert runner.pool_broken
+    assert report["results"][0]["status"] == "succeeded"
+    errors = _errors(report)
+    assert set(errors) == {1, 2, 3}
+    assert errors[1].startswith("BrokenProcessPool")
+    assert errors[2].startswith("BrokenProcessPool")
+    assert errors[3] == "Classification failed: model exploded"
+
+def test_worker_crash_marks_the_pool_broken(pool, monkeypatch):
+    def crash(*args):
+        raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+    monkeypatch.setattr(batch_runner, "_generate", crash)
+
+    runner = BatchRunner(engine=object(), pool=pool)
+    report = runner.run([_job("alpha"), _job("beta")])
+
+    assert runner.pool_broken
+    assert report["failed"] == 2
+    assert all(error.startswith("BrokenProcessPool") for error in _errors(report).values())
@@ -0,0 +1,210 @@
+"""
+Cash Flow Calculator Tests
+Vectorized component aggregation against a row-by-row reference, and per-period and per-segment splits
+"""
+
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.cashflow_calculator import CashFlowCalculator
+
+COMPONENTS = [
+    ("Operating", "Depreciation and amortization", "Expenses"),
+    ("Operating", "Change in trade receivables", "Assets"),
+    ("Operating", "Change in trade payables", "Liabilities"),
+    ("Operating", "Change in inventory", "Assets"),
+    ("Investing", "Purchase of property, plant and equipment", "Assets"),
+    ("Investing", "Proceeds from disposal of assets", "Assets"),
+    ("Financing", "Proceeds from borrowings", "Liabilities"),
+    ("Financing", "Repayment of borrowings", "Liabilities"),
+    ("Financing", "Dividends paid", "Equity")
+]
+
+def _reference_components(calculator, movements, classifications, coa_data):
+    """Row-by-row running sums, as calculate_components worked before it was vectorized"""
+    groups = defaultdict(lambda: {
+        "accounts": [], "current_total": 0, "previous_total": 0, "movement": 0, "sign": 1
+    })
+
+    for _, row in movements.iterrows():
+        classification = classifications.get(row["account_code"])
+        if classification is None:
+            continue
+
+        key = f"{classification['cf_category']}::{classification['cf_component']}"
+        group = groups[key]
+        group["category"] = classification["cf_category"]
+        group["component_name"] = classification["cf_component"]
+        group["accounts"].append(row["account_code"])
+        group["current_total"] += row["current_balance"]
+        group["previous_total"] += row["previous_balance"]
+        group["movement"] += row["movement"]
+        group["sign"] = calculator._get_sign_multiplier(
+            classification["cf_category"], classification["cf_component"], classification.get("class_name", "")
+        )
+
+    account_map = dict(zip(coa_data["account_code"], coa_data["account_name"]))
+    components = []
+    for key, group in groups.items():
+        cash_impact = group["movement"] * group["sign"]
+        if abs(cash_impact) < 1000:
+            continue
+        components.append({
+            "id": key.replace("::", "_"),
+            "name": group["component_name"],
+            "category": group["category"],
+            "current_value": float(group["current_total"]),
+            "previous_value": float(group["previous_total"]),
+            "movement": float(group["movement"]),
+            "cash_impact": float(cash_impact),
+            "accounts": group["accounts"],
+            "formula": calculator._generate_formula(group["accounts"], account_map),
+            "confidence_score": None
+        })
+
+    components.sort(key=lambda x: (calculator._category_order(x["category"]), -abs(x["cash_impact"])))
+    return components
+
+@pytest.fixture
+def balances():
+    rng = np.random.default_rng(7)
+    count = 3000
+    codes = [f"{code:05d}" for code in range(count)]
+    # Magnitudes from cents to billions, so summation order shows in the last digits
+    scale = 10.0 ** rng.integers(-2, 10, size=(2, count))
+    current = np.round(rng.normal(size=count) * scale[0], 2)
+    previous = np.round(rng.normal(size=count) * scale[1], 2)
+
+    movements = pd.DataFrame({
+        "account_code": codes,
+        "account_name": [f"Account {code}" for code in codes],
+        "current_balance": current,
+        "previous_balance": previous,
+        "movement": current - previous
+    }).sample(frac=1.0, random_state=3).reset_index(drop=True)
+
+    picks = rng.integers(0, len(COMPONENTS), size=count)
+    classifications = {
+        code: {"cf_category": category, "cf_component": component, "class_name": class_name}
+        for code, (category, component, class_name) in zip(codes, (COMPONENTS[pick] for pick in picks))
+        # Some accounts stay unclassified
+        if int(code) % 11
+    }
+    coa_data = movements[["account_code", "account_name"]]
+    return movements, classifications, coa_data
+
+def test_components_match_row_by_row_sums_exactly(balances):
+    movements, classifications, coa_data = balances
+    calculator = CashFlowCalculator()
+
+    result = calculator.calculate_components(None, None, classifications, coa_data, movements=movements)
+    expected = _reference_components(calculator, movements, classifications, coa_data)
+
+    assert len(result) == len(COMPONENTS)
+    # Plain equality: the float totals must agree to the last bit
+    assert result == expected
+
+def test_components_from_trial_balances_match_precomputed_movements(balances):
+    movements, classifications, coa_data = balances
+    calculator = CashFlowCalculator()
+    current_tb = movements[["account_code", "account_name", "current_balance"]].rename(
+        columns={"current_balance": "net_amount"}
+    )
+    previous_tb = movements[["account_code", "account_name", "previous_balance"]].rename(
+        columns={"previous_balance": "net_amount"}
+    )
+
+    from_tb = calculator.calculate_components(current_tb, previous_tb, classifications, coa_data)
+    expected = _reference_components(
+        calculator, calculator._calculate_movements(current_tb, previous_tb), classifications, coa_data
+    )
+
+    assert from_tb == expected
+
+@pytest.fixture
+def period_balances(balances):
+    """Long-format balances for three periods, with some accounts missing from some periods"""
+    movements, classifications, coa_data = balances
+    rng = np.random.default_rng(11)
+    periods = ["2024-10-31", "2024-11-30", "2024-12-31"]
+    oldest = np.round(movements["previous_balance"] + rng.normal(size=len(movements)) * 1e5, 2)
+
+    frames = []
+    for period, values in zip(periods, (oldest, movements["previous_balance"], movements["current_balance"])):
+        frame = pd.DataFrame({"account_code": movements["account_code"], "period": period, "balance": values})
+        frames.append(frame[rng.random(len(frame)) > 0.05])
+    return pd.concat(frames, ignore_index=True), periods, classifications, coa_data
+
+def test_period_components_match_separate_pair_calculations(period_balances):
+    long_balances, periods, classifications, coa_data = period_balances
+    calculator = CashFlowCalculator()
+
+    result = calculator.calculate_period_components(long_balances, periods, classifications, coa_data)
+
+    matrix = long_balances.pivot_table(index="account_code", columns="period", values="balance", aggfunc="sum")
+    matrix = matrix.reindex(columns=periods).fillna(0.0)
+    for pair_index, (current, previous) in enumerate(zip(periods[1:], periods[:-1])):
+        movements = pd.DataFrame({
+            "account_code": matrix.index,
+            "current_balance": matrix[current].to_numpy(),
+            "previous_balance": matrix[previous].to_numpy(),
+            "movement": (matrix[current] - matrix[previous]).to_numpy()
+        })
+        expected = calculator.calculate_components(None, None, classifications, coa_data, movements=movements)
+
+        pair = {
+            c["id"]: tuple(c[field][pair_index] for field in ("current_value", "previous_value", "movement", "cash_impact"))
+            for c in result["components"] if c["cash_impact"][pair_index] is not None
+        }
+        assert pair == {
+            c["id"]: (c["current_value"], c["previous_value"], c["movement"], c["cash_impact"]) for c in expected
+        }
+
+        totals = result["periods"][pair_index]
+        assert (totals["current_period"], totals["previous_period"]) == (current, previous)
+        assert totals["component_count"] == len(expected)
+        for category in ("Operating", "Investing", "Financing"):
+            assert totals[f"{category.lower()}_total"] == sum(
+                c["cash_impact"] for c in expected if c["category"] == category
+            )
+        assert totals["net_cash_change"] == (
+            totals["operating_total"] + totals["investing_total"] + totals["financing_total"]
+        )
+
+def test_segment_breakdown_sums_to_consolidated_components(balances):
+    movements, classifications, coa_data = balances
+    calculator = CashFlowCalculator()
+    segment_count = 4
+
+    # Split every balance across segments; consolidated figures are the segment sums
+    rng = np.random.default_rng(5)
+    shares = rng.dirichlet(np.ones(segment_count), size=len(movements))
+    consolidated = movements[["previous_balance", "current_balance"]].to_numpy()
+    segment_balances = np.round(shares[:, :, None] * consolidated[:, None, :], 2)
+    segment_balances[:, -1, :] = consolidated - segment_balances[:, :-1, :].sum(axis=1)
+
+    components = calculator.calculate_components(None, None, classifications, coa_data, movements=movements)
+    segments = pd.DataFrame({
+        "segment": [f"E{index}" for index in range(segment_count)],
+        "segment_name": [f"Entity {index}" for index in range(segment_count)]
+    })
+
+    result = calculator.calculate_segment_breakdown(
+        components, movements["account_code"], segments, segment_balances, classifications
+    )
+
+    assert set(result["breakdown"]) == {c["id"] for c in components}
+    for component in components:
+        split = result["breakdown"][component["id"]]
+        for field in ("current_value", "previous_value", "movement", "cash_impact"):
+            assert len(split[field]) == segment_count
+            assert sum(split[field]) == pytest.approx(component[field], rel=1e-9, abs=1e-3)
+
+    for category in ("operating", "investing", "financing"):
+        consolidated_total = sum(c["cash_impact"] for c in components if c["category"].lower() == category)
+        segment_total = sum(totals[f"{category}_total"] for totals in result["segments"])
+        assert segment_total == pytest.approx(consolidated_total, rel=1e-9, abs=1e-3)
+    assert [totals["segment"] for totals in result["segments"]] == list(segments["segment"])
@@ -0,0 +1,79 @@
+"""
+Cash Flow Export Tests
+Parquet and Arrow IPC round trips of a statement and its account movements
+"""
+
+import io
+import json
+
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+from services.cashflow_export import cashflow_table, serialize_table
+
+MOVEMENTS = pd.DataFrame({
+    "account_code": ["1000", "1100", "2000", "9999"],
+    "account_name": ["Trade receivables", "Inventories", "Bank loan", "Suspense"],
+    "current_balance": [15000.0, 8000.0, -50000.0, 10.0],
+    "previous_balance": [10000.0, 9500.0, -30000.0, 0.0],
+    "movement": [5000.0, -1500.0, -20000.0, 10.0],
+    "current_rows": [2, 2, 1, 1],
+    "previous_rows": [2, 2, 1, 0]
+})
+
+RESULT = {
+    "components": [
+        {
+            "id": "Operating_Change in Working Capital", "name": "Change in Working Capital", "category": "Operating",
+            "current_value": 23000.0, "previous_value": 19500.0, "movement": 3500.0, "cash_impact": -3500.0,
+            "accounts": ["1000", "1100"], "formula": "...", "confidence_score": 0.9
+        },
+        {
+            "id": "Financing_Net Borrowings", "name": "Net Borrowings", "category": "Financing",
+            "current_value": -50000.0, "previous_value": -30000.0, "movement": -20000.0, "cash_impact": 20000.0,
+            "accounts": ["2000"], "formula": "...", "confidence_score": None
+        }
+    ],
+    "operating_total": -3500.0,
+    "investing_total": 0.0,
+    "financing_total": 20000.0,
+    "net_cash_change": 16500.0,
+    "metadata": {"total_components": 2, "ai_enhanced": True}
+}
+
+def _read(payload, export_format):
+    if export_format == "parquet":
+        return pq.read_table(io.BytesIO(payload))
+    return pa.ipc.open_stream(payload).read_all()
+
+@pytest.mark.parametrize("export_format", ["parquet", "arrow"])
+def test_round_trip_keeps_rows_components_and_metadata(export_format):
+    table = cashflow_table(RESULT, MOVEMENTS, "2024-12-31", "2024-11-30")
+
+    restored = _read(serialize_table(table, export_format), export_format)
+
+    frame = restored.to_pandas()
+    assert list(frame.columns) == [
+        "account_code", "account_name", "current_balance", "previous_balance", "movement",
+        "component_id", "category", "component_name"
+    ]
+    pd.testing.assert_frame_equal(frame[MOVEMENTS.columns[:5]], MOVEMENTS[MOVEMENTS.columns[:5]])
+    assert restored.column("component_id").to_pylist() == [
+        "Operating_Change in Working Capital", "Operating_Change in Working Capital", "Financing_Net Borrowings", None
+    ]
+    assert restored.column("category").to_pylist() == ["Operating", "Operating", "Financing", None]
+
+    metadata = {key.decode(): value.decode() for key, value in restored.schema.metadata.items()}
+    assert (metadata["current_period"], metadata["previous_period"]) == ("2024-12-31", "2024-11-30")
+    assert json.loads(metadata["components"]) == RESULT["components"]
+    assert json.loads(metadata["totals"]) == {
+        key: RESULT[key] for key in ("operating_total", "investing_total", "financing_total", "net_cash_change")
+    }
+    assert json.loads(metadata["metadata"]) == RESULT["metadata"]
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        serialize_table(cashflow_table(RESULT, MOVEMENTS, "2024-12-31", "2024-11-30"), "csv")
@@ -0,0 +1,77 @@
+"""
+Classification Cache Tests
+Partial reclassification merged with stored results against a full classification
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fakes import StubEmbeddingModel
+from benchmarks.synthetic import generate_dataset
+from services.account_classifier import AccountClassifier
+from services.classification_cache import ClassificationCache
+
+@pytest.fixture(scope="module")
+def classifier():
+    return AccountClassifier(model_name="test-stub", model=StubEmbeddingModel())
+
+@pytest.fixture
+def coa_data():
+    return generate_dataset(2000, entities=2, seed=1)["chart_of_accounts"]
+
+def test_unchanged_coa_is_a_hit(classifier, coa_data):
+    cache = ClassificationCache()
+    first = cache.classify("co", coa_data, classifier)
+
+    stats = {}
+    second = cache.classify("co", coa_data.copy(), classifier, stats=stats)
+
+    assert second is first
+    assert stats["classification_cache"] == "hit"
+
+def test_partial_reclassification_matches_full_run(classifier, coa_data):
+    cache = ClassificationCache()
+    first = cache.classify("co", coa_data, classifier)
+
+    changed = coa_data.copy()
+    renamed = changed.index[[3, 10]]
+    renamed_codes = set(changed.loc[renamed, "account_code"])
+    changed.loc[renamed, "account_name"] = ["Goodwill on acquisition", "Dividends payable to shareholders"]
+    removed = changed["account_code"].iloc[5]
+    changed = changed[changed["account_code"] != removed]
+    added = changed.iloc[[0]].assign(account_code="NEW-1", account_name="Short-term bank borrowings")
+    changed = pd.concat([changed.iloc[:20], added, changed.iloc[20:]], ignore_index=True)
+
+    stats = {}
+    merged = cache.classify("co", changed, classifier, stats=stats)
+
+    assert stats["classification_cache"] == "partial"
+    assert stats["accounts_reclassified"] == 3
+    assert removed not in merged
+    assert list(merged) == list(dict.fromkeys(changed["account_code"]))
+
+    # Accounts that did not change keep their stored rows
+    reclassified = {"NEW-1", *renamed_codes}
+    for code in merged:
+        if code not in reclassified:
+            assert merged[code] == first[code]
+
+    # The same labels as classifying the new COA from scratch; scores only
+    # differ in float32 rounding, which depends on the batch they were scored in
+    full = classifier.classify_accounts(changed)
+    assert list(merged) == list(full)
+    for field in ("top_index", "cf_category", "cf_component", "account_name", "class_name", "tier"):
+        np.testing.assert_array_equal(np.asarray(getattr(merged, field)), np.asarray(getattr(full, field)))
+    np.testing.assert_allclose(merged.scores, full.scores, atol=1e-6)
+
+def test_new_classifier_is_a_miss(classifier, coa_data):
+    cache = ClassificationCache()
+    cache.classify("co", coa_data, classifier)
+
+    stats = {}
+    other = AccountClassifier(model_name="test-stub-2", model=StubEmbeddingModel(seed=1))
+    cache.classify("co", coa_data, other, stats=stats)
+
+    assert stats["classification_cache"] == "miss"
+    assert stats["accounts_reclassified"] == coa_data["account_code"].nunique()
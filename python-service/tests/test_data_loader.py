@@ -0,0 +1,63 @@
+"""
+Data Loader Tests
+Chunked trial balance loads against whole-result reads on a synthetic SQLite database
+"""
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import DEFAULT_PERIODS, generate_dataset, write_sqlite
+from services.data_loader import ConsolidationDataLoader
+from services.database import create_database_engine
+from services.tb_cube import TrialBalanceCube
+
+COMPANY_ID = "bench"
+PREVIOUS_PERIOD, CURRENT_PERIOD = DEFAULT_PERIODS[-2], DEFAULT_PERIODS[-1]
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    path = tmp_path_factory.mktemp("tb") / "tb.sqlite3"
+    write_sqlite(str(path), generate_dataset(20000, entities=5, seed=2, company_id=COMPANY_ID))
+    engine = create_database_engine(f"sqlite:///{path}")
+    yield engine
+    engine.dispose()
+
+def _loaders(engine, backend):
+    whole = ConsolidationDataLoader(engine=engine, backend=backend, use_rollup=False, chunk_size=0)
+    chunked = ConsolidationDataLoader(engine=engine, backend=backend, use_rollup=False, chunk_size=333)
+    return whole, chunked
+
+@pytest.fixture(params=["pandas", "arrow"])
+def backend(request):
+    if request.param == "arrow":
+        pytest.importorskip("pyarrow")
+    return request.param
+
+def test_consolidated_tb_matches_whole_read(engine, backend):
+    whole, chunked = _loaders(engine, backend)
+
+    for period in (PREVIOUS_PERIOD, CURRENT_PERIOD):
+        pd.testing.assert_frame_equal(
+            chunked.load_consolidated_tb(COMPANY_ID, period), whole.load_consolidated_tb(COMPANY_ID, period)
+        )
+
+def test_movements_match_whole_read(engine, backend):
+    whole, chunked = _loaders(engine, backend)
+
+    pd.testing.assert_frame_equal(
+        chunked.load_tb_movements(COMPANY_ID, CURRENT_PERIOD, PREVIOUS_PERIOD),
+        whole.load_tb_movements(COMPANY_ID, CURRENT_PERIOD, PREVIOUS_PERIOD)
+    )
+
+def test_streamed_cube_matches_whole_read(engine):
+    whole, chunked = _loaders(engine, "pandas")
+    periods = [PREVIOUS_PERIOD, CURRENT_PERIOD]
+
+    from_frame = TrialBalanceCube.from_frame(whole.load_entity_tb_balances(COMPANY_ID, periods), periods)
+    from_chunks = TrialBalanceCube.from_chunks(chunked.iter_entity_tb_balances(COMPANY_ID, periods), periods)
+
+    pd.testing.assert_frame_equal(
+        from_chunks.movements(CURRENT_PERIOD, PREVIOUS_PERIOD),
+        from_frame.movements(CURRENT_PERIOD, PREVIOUS_PERIOD)
+    )
+    pd.testing.assert_frame_equal(from_chunks.segments("region"), from_frame.segments("region"))
@@ -0,0 +1,85 @@
+"""
+Embedding Cache Tests
+In-memory LRU, SQLite eviction and hit/miss counters
+"""
+
+import numpy as np
+import pytest
+
+from services import embedding_cache
+from services.embedding_cache import EmbeddingCache, normalize_text
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+def _vector(seed):
+    return np.random.default_rng(seed).normal(size=8).astype(np.float32)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Distinct last_used stamps, so disk eviction order is deterministic
+    monkeypatch.setattr(embedding_cache.time, "time", clock)
+    return clock
+
+def test_normalize_text():
+    assert normalize_text("  Trade   Receivables\n") == "trade receivables"
+
+def test_memory_lru_evicts_least_recently_used(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path), "model-a", memory_entries=2)
+    cache.put_many({"a": _vector(1), "b": _vector(2)})
+    cache.get_many(["a"])
+    cache.put_many({"c": _vector(3)})
+
+    assert list(cache._memory) == ["a", "c"]
+
+    # b fell out of memory but is still on disk
+    found, missing = cache.get_many(["b"])
+    np.testing.assert_array_equal(found["b"], _vector(2))
+    assert missing == []
+    cache.close()
+
+def test_hit_and_miss_counters(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path), "model-a", memory_entries=1)
+    cache.put_many({"a": _vector(1), "b": _vector(2)})
+
+    found, missing = cache.get_many(["a", "b", "c"])
+
+    assert sorted(found) == ["a", "b"]
+    assert missing == ["c"]
+    stats = cache.stats()
+    # Only b is left in the one-entry LRU, a comes from SQLite
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+    assert (stats["memory_entries"], stats["disk_entries"]) == (1, 2)
+    cache.close()
+
+def test_disk_store_evicts_least_recently_used_rows(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path), "model-a", memory_entries=1, max_disk_entries=2)
+    cache.put_many({"a": _vector(1)})
+    cache.put_many({"b": _vector(2)})
+    # Reading a from disk refreshes its recency, so b is the oldest row
+    cache.get_many(["a"])
+    cache.put_many({"c": _vector(3)})
+
+    assert cache.stats()["evictions"] == 1
+    reopened = EmbeddingCache(str(tmp_path), "model-a")
+    found, missing = reopened.get_many(["a", "b", "c"])
+    assert sorted(found) == ["a", "c"]
+    assert missing == ["b"]
+    reopened.close()
+    cache.close()
+
+def test_models_never_share_entries(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path), "model-a")
+    cache.put_many({"a": _vector(1)})
+    other = EmbeddingCache(str(tmp_path), "model-b")
+
+    assert other.get_many(["a"]) == ({}, ["a"])
+    other.close()
+    cache.close()
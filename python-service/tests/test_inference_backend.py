@@ -0,0 +1,98 @@
+"""
+Inference Backend Tests
+OnnxEncoder pooling, normalisation and input order against a tiny embedding-lookup model
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+transformers = pytest.importorskip("transformers")
+
+from onnx import TensorProto, helper, numpy_helper
+
+from services.inference_backend import ONNX_MODEL_FILES, OnnxEncoder, model_key
+
+VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "trade", "receivables", "cash", "at", "bank", "loan", "payable"]
+DIM = 4
+
+SENTENCES = [
+    "cash",
+    "trade receivables at bank",
+    "loan payable",
+    "cash at bank loan payable trade",
+    "receivables"
+]
+
+@pytest.fixture(scope="module")
+def table():
+    return np.random.default_rng(0).normal(size=(len(VOCAB), DIM)).astype(np.float32)
+
+def _write_model(model_dir, table, pooling):
+    """A "transformer" whose last_hidden_state is a plain embedding lookup of input_ids"""
+    os.makedirs(model_dir, exist_ok=True)
+
+    vocab_file = os.path.join(model_dir, "vocab.txt")
+    with open(vocab_file, "w") as handle:
+        handle.write("\n".join(VOCAB) + "\n")
+    transformers.BertTokenizer(vocab_file).save_pretrained(model_dir)
+
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["embeddings", "input_ids"], ["last_hidden_state"], axis=0)],
+        "lookup",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "sequence"]),
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "sequence"])
+        ],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "sequence", DIM])],
+        initializer=[numpy_helper.from_array(table, "embeddings")]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 14)])
+    model.ir_version = 8
+    onnx.save(model, os.path.join(model_dir, ONNX_MODEL_FILES["onnx"]))
+
+    with open(os.path.join(model_dir, "encoder.json"), "w") as handle:
+        json.dump({"model": "tiny", "pooling": pooling, "max_seq_length": 16}, handle)
+
+    return OnnxEncoder(model_dir)
+
+def _token_ids(encoder, sentence):
+    return encoder.tokenizer(sentence)["input_ids"]
+
+def test_mean_pooling_ignores_padding_and_keeps_input_order(tmp_path, table):
+    encoder = _write_model(str(tmp_path / "mean"), table, "mean")
+
+    # Batches of two mix lengths, so most rows carry padding
+    embeddings = encoder.encode(SENTENCES, batch_size=2)
+
+    expected = np.stack([table[_token_ids(encoder, sentence)].mean(axis=0) for sentence in SENTENCES])
+    assert embeddings.dtype == np.float32
+    np.testing.assert_allclose(embeddings, expected, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(encoder.encode(SENTENCES, batch_size=len(SENTENCES)), embeddings, rtol=1e-6, atol=1e-6)
+
+def test_cls_pooling_takes_the_first_token(tmp_path, table):
+    encoder = _write_model(str(tmp_path / "cls"), table, "cls")
+
+    embeddings = encoder.encode(SENTENCES, batch_size=2)
+
+    np.testing.assert_array_equal(embeddings, np.repeat(table[[VOCAB.index("[CLS]")]], len(SENTENCES), axis=0))
+
+def test_normalize_embeddings_gives_unit_vectors(tmp_path, table):
+    encoder = _write_model(str(tmp_path / "mean"), table, "mean")
+
+    raw = encoder.encode(SENTENCES, batch_size=2)
+    normalized = encoder.encode(SENTENCES, batch_size=2, normalize_embeddings=True)
+
+    np.testing.assert_allclose(np.linalg.norm(normalized, axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_allclose(normalized, raw / np.linalg.norm(raw, axis=1, keepdims=True), rtol=1e-6, atol=1e-7)
+
+def test_empty_input_and_model_keys(tmp_path, table):
+    encoder = _write_model(str(tmp_path / "mean"), table, "mean")
+
+    assert encoder.encode([]).shape == (0, 0)
+    assert model_key("all-MiniLM-L6-v2", "torch") == "all-MiniLM-L6-v2"
+    assert model_key("all-MiniLM-L6-v2", "onnx-int8") == "all-MiniLM-L6-v2@onnx-int8"
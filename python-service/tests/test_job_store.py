@@ -0,0 +1,179 @@
+"""
+Job Store Tests
+Leases, claims, per-caller dedup and retention on a temporary SQLite store
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.job_store import (
+    JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JobManager, JobStore, caller_id
+)
+
+REQUEST = {"company_id": "co", "current_period": "2024-12-31", "previous_period": "2023-12-31", "use_ai": True}
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+@pytest.fixture
+def store(db_path):
+    store = JobStore(db_path)
+    yield store
+    store.close()
+
+def test_only_one_owner_wins_a_claim(db_path, store):
+    job, _ = store.create_or_get_active(REQUEST, owner="submitter", lease_seconds=-1)
+    # Separate connections, as separate worker processes would have
+    stores = [JobStore(db_path) for _ in range(8)]
+    barrier = threading.Barrier(len(stores))
+    claims = [None] * len(stores)
+
+    def claim(index):
+        barrier.wait()
+        claims[index] = stores[index].claim(job["job_id"], f"owner-{index}", lease_seconds=60)
+
+    threads = [threading.Thread(target=claim, args=(index,)) for index in range(len(stores))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for other in stores:
+        other.close()
+
+    winners = [claimed for claimed in claims if claimed is not None]
+    assert len(winners) == 1
+    assert winners[0]["status"] == JOB_RUNNING
+
+def test_live_lease_blocks_other_owners(store):
+    job, _ = store.create_or_get_active(REQUEST, owner="a", lease_seconds=60)
+
+    assert store.claim(job["job_id"], "b", lease_seconds=60) is None
+    assert store.claim(job["job_id"], "a", lease_seconds=60) is not None
+    assert store.expired_jobs() == []
+
+def test_expired_lease_can_be_claimed(store):
+    job, _ = store.create_or_get_active(REQUEST, owner="a", lease_seconds=60)
+    assert store.claim(job["job_id"], "a", lease_seconds=0.05) is not None
+
+    time.sleep(0.1)
+    assert store.expired_jobs() == [job["job_id"]]
+    assert store.claim(job["job_id"], "b", lease_seconds=60) is not None
+
+    # The previous owner can no longer finish the job
+    assert not store.complete(job["job_id"], "a", {"stale": True})
+    assert store.complete(job["job_id"], "b", {"ok": True})
+    assert store.get(job["job_id"])["result"] == {"ok": True}
+
+def test_renewed_lease_does_not_expire(store):
+    job, _ = store.create_or_get_active(REQUEST, owner="a", lease_seconds=0.05)
+    assert store.renew_leases("a", lease_seconds=60) == 1
+
+    time.sleep(0.1)
+    assert store.expired_jobs() == []
+    assert store.claim(job["job_id"], "b", lease_seconds=60) is None
+
+def test_release_hands_jobs_back(store):
+    job, _ = store.create_or_get_active(REQUEST, owner="a", lease_seconds=60)
+    store.claim(job["job_id"], "a", lease_seconds=60)
+
+    assert store.release("a") == 1
+    assert store.get(job["job_id"])["status"] == JOB_QUEUED
+    assert store.claim(job["job_id"], "b", lease_seconds=60) is not None
+
+def test_dedup_is_per_caller(store):
+    first, created = store.create_or_get_active(REQUEST, "a", 60, caller=caller_id("key-1"))
+    same, same_created = store.create_or_get_active(dict(REQUEST), "b", 60, caller=caller_id("key-1"))
+    other, other_created = store.create_or_get_active(REQUEST, "a", 60, caller=caller_id("key-2"))
+    anonymous, anonymous_created = store.create_or_get_active(REQUEST, "a", 60)
+
+    assert created and not same_created and other_created and anonymous_created
+    assert same["job_id"] == first["job_id"]
+    assert len({first["job_id"], other["job_id"], anonymous["job_id"]}) == 3
+
+def test_finished_job_is_not_reused(store):
+    first, _ = store.create_or_get_active(REQUEST, "a", 60)
+    store.claim(first["job_id"], "a", 60)
+    store.complete(first["job_id"], "a", {})
+
+    second, created = store.create_or_get_active(REQUEST, "a", 60)
+
+    assert created
+    assert second["job_id"] != first["job_id"]
+
+def test_purge_keeps_jobs_within_retention(store):
+    old, _ = store.create_or_get_active(REQUEST, "a", 60)
+    store.claim(old["job_id"], "a", 60)
+    store.fail(old["job_id"], "a", "boom")
+    time.sleep(0.2)
+
+    recent, _ = store.create_or_get_active({**REQUEST, "company_id": "other"}, "a", 60)
+    store.claim(recent["job_id"], "a", 60)
+    store.complete(recent["job_id"], "a", {})
+    active, _ = store.create_or_get_active({**REQUEST, "company_id": "active"}, "a", 60)
+
+    assert store.purge_finished(retention_seconds=0.1) == 1
+    assert store.get(old["job_id"]) is None
+    assert store.get(recent["job_id"])["status"] == JOB_SUCCEEDED
+    assert store.get(active["job_id"])["status"] == JOB_QUEUED
+
+def _run_manager(store, secrets_seen, submit=None, resume=None):
+    async def run_job(request, secrets, progress):
+        progress("load", "started")
+        progress("load", "completed")
+        secrets_seen.append(secrets)
+        return {"company_id": request["company_id"]}
+
+    async def scenario():
+        manager = JobManager(store, run_job, workers=1, lease_seconds=60)
+        if submit is not None:
+            job, _ = await manager.submit(**submit)
+        await manager.start()
+        if resume is not None:
+            job = resume
+            await manager._enqueue(job["job_id"])
+        await manager._queue.join()
+        await manager.stop()
+        return await manager.get(job["job_id"])
+
+    return asyncio.run(scenario())
+
+def test_manager_runs_job_with_its_secrets(db_path, store):
+    seen = []
+    job = _run_manager(store, seen, submit={
+        "request": REQUEST, "secrets": {"openai_api_key": "sk-secret"}, "caller": caller_id("sk-secret")
+    })
+
+    assert job["status"] == JOB_SUCCEEDED
+    assert job["progress"]["load"]["state"] == "completed"
+    assert seen == [{"openai_api_key": "sk-secret"}]
+    assert job["secret_names"] == ["openai_api_key"]
+    for suffix in ("", "-wal"):
+        try:
+            with open(db_path + suffix, "rb") as handle:
+                assert b"sk-secret" not in handle.read()
+        except FileNotFoundError:
+            pass
+
+def test_resumed_job_without_its_secrets_fails(store):
+    # Submitted by a manager that died holding the caller's key
+    job, _ = store.create_or_get_active(REQUEST, "dead", lease_seconds=-1, secret_names=["openai_api_key"])
+
+    seen = []
+    job = _run_manager(store, seen, resume=job)
+
+    assert job["status"] == JOB_FAILED
+    assert "Resubmit" in job["error"]
+    assert seen == []
+
+def test_resumed_job_without_secrets_runs(store):
+    job, _ = store.create_or_get_active(REQUEST, "dead", lease_seconds=-1)
+
+    seen = []
+    job = _run_manager(store, seen, resume=job)
+
+    assert job["status"] == JOB_SUCCEEDED
+    assert seen == [{}]
@@ -0,0 +1,126 @@
+"""
+LangChain Orchestrator Tests
+Concurrent and batched component enhancement against the fake chat model
+"""
+
+import asyncio
+import json
+import re
+import time
+
+import pandas as pd
+
+from benchmarks.fakes import FakeChatModel
+from services.langchain_orchestrator import CashFlowOrchestrator
+
+def _components(count: int):
+    return [
+        {
+            "id": f"Operating_Component {index}",
+            "name": f"Component {index}",
+            "category": "Operating",
+            "accounts": [f"{1000 + index}"],
+            "current_value": 5000.0 * index,
+            "previous_value": 1000.0,
+            "movement": 5000.0 * index - 1000.0,
+            "cash_impact": 5000.0 * index - 1000.0
+        }
+        for index in range(count)
+    ]
+
+def _coa(components):
+    codes = [component["accounts"][0] for component in components]
+    return pd.DataFrame({"account_code": codes, "account_name": [f"Account {code}" for code in codes]})
+
+def _respond(messages):
+    """Single-component reply naming the component, or a batched reply for every other id"""
+    content = str(messages[-1].content)
+    if "JSON array" in content:
+        payloads = json.loads(content[content.index("["):content.rindex("]") + 1])
+        return json.dumps([
+            {"id": payload["id"], "confidence_score": 0.95, "suggested_name": None, "notes": "batched"}
+            for position, payload in enumerate(payloads) if position % 2 == 0
+        ])
+
+    name = re.search(r"Component Name: (.+)", content).group(1)
+    return json.dumps({"confidence_score": 0.9, "suggested_name": None, "notes": f"single {name}"})
+
+def _orchestrator(llm, **kwargs):
+    kwargs.setdefault("retry_backoff", 0.0)
+    return CashFlowOrchestrator(llm=llm, **kwargs)
+
+def test_concurrent_enhancement_keeps_order():
+    components = _components(20)
+    llm = FakeChatModel(latency=0.05, respond=_respond)
+    orchestrator = _orchestrator(llm, max_concurrency=10)
+
+    started = time.perf_counter()
+    result = asyncio.run(orchestrator.aenhance_components(components, _coa(components)))
+    elapsed = time.perf_counter() - started
+
+    assert [component["name"] for component in result] == [f"Component {index}" for index in range(20)]
+    assert all(component["ai_notes"] == f"single {component['name']}" for component in result)
+    assert llm.calls == 20
+    # 20 calls of 50 ms, ten at a time
+    assert elapsed < 0.5
+
+def test_failed_calls_are_retried():
+    components = _components(1)
+    llm = FakeChatModel(failures=2, respond=_respond)
+    orchestrator = _orchestrator(llm, max_retries=2)
+
+    asyncio.run(orchestrator.aenhance_components(components, _coa(components)))
+
+    assert components[0]["confidence_score"] == 0.9
+    assert llm.calls == 3
+    assert orchestrator.usage["llm_retries"] == 2
+    assert orchestrator.usage["llm_calls"] == 1
+
+def test_exhausted_retries_fall_back_to_default_confidence():
+    components = _components(1)
+    orchestrator = _orchestrator(FakeChatModel(failures=3, respond=_respond), max_retries=2)
+
+    asyncio.run(orchestrator.aenhance_components(components, _coa(components)))
+
+    assert components[0]["confidence_score"] == 0.7
+    assert "ai_notes" not in components[0]
+
+def test_slow_calls_time_out():
+    components = _components(3)
+    orchestrator = _orchestrator(FakeChatModel(latency=1.0, respond=_respond), timeout=0.05, max_retries=1)
+
+    started = time.perf_counter()
+    asyncio.run(orchestrator.aenhance_components(components, _coa(components)))
+    elapsed = time.perf_counter() - started
+
+    assert [component["confidence_score"] for component in components] == [0.7, 0.7, 0.7]
+    assert orchestrator.usage["llm_retries"] == 3
+    assert elapsed < 0.5
+
+def test_batched_reply_missing_components_falls_back_per_component():
+    components = _components(6)
+    llm = FakeChatModel(respond=_respond)
+    orchestrator = _orchestrator(llm)
+
+    result = asyncio.run(orchestrator.aenhance_components_batched(components, _coa(components)))
+
+    assert [component["name"] for component in result] == [f"Component {index}" for index in range(6)]
+    assert [component["ai_notes"] for component in result] == [
+        "batched", "single Component 1", "batched", "single Component 3", "batched", "single Component 5"
+    ]
+    # One batched request, then one call for each component it left out
+    assert llm.calls == 4
+
+def test_unparseable_batched_reply_falls_back_for_every_component():
+    components = _components(4)
+
+    def respond(messages):
+        if "JSON array" in str(messages[-1].content):
+            return "not json"
+        return _respond(messages)
+
+    llm = FakeChatModel(respond=respond)
+    asyncio.run(_orchestrator(llm).aenhance_components_batched(components, _coa(components)))
+
+    assert all(component["ai_notes"] == f"single {component['name']}" for component in components)
+    assert llm.calls == 5
@@ -0,0 +1,158 @@
+"""
+LLM Response Cache Tests
+Key stability, expiry, eviction, and orchestrator runs served from the cache
+"""
+
+import asyncio
+import time
+
+import pandas as pd
+import pytest
+from langchain.schema.messages import HumanMessage, SystemMessage
+
+from benchmarks.fakes import FakeChatModel
+from services.langchain_orchestrator import CashFlowOrchestrator
+from services.llm_cache import LLMResponseCache
+
+MESSAGES = [SystemMessage(content="You are an accountant"), HumanMessage(content="Check trade receivables")]
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm"))
+    yield cache
+    cache.close()
+
+def test_key_is_stable_and_covers_every_input():
+    key = LLMResponseCache.make_key("gpt-4", 0.1, MESSAGES, "1")
+
+    assert key == LLMResponseCache.make_key("gpt-4", 0.1, list(MESSAGES), "1")
+    assert len({
+        key,
+        LLMResponseCache.make_key("gpt-4o", 0.1, MESSAGES, "1"),
+        LLMResponseCache.make_key("gpt-4", 0.2, MESSAGES, "1"),
+        LLMResponseCache.make_key("gpt-4", 0.1, MESSAGES, "2"),
+        LLMResponseCache.make_key("gpt-4", 0.1, MESSAGES[:1], "1"),
+        LLMResponseCache.make_key("gpt-4", 0.1, [HumanMessage(content="You are an accountant"), MESSAGES[1]], "1")
+    }) == 6
+
+def test_entries_persist_across_instances(tmp_path):
+    first = LLMResponseCache(str(tmp_path / "llm"))
+    first.put("key", "response")
+    first.close()
+
+    second = LLMResponseCache(str(tmp_path / "llm"))
+    assert second.get("key") == "response"
+    second.close()
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm"), ttl_seconds=0.05)
+    cache.put("key", "response")
+    assert cache.get("key") == "response"
+
+    time.sleep(0.1)
+
+    assert cache.get("key") is None
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["entries"] == 0
+    cache.close()
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm"), max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.put(key, key)
+        time.sleep(0.01)
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") == "a"
+    time.sleep(0.01)
+
+    cache.put("d", "d")
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == ["a", "c", "d"]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 3
+    cache.close()
+
+def test_hit_and_miss_counters(cache):
+    assert cache.get("key") is None
+    cache.put("key", "response")
+    cache.get("key")
+
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+def _components(count):
+    return [
+        {
+            "id": f"Operating_Component {index}",
+            "name": f"Component {index}",
+            "category": "Operating",
+            "accounts": [f"{1000 + index}"],
+            "current_value": 5000.0 * index,
+            "previous_value": 1000.0,
+            "movement": 5000.0 * index - 1000.0,
+            "cash_impact": 5000.0 * index - 1000.0
+        }
+        for index in range(count)
+    ]
+
+COA = pd.DataFrame({"account_code": [f"{1000 + index}" for index in range(5)], "account_name": ["Account"] * 5})
+
+def _orchestrator(cache, **fields):
+    llm = FakeChatModel(model_name="fake-chat", **fields)
+    return CashFlowOrchestrator(llm=llm, response_cache=cache, retry_backoff=0.0)
+
+def test_second_identical_run_makes_no_llm_calls(cache):
+    first = _orchestrator(cache)
+    asyncio.run(first.aenhance_components(_components(5), COA))
+    assert first.usage["llm_calls"] == 5
+
+    second = _orchestrator(cache)
+    components = asyncio.run(second.aenhance_components(_components(5), COA))
+
+    assert second.usage["llm_calls"] == 0
+    assert second.usage["llm_cache_hits"] == 5
+    assert all(component["ai_notes"] == "Classification looks reasonable" for component in components)
+
+def test_second_identical_batched_and_sync_runs_make_no_llm_calls(cache):
+    asyncio.run(_orchestrator(cache).aenhance_components_batched(_components(5), COA))
+    _orchestrator(cache).enhance_components(_components(5), coa_data=COA)
+
+    batched = _orchestrator(cache)
+    asyncio.run(batched.aenhance_components_batched(_components(5), COA))
+    sync = _orchestrator(cache)
+    sync.enhance_components(_components(5), coa_data=COA)
+
+    assert batched.usage["llm_calls"] == 0
+    assert sync.usage["llm_calls"] == 0
+
+def test_unparseable_replies_are_not_cached(cache):
+    truncated = _orchestrator(cache, respond=lambda messages: '{"confidence_score": 0.9, "notes": "cut')
+    asyncio.run(truncated.aenhance_components(_components(2), COA))
+    truncated.enhance_components(_components(2), coa_data=COA)
+    truncated.validate_cashflow_statement(_components(2), net_cash_change=0.0)
+
+    assert cache.stats()["entries"] == 0
+
+    # The next run asks the model again instead of replaying the bad reply
+    retry = _orchestrator(cache)
+    asyncio.run(retry.aenhance_components(_components(2), COA))
+    assert retry.usage["llm_calls"] == 2
+    assert cache.stats()["entries"] == 2
+
+def test_validation_reply_is_cached_after_it_parses(cache):
+    respond = lambda messages: '{"status": "OK", "observations": [], "warnings": [], "suggestions": []}'
+    assert _orchestrator(cache, respond=respond).validate_cashflow_statement(_components(2), 0.0)["status"] == "OK"
+
+    second = _orchestrator(cache, respond=respond)
+    assert second.validate_cashflow_statement(_components(2), 0.0)["status"] == "OK"
+    assert second.usage["llm_calls"] == 0
+
+def test_model_without_a_name_is_not_cached(cache):
+    orchestrator = CashFlowOrchestrator(llm=FakeChatModel(), response_cache=cache)
+
+    asyncio.run(orchestrator.aenhance_components(_components(2), COA))
+
+    assert orchestrator.response_cache is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,75 @@
+"""
+Metrics Tests
+Finished pipeline spans aggregated into the Prometheus counters
+"""
+
+import pytest
+from prometheus_client import REGISTRY
+
+from services.metrics import RunTrace, render_metrics
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_span_updates_stage_metrics():
+    before = (
+        _sample("cashflow_stage_rows_total", stage="test_load"),
+        _sample("cashflow_stage_duration_seconds_count", stage="test_load")
+    )
+    trace = RunTrace()
+
+    with trace.span("test_load", rows=120) as span:
+        span.set(source="live")
+
+    assert _sample("cashflow_stage_rows_total", stage="test_load") - before[0] == 120
+    assert _sample("cashflow_stage_duration_seconds_count", stage="test_load") - before[1] == 1
+    spans = trace.to_list()
+    assert spans[0]["stage"] == "test_load" and spans[0]["rows"] == 120 and spans[0]["source"] == "live"
+    assert spans[0]["seconds"] >= 0
+
+def test_span_records_errors_and_reraises():
+    before = _sample("cashflow_stage_errors_total", stage="test_fail")
+    trace = RunTrace()
+
+    with pytest.raises(ValueError):
+        with trace.span("test_fail"):
+            raise ValueError("bad input")
+
+    assert _sample("cashflow_stage_errors_total", stage="test_fail") - before == 1
+    assert trace.to_list()[0]["error"] == "ValueError: bad input"
+
+def test_span_attributes_feed_cache_llm_and_tier_counters():
+    counters = {
+        ("cashflow_cache_lookups_total", (("cache", "classification"), ("result", "hit"))): 1,
+        ("cashflow_cache_lookups_total", (("cache", "embedding"), ("result", "hit"))): 7,
+        ("cashflow_cache_lookups_total", (("cache", "embedding"), ("result", "miss"))): 3,
+        ("cashflow_cache_lookups_total", (("cache", "llm"), ("result", "hit"))): 2,
+        ("cashflow_llm_calls_total", (("source", "api"),)): 4,
+        ("cashflow_llm_calls_total", (("source", "cache"),)): 2,
+        ("cashflow_llm_tokens_total", (("kind", "prompt"),)): 900,
+        ("cashflow_llm_tokens_total", (("kind", "completion"),)): 150,
+        ("cashflow_classified_accounts_total", (("tier", "rule"),)): 5,
+        ("cashflow_classified_accounts_total", (("tier", "model"),)): 10
+    }
+    before = {key: _sample(key[0], **dict(key[1])) for key in counters}
+
+    trace = RunTrace()
+    with trace.span("test_classify") as span:
+        span.set(
+            classification_cache="hit", embedding_cache_hits=7, embedding_cache_misses=3,
+            rule_tier=5, model_tier=10
+        )
+    with trace.span("test_enhance") as span:
+        span.set(llm_calls=4, llm_cache_hits=2, llm_cache_misses=0, prompt_tokens=900, completion_tokens=150)
+
+    for key, increment in counters.items():
+        assert _sample(key[0], **dict(key[1])) - before[key] == increment, key
+
+def test_render_metrics_exposes_the_counters():
+    with RunTrace().span("test_render", rows=1):
+        pass
+
+    body, content_type = render_metrics()
+
+    assert content_type.startswith("text/plain")
+    assert b'cashflow_stage_rows_total{stage="test_render"} 1.0' in body
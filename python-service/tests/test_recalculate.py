@@ -0,0 +1,168 @@
+"""
+Incremental Recalculation Tests
+Delta recalculation against a full recompute, re-enhancement scope and change set idempotency
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from benchmarks.fakes import FakeChatModel, StubEmbeddingModel
+from benchmarks.synthetic import DEFAULT_PERIODS, generate_dataset, write_sqlite
+from services.cashflow_pipeline import CashFlowPipeline, ChangeSetAlreadyApplied
+from services.cashflow_state import CashFlowStateStore
+from services.database import create_database_engine
+from services.model_registry import ModelRegistry
+
+COMPANY_ID = "recalc"
+PREVIOUS_PERIOD, CURRENT_PERIOD = DEFAULT_PERIODS[-2], DEFAULT_PERIODS[-1]
+KEY = CashFlowStateStore.key(COMPANY_ID, CURRENT_PERIOD, PREVIOUS_PERIOD)
+ENTITY_ID = f"{COMPANY_ID}-entity-000"
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "tb.sqlite3")
+    write_sqlite(path, generate_dataset(1200, entities=2, seed=3, company_id=COMPANY_ID))
+    return path
+
+@pytest.fixture
+def engine(db_path):
+    engine = create_database_engine(f"sqlite:///{db_path}")
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def registry():
+    registry = ModelRegistry(model_name="recalc-stub", model=StubEmbeddingModel(), inference_workers=1)
+    registry.load()
+    yield registry
+    registry.shutdown()
+
+def _generate(engine, registry, use_ai=False):
+    pipeline = CashFlowPipeline(engine=engine, registry=registry, llm=FakeChatModel())
+    return asyncio.run(pipeline.run(COMPANY_ID, CURRENT_PERIOD, PREVIOUS_PERIOD, use_ai=use_ai))
+
+def _recalculate(engine, registry, changes, change_set_id):
+    pipeline = CashFlowPipeline(engine=engine, registry=registry, llm=FakeChatModel())
+    return asyncio.run(pipeline.recalculate(
+        COMPANY_ID, CURRENT_PERIOD, PREVIOUS_PERIOD,
+        changes=changes, change_set_id=change_set_id, use_ai=True
+    ))
+
+def _post_to_database(db_path, changes):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany(
+            "INSERT INTO trial_balance (entity_id, account_code, account_name, debit, credit, period) "
+            "VALUES (?, ?, 'Late journal', ?, ?, ?)",
+            [(ENTITY_ID, c["account_code"], c["debit"], c["credit"], c["period"]) for c in changes]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def _totals(components):
+    return {
+        c["id"]: (c["current_value"], c["previous_value"], c["movement"], c["cash_impact"])
+        for c in components
+    }
+
+def _account_by_component(registry):
+    return {c["id"]: c["accounts"][0] for c in registry.cashflow_state.get(KEY)["components"]}
+
+def test_recalculate_matches_full_recompute_of_mutated_tb(engine, registry, db_path):
+    _generate(engine, registry)
+    accounts = _account_by_component(registry)
+    changes = [
+        {"account_code": accounts["Operating_Change in Payables"], "period": CURRENT_PERIOD, "debit": 250000.0, "credit": 0.0},
+        {"account_code": accounts["Operating_Change in Payables"], "period": PREVIOUS_PERIOD, "debit": 0.0, "credit": 1234.5},
+        {"account_code": accounts["Financing_Net Borrowings"], "period": CURRENT_PERIOD, "debit": 0.0, "credit": 70000.0},
+        # Outside the period pair, ignored
+        {"account_code": accounts["Financing_Net Borrowings"], "period": "2024-10-31", "debit": 9e9, "credit": 0.0}
+    ]
+
+    incremental = _recalculate(engine, registry, changes, "journal-1")
+    assert incremental["metadata"]["recalculation"] == "incremental"
+
+    _post_to_database(db_path, changes)
+    registry.cashflow_state.clear()
+    full = _generate(engine, registry)
+
+    assert [c["id"] for c in incremental["components"]] == [c["id"] for c in full["components"]]
+    full_totals = _totals(full["components"])
+    for component_id, values in _totals(incremental["components"]).items():
+        assert values == pytest.approx(full_totals[component_id], rel=1e-12)
+    assert incremental["net_cash_change"] == pytest.approx(full["net_cash_change"], rel=1e-12)
+
+def test_only_materially_changed_components_are_reenhanced(engine, registry, monkeypatch):
+    monkeypatch.setenv("RECALC_MATERIALITY", "1000")
+    _generate(engine, registry, use_ai=True)
+    accounts = _account_by_component(registry)
+
+    sent = []
+    async def record_enhance(self, components, coa_data, api_key):
+        sent.extend(component["id"] for component in components)
+        return components
+    monkeypatch.setattr(CashFlowPipeline, "enhance", record_enhance)
+
+    result = _recalculate(engine, registry, [
+        {"account_code": accounts["Operating_Change in Payables"], "period": CURRENT_PERIOD, "debit": 0.0, "credit": 10.0},
+        {"account_code": accounts["Investing_Purchase of Intangible Assets"], "period": CURRENT_PERIOD, "debit": 500000.0, "credit": 0.0}
+    ], "journal-1")
+
+    assert sent == ["Investing_Purchase of Intangible Assets"]
+    assert result["metadata"]["components_reenhanced"] == 1
+    payables = next(c for c in result["components"] if c["id"] == "Operating_Change in Payables")
+    # Immaterial change keeps the previous enhancement
+    assert payables["confidence_score"] == 0.9
+
+def test_reapplied_change_set_is_rejected(engine, registry):
+    _generate(engine, registry)
+    accounts = _account_by_component(registry)
+    changes = [{"account_code": accounts["Financing_Net Borrowings"], "period": CURRENT_PERIOD, "debit": 5000.0, "credit": 0.0}]
+
+    first = _recalculate(engine, registry, changes, "journal-1")
+    movements = registry.cashflow_state.get(KEY)["movements"].copy()
+
+    with pytest.raises(ChangeSetAlreadyApplied):
+        _recalculate(engine, registry, changes, "journal-1")
+
+    assert registry.cashflow_state.get(KEY)["movements"].equals(movements)
+    assert _recalculate(engine, registry, changes, "journal-2")["net_cash_change"] != first["net_cash_change"]
+
+def test_change_set_is_remembered_across_full_runs(engine, registry):
+    changes = [{"account_code": "0000001", "period": CURRENT_PERIOD, "debit": 5000.0, "credit": 0.0}]
+
+    # No stored state: the full pipeline runs and the id is still recorded
+    assert _recalculate(engine, registry, changes, "journal-1")["metadata"]["recalculation"] == "full"
+    with pytest.raises(ChangeSetAlreadyApplied):
+        _recalculate(engine, registry, changes, "journal-1")
+
+    # A regenerate replaces the stored state but not the applied ids
+    _generate(engine, registry)
+    with pytest.raises(ChangeSetAlreadyApplied):
+        _recalculate(engine, registry, changes, "journal-1")
+
+def test_concurrent_retries_apply_once(engine, registry):
+    _generate(engine, registry)
+    accounts = _account_by_component(registry)
+    changes = [{"account_code": accounts["Financing_Net Borrowings"], "period": CURRENT_PERIOD, "debit": 5000.0, "credit": 0.0}]
+    before = registry.cashflow_state.get(KEY)["movements"].set_index("account_code")
+
+    async def post_twice():
+        pipelines = [CashFlowPipeline(engine=engine, registry=registry, llm=FakeChatModel()) for _ in range(2)]
+        return await asyncio.gather(*(
+            pipeline.recalculate(
+                COMPANY_ID, CURRENT_PERIOD, PREVIOUS_PERIOD,
+                changes=changes, change_set_id="journal-1", use_ai=False
+            )
+            for pipeline in pipelines
+        ), return_exceptions=True)
+
+    outcomes = asyncio.run(post_twice())
+
+    assert sum(isinstance(outcome, ChangeSetAlreadyApplied) for outcome in outcomes) == 1
+    after = registry.cashflow_state.get(KEY)["movements"].set_index("account_code")
+    code = accounts["Financing_Net Borrowings"]
+    assert after.loc[code, "current_balance"] - before.loc[code, "current_balance"] == 5000.0
@@ -0,0 +1,86 @@
+"""
+Rule Classifier Tests
+Rule-tier answers against the labeled chart of accounts fixture
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.classifier_backends import DEFAULT_FIXTURE
+from benchmarks.fakes import StubEmbeddingModel
+from services.account_classifier import AccountClassifier, RULE_CONFIDENCE
+from services.rule_classifier import RuleClassifier
+
+@pytest.fixture(scope="module")
+def classifier():
+    return AccountClassifier(model_name="test-stub", model=StubEmbeddingModel(), rule_tier=True, rule_mappings={})
+
+@pytest.fixture(scope="module")
+def labeled_coa():
+    return pd.read_csv(DEFAULT_FIXTURE, dtype={"account_code": str})
+
+def test_rule_tier_agrees_with_labels(classifier, labeled_coa):
+    result = classifier.classify_accounts(labeled_coa)
+
+    resolved = [code for code in labeled_coa["account_code"] if result[code]["tier"] == "rule"]
+    expected = dict(zip(labeled_coa["account_code"], labeled_coa["expected_category"]))
+    wrong = {
+        result[code]["account_name"]: result[code]["top_category"]
+        for code in resolved if result[code]["top_category"] != expected[code]
+    }
+
+    assert not wrong
+    # A tier that resolves nothing would pass trivially
+    assert len(resolved) >= len(labeled_coa) // 4
+
+@pytest.mark.parametrize("name", [
+    "Treasury stock",
+    "Amortisation of software",
+    "Amounts due from customers",
+    "Amounts owed to suppliers",
+    "Goods received not invoiced"
+])
+def test_broad_words_and_notes_do_not_decide(classifier, name):
+    coa = pd.DataFrame({
+        "account_code": ["1"],
+        "account_name": [name],
+        "class_name": ["Assets"],
+        "note_name": ["Trade and other receivables"],
+        "sub_note_name": ["Other receivables"]
+    })
+
+    assert classifier.rule_classifier.match_rows(coa, [0]).tolist() == [-1]
+
+def test_rule_rows_have_nan_scores_of_the_same_shape(classifier):
+    coa = pd.DataFrame({
+        "account_code": ["1", "2"],
+        "account_name": ["Trade receivables", "Sundry balances"],
+        "class_name": ["Assets", "Assets"]
+    })
+
+    result = classifier.classify_accounts(coa)
+
+    assert result["1"]["tier"] == "rule"
+    assert result["1"]["top_category"] == "working_capital_receivables"
+    assert result["1"]["confidence"] == RULE_CONFIDENCE
+    # Same shape as a model row, every score NaN
+    assert list(result["1"]["all_scores"]) == list(result["2"]["all_scores"]) == result.categories
+    assert np.isnan(list(result["1"]["all_scores"].values())).all()
+    assert np.isnan(result.scores[0]).all()
+    # JSON forms carry nulls in the same shape
+    assert result.to_records()["1"]["all_scores"] == dict.fromkeys(result.categories)
+    assert result.to_records()["2"]["all_scores"] == result["2"]["all_scores"]
+    assert result.to_columnar()["scores"][0] == [None] * len(result.categories)
+    json.dumps(result.to_records(), allow_nan=False)
+
+    assert result["2"]["tier"] == "model"
+    assert result["2"]["confidence"] == max(result["2"]["all_scores"].values())
+
+def test_user_phrases_may_be_single_words(classifier):
+    rules = RuleClassifier(classifier.cf_templates, {"overdraft": "borrowings"})
+
+    assert rules.categories[rules.match("Bank overdraft")] == "borrowings"
+    assert rules.match("Software") == -1
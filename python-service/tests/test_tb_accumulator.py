@@ -0,0 +1,108 @@
+"""
+Trial Balance Accumulator Tests
+Chunked accumulation against a whole-result read of the same query
+"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.tb_accumulator import BalanceAccumulator
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE tb (account_code TEXT, period TEXT, amount NUMERIC, note TEXT)")
+    yield connection
+    connection.close()
+
+def _read(connection, query, chunksize=None):
+    return pd.read_sql(query, connection, chunksize=chunksize)
+
+def test_chunks_match_whole_read(connection):
+    rng = np.random.default_rng(0)
+    rows = [
+        (f"{code:04d}", period, float(amount), f"note {code % 7}")
+        for code, period, amount in zip(
+            rng.integers(0, 200, 5000), rng.choice(["2024-12-31", "2023-12-31"], 5000), rng.normal(0, 1e4, 5000)
+        )
+    ]
+    connection.executemany("INSERT INTO tb VALUES (?, ?, ?, ?)", rows)
+    query = (
+        "SELECT account_code, period, SUM(amount) AS amount, COUNT(*) AS row_count, MIN(note) AS note "
+        "FROM tb GROUP BY account_code, period ORDER BY account_code, period"
+    )
+
+    whole = _read(connection, query)
+    streamed = BalanceAccumulator.accumulate(_read(connection, query, chunksize=37), ["account_code", "period"])
+
+    pd.testing.assert_frame_equal(streamed, whole)
+    assert streamed["row_count"].dtype == np.int64
+
+def test_repeated_keys_are_summed():
+    chunks = [
+        pd.DataFrame({"account_code": ["1000", "2000"], "amount": [1.5, 2.0], "name": ["Cash", "Debt"]}),
+        pd.DataFrame({"account_code": ["1000", "3000"], "amount": [0.25, 4.0], "name": ["Other", "Equity"]})
+    ]
+
+    result = BalanceAccumulator.accumulate(chunks, ["account_code"])
+
+    assert result["account_code"].tolist() == ["1000", "2000", "3000"]
+    assert result["amount"].tolist() == [1.75, 2.0, 4.0]
+    assert result["name"].tolist() == ["Cash", "Debt", "Equity"]
+
+def test_float_chunk_after_integer_chunk(connection):
+    # SQLite returns whole NUMERIC sums as integers, so the first chunk reads as int64
+    connection.executemany(
+        "INSERT INTO tb VALUES (?, ?, ?, ?)", [("1000", "p", 1, "a"), ("2000", "p", 2, "b"), ("3000", "p", 2.75, "c")]
+    )
+    query = "SELECT account_code, SUM(amount) AS amount FROM tb GROUP BY account_code ORDER BY account_code"
+
+    whole = _read(connection, query)
+    streamed = BalanceAccumulator.accumulate(_read(connection, query, chunksize=2), ["account_code"])
+
+    assert streamed["amount"].tolist() == [1.0, 2.0, 2.75]
+    pd.testing.assert_frame_equal(streamed, whole)
+
+def test_null_first_chunk(connection):
+    connection.executemany(
+        "INSERT INTO tb VALUES (?, ?, ?, ?)",
+        [("1000", "p", None, None), ("2000", "p", None, None), ("3000", "p", 5, "c"), ("3000", "q", 2.5, "d")]
+    )
+    query = (
+        "SELECT account_code, SUM(amount) AS amount, MIN(note) AS note "
+        "FROM tb GROUP BY account_code ORDER BY account_code"
+    )
+
+    whole = _read(connection, query)
+    streamed = BalanceAccumulator.accumulate(_read(connection, query, chunksize=2), ["account_code"])
+
+    assert streamed["amount"].iloc[2] == 7.5
+    assert streamed["note"].tolist() == [None, None, "c"]
+    pd.testing.assert_frame_equal(streamed, whole)
+
+def test_all_null_column_stays_null():
+    chunks = [
+        pd.DataFrame({"account_code": ["1000"], "amount": [None]}),
+        pd.DataFrame({"account_code": ["2000"], "amount": [None]})
+    ]
+
+    result = BalanceAccumulator.accumulate(chunks, ["account_code"])
+
+    assert result["amount"].dtype == object
+    assert result["amount"].isna().all()
+
+def test_arrow_dtypes_are_kept():
+    pa = pytest.importorskip("pyarrow")
+    chunks = [
+        pd.DataFrame({"account_code": ["1000", "2000"], "amount": [1.5, None]}).convert_dtypes(dtype_backend="pyarrow"),
+        pd.DataFrame({"account_code": ["1000"], "amount": [2.0]}).convert_dtypes(dtype_backend="pyarrow")
+    ]
+
+    result = BalanceAccumulator.accumulate(chunks, ["account_code"])
+
+    assert result["account_code"].dtype == chunks[0]["account_code"].dtype
+    assert result["amount"].dtype == pd.ArrowDtype(pa.float64())
+    assert result["amount"].tolist()[0] == 3.5
@@ -0,0 +1,79 @@
+"""
+Trial Balance Cube Cache Tests
+TTL expiry, LRU eviction and per-company invalidation
+"""
+
+import pytest
+
+from services import tb_cube
+from services.tb_cube import TrialBalanceCubeCache
+
+PERIODS = ["2024-11-30", "2024-12-31"]
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tb_cube.time, "monotonic", clock)
+    return clock
+
+def test_key_ignores_period_order():
+    assert TrialBalanceCubeCache.key("c1", PERIODS) == TrialBalanceCubeCache.key("c1", PERIODS[::-1])
+
+def test_entries_expire_after_ttl(clock):
+    cache = TrialBalanceCubeCache(max_entries=4, ttl_seconds=60)
+    key = cache.key("c1", PERIODS)
+    cube = object()
+    cache.put(key, cube)
+
+    clock.now += 60
+    assert cache.get(key) is cube
+
+    clock.now += 1
+    assert cache.get(key) is None
+    assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_put_restarts_the_ttl(clock):
+    cache = TrialBalanceCubeCache(max_entries=4, ttl_seconds=60)
+    key = cache.key("c1", PERIODS)
+    cache.put(key, object())
+
+    clock.now += 50
+    refreshed = object()
+    cache.put(key, refreshed)
+    clock.now += 50
+
+    assert cache.get(key) is refreshed
+
+def test_least_recently_used_cube_is_evicted(clock):
+    cache = TrialBalanceCubeCache(max_entries=2, ttl_seconds=60)
+    first, second, third = (cache.key(company, PERIODS) for company in ("c1", "c2", "c3"))
+    cache.put(first, "cube-1")
+    cache.put(second, "cube-2")
+
+    # Reading c1 makes c2 the least recently used
+    assert cache.get(first) == "cube-1"
+    cache.put(third, "cube-3")
+
+    assert cache.get(second) is None
+    assert cache.get(first) == "cube-1"
+    assert cache.get(third) == "cube-3"
+
+def test_invalidate_drops_only_that_company(clock):
+    cache = TrialBalanceCubeCache(max_entries=4, ttl_seconds=60)
+    cache.put(cache.key("c1", PERIODS), "pair")
+    cache.put(cache.key("c1", PERIODS[:1]), "single")
+    cache.put(cache.key("c2", PERIODS), "other")
+
+    cache.invalidate("c1")
+
+    assert cache.get(cache.key("c1", PERIODS)) is None
+    assert cache.get(cache.key("c1", PERIODS[:1])) is None
+    assert cache.get(cache.key("c2", PERIODS)) == "other"
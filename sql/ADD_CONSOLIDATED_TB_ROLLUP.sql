@@ -0,0 +1,305 @@
+-- =====================================================
+-- CONSOLIDATED TRIAL BALANCE ROLLUP
+-- =====================================================
+-- Precomputes trial_balance aggregated across a company's entities
+-- per (company, period, account), so the cash flow service does not
+-- re-scan and GROUP BY every entity's rows on each request.
+--
+-- How it stays correct:
+-- * Triggers on trial_balance (and on entities.company_id changes)
+--   only mark the affected (company, period) slices as stale; uploads
+--   are not slowed down by re-aggregation
+-- * refresh_consolidated_tb_rollup() rebuilds one slice,
+--   refresh_stale_consolidated_tb_rollups() rebuilds every stale slice
+--   (schedule it, see the bottom of this file)
+-- * The Python service (TB_ROLLUP_ENABLED=true) reads the rollup only
+--   when every requested slice is fresh and otherwise falls back to
+--   the live aggregate
+--
+-- Safe to run more than once: all statements use IF NOT EXISTS / OR REPLACE
+-- =====================================================
+
+-- =====================================================
+-- STEP 1: Recommended composite indexes for the live aggregate
+-- =====================================================
+
+-- Company -> entities lookup used by every consolidated query
+CREATE INDEX IF NOT EXISTS idx_entities_company_id_id
+  ON public.entities(company_id, id);
+
+-- Per-entity, per-period scan with the summed columns in the index,
+-- so the fallback aggregate can use an index-only scan
+CREATE INDEX IF NOT EXISTS idx_trial_balance_entity_period_account
+  ON public.trial_balance(entity_id, period, account_code)
+  INCLUDE (account_name, debit, credit);
+
+-- =====================================================
+-- STEP 2: Rollup and freshness tables
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS public.consolidated_tb_rollup (
+  company_id uuid NOT NULL,
+  period date NOT NULL,
+  account_code text NOT NULL,
+  account_name text NOT NULL,
+  -- Plain SUMs (NULL when every input is NULL), so summing the rollup
+  -- gives exactly what summing trial_balance would
+  total_debit numeric,
+  total_credit numeric,
+  net_amount numeric,
+  row_count integer NOT NULL,
+  CONSTRAINT consolidated_tb_rollup_pkey PRIMARY KEY (company_id, period, account_code, account_name)
+);
+
+COMMENT ON TABLE public.consolidated_tb_rollup IS 'trial_balance summed across a company''s entities per period and account (same grouping as the live consolidated query)';
+
+-- One row per (company, period); the service only trusts the rollup when is_stale = false
+CREATE TABLE IF NOT EXISTS public.consolidated_tb_rollup_status (
+  company_id uuid NOT NULL,
+  period date NOT NULL,
+  is_stale boolean NOT NULL DEFAULT true,
+  changed_at timestamp with time zone NOT NULL DEFAULT now(),
+  refreshed_at timestamp with time zone,
+  CONSTRAINT consolidated_tb_rollup_status_pkey PRIMARY KEY (company_id, period)
+);
+
+-- Finds work for refresh_stale_consolidated_tb_rollups()
+CREATE INDEX IF NOT EXISTS idx_consolidated_tb_rollup_status_stale
+  ON public.consolidated_tb_rollup_status(company_id, period)
+  WHERE is_stale;
+
+-- =====================================================
+-- STEP 3: Refresh functions
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.refresh_consolidated_tb_rollup(p_company_id uuid, p_period date)
+RETURNS integer
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_started timestamp with time zone := clock_timestamp();
+  v_rows integer;
+BEGIN
+  -- Serialize refreshes of the same slice
+  PERFORM pg_advisory_xact_lock(hashtext(p_company_id::text || '/' || p_period::text));
+
+  DELETE FROM consolidated_tb_rollup
+  WHERE company_id = p_company_id AND period = p_period;
+
+  INSERT INTO consolidated_tb_rollup (
+    company_id, period, account_code, account_name,
+    total_debit, total_credit, net_amount, row_count
+  )
+  SELECT
+    e.company_id,
+    tb.period,
+    tb.account_code,
+    tb.account_name,
+    SUM(tb.debit),
+    SUM(tb.credit),
+    SUM(tb.debit - tb.credit),
+    COUNT(*)
+  FROM trial_balance tb
+  INNER JOIN entities e ON tb.entity_id = e.id
+  WHERE e.company_id = p_company_id
+  AND tb.period = p_period
+  GROUP BY e.company_id, tb.period, tb.account_code, tb.account_name;
+
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+  -- A change committed while this refresh ran leaves the slice stale
+  INSERT INTO consolidated_tb_rollup_status (company_id, period, is_stale, changed_at, refreshed_at)
+  VALUES (p_company_id, p_period, false, v_started, now())
+  ON CONFLICT (company_id, period) DO UPDATE
+    SET is_stale = consolidated_tb_rollup_status.changed_at > v_started,
+        refreshed_at = now();
+
+  RETURN v_rows;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.refresh_stale_consolidated_tb_rollups(p_limit integer DEFAULT 100)
+RETURNS integer
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_slice record;
+  v_refreshed integer := 0;
+BEGIN
+  FOR v_slice IN
+    SELECT company_id, period
+    FROM consolidated_tb_rollup_status
+    WHERE is_stale
+    ORDER BY changed_at
+    LIMIT p_limit
+  LOOP
+    PERFORM refresh_consolidated_tb_rollup(v_slice.company_id, v_slice.period);
+    v_refreshed := v_refreshed + 1;
+  END LOOP;
+
+  RETURN v_refreshed;
+END;
+$$;
+
+-- =====================================================
+-- STEP 4: Mark slices stale when the trial balance changes
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.mark_consolidated_tb_rollup_stale_update()
+RETURNS trigger
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  -- One timestamp per statement, so DISTINCT collapses duplicate slices
+  v_changed_at timestamp with time zone := clock_timestamp();
+BEGIN
+  -- Statement-level: one upsert per distinct (company, period) touched,
+  -- however many rows the statement changed; an UPDATE can move rows
+  -- between periods, so both sides are marked
+  INSERT INTO consolidated_tb_rollup_status (company_id, period, is_stale, changed_at)
+  SELECT DISTINCT e.company_id, changed.period, true, v_changed_at
+  FROM (
+    SELECT entity_id, period FROM new_rows
+    UNION
+    SELECT entity_id, period FROM old_rows
+  ) changed
+  INNER JOIN entities e ON changed.entity_id = e.id
+  WHERE e.company_id IS NOT NULL
+  ON CONFLICT (company_id, period) DO UPDATE
+    SET is_stale = true,
+        changed_at = EXCLUDED.changed_at;
+
+  RETURN NULL;
+END;
+$$;
+
+-- INSERT triggers can only see NEW TABLE and DELETE triggers only OLD TABLE,
+-- so each event gets its own function
+CREATE OR REPLACE FUNCTION public.mark_consolidated_tb_rollup_stale_insert()
+RETURNS trigger
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  -- One timestamp per statement, so DISTINCT collapses duplicate slices
+  v_changed_at timestamp with time zone := clock_timestamp();
+BEGIN
+  INSERT INTO consolidated_tb_rollup_status (company_id, period, is_stale, changed_at)
+  SELECT DISTINCT e.company_id, changed.period, true, v_changed_at
+  FROM (SELECT DISTINCT entity_id, period FROM new_rows) changed
+  INNER JOIN entities e ON changed.entity_id = e.id
+  WHERE e.company_id IS NOT NULL
+  ON CONFLICT (company_id, period) DO UPDATE
+    SET is_stale = true,
+        changed_at = EXCLUDED.changed_at;
+
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.mark_consolidated_tb_rollup_stale_delete()
+RETURNS trigger
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  -- One timestamp per statement, so DISTINCT collapses duplicate slices
+  v_changed_at timestamp with time zone := clock_timestamp();
+BEGIN
+  INSERT INTO consolidated_tb_rollup_status (company_id, period, is_stale, changed_at)
+  SELECT DISTINCT e.company_id, changed.period, true, v_changed_at
+  FROM (SELECT DISTINCT entity_id, period FROM old_rows) changed
+  INNER JOIN entities e ON changed.entity_id = e.id
+  WHERE e.company_id IS NOT NULL
+  ON CONFLICT (company_id, period) DO UPDATE
+    SET is_stale = true,
+        changed_at = EXCLUDED.changed_at;
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trial_balance_rollup_stale_insert ON public.trial_balance;
+CREATE TRIGGER trial_balance_rollup_stale_insert
+AFTER INSERT ON public.trial_balance
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION public.mark_consolidated_tb_rollup_stale_insert();
+
+DROP TRIGGER IF EXISTS trial_balance_rollup_stale_update ON public.trial_balance;
+CREATE TRIGGER trial_balance_rollup_stale_update
+AFTER UPDATE ON public.trial_balance
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION public.mark_consolidated_tb_rollup_stale_update();
+
+DROP TRIGGER IF EXISTS trial_balance_rollup_stale_delete ON public.trial_balance;
+CREATE TRIGGER trial_balance_rollup_stale_delete
+AFTER DELETE ON public.trial_balance
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION public.mark_consolidated_tb_rollup_stale_delete();
+
+-- Moving an entity between companies changes both companies' consolidations
+CREATE OR REPLACE FUNCTION public.mark_consolidated_tb_rollup_stale_entity()
+RETURNS trigger
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  -- One timestamp per statement, so DISTINCT collapses duplicate slices
+  v_changed_at timestamp with time zone := clock_timestamp();
+BEGIN
+  INSERT INTO consolidated_tb_rollup_status (company_id, period, is_stale, changed_at)
+  SELECT DISTINCT companies.company_id, tb.period, true, v_changed_at
+  FROM trial_balance tb
+  CROSS JOIN (VALUES (OLD.company_id), (NEW.company_id)) companies(company_id)
+  WHERE tb.entity_id = NEW.id
+  AND companies.company_id IS NOT NULL
+  ON CONFLICT (company_id, period) DO UPDATE
+    SET is_stale = true,
+        changed_at = EXCLUDED.changed_at;
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS entities_rollup_stale ON public.entities;
+CREATE TRIGGER entities_rollup_stale
+AFTER UPDATE OF company_id ON public.entities
+FOR EACH ROW
+WHEN (OLD.company_id IS DISTINCT FROM NEW.company_id)
+EXECUTE FUNCTION public.mark_consolidated_tb_rollup_stale_entity();
+
+-- =====================================================
+-- STEP 5: Initial build
+-- =====================================================
+
+INSERT INTO public.consolidated_tb_rollup_status (company_id, period, is_stale, changed_at)
+SELECT DISTINCT e.company_id, tb.period, true, now()
+FROM public.trial_balance tb
+INNER JOIN public.entities e ON tb.entity_id = e.id
+WHERE e.company_id IS NOT NULL
+ON CONFLICT (company_id, period) DO NOTHING;
+
+SELECT public.refresh_stale_consolidated_tb_rollups(1000000);
+
+-- =====================================================
+-- STEP 6: Keep it fresh
+-- =====================================================
+-- With pg_cron (Supabase: Database -> Extensions -> pg_cron):
+--
+--   SELECT cron.schedule(
+--     'refresh-consolidated-tb-rollup',
+--     '* * * * *',
+--     'SELECT public.refresh_stale_consolidated_tb_rollups()'
+--   );
+--
+-- Or call refresh_consolidated_tb_rollup(company_id, period) at the end
+-- of a trial balance upload. Until a stale slice is refreshed, the
+-- service keeps answering from the live aggregate.
+
+-- Verify
+SELECT is_stale, COUNT(*) AS slices, MAX(refreshed_at) AS last_refresh
+FROM public.consolidated_tb_rollup_status
+GROUP BY is_stale;